@@ -11,6 +11,7 @@ from ...models.comfyui import (
     GenerationRequest, GenerationResponse, ComfyUIStatus, WorkflowInfo
 )
 from ...services.comfyui_service import ComfyUIService
+from ..responses import FastJSONResponse
 
 logger = logging.getLogger(__name__)
 
@@ -80,7 +81,7 @@ async def generate_image(request: GenerationRequest):
         else:
             logger.warning(f"图像生成失败: 情绪={request.emotion}, 错误={result.error_message}")
         
-        return result
+        return FastJSONResponse(result)
         
     except HTTPException:
         raise
@@ -150,7 +151,7 @@ async def generate_from_emotion_analysis(request: EmotionAnalysisRequest):
         
         logger.info(f"基于情绪分析生成图像: 主导情绪={standard_emotion}, 置信度={dominant_emotion_data.get('percentage', 0):.1f}%")
         
-        return result
+        return FastJSONResponse(result)
         
     except HTTPException:
         raise
@@ -5,8 +5,9 @@ FastAPI服务器，提供情绪分析API
 
 import logging
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, List, Optional
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -15,9 +16,11 @@ import uvicorn
 
 from .services.emotion_analyzer import EmotionAnalyzer
 from .services.comfyui_service import ComfyUIService
+from .services.http_client import close_http_client
 from .models.emotion import AnalysisResponse, BatchAnalysisResponse
 from .models.comfyui import GenerationRequest, GenerationResponse
 from .api import router as api_router
+from .api.responses import EventStreamResponse, FastJSONResponse, NDJSONResponse
 
 # 配置日志
 logging.basicConfig(
@@ -26,11 +29,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时从结果存储恢复缓存，关闭时释放后台任务与共享HTTP连接池"""
+    await emotion_analyzer.rehydrate_cache()
+    yield
+    await emotion_analyzer.close()
+    await close_http_client()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="EmoScan API",
     description="情感分析API服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置CORS（允许前端访问）
@@ -89,34 +103,100 @@ async def health_check():
     }
 
 
+@app.get("/api/v1/analyze/stats")
+async def analyzer_stats():
+    """情绪分析器运行时统计（缓存命中率等）"""
+    return emotion_analyzer.get_stats()
+
+
+async def _read_image_upload(file: UploadFile) -> bytes:
+    """验证并读取上传的图像文件"""
+    # 验证文件类型
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="文件必须是图像格式")
+
+    # 读取图像数据
+    image_data = await file.read()
+
+    if len(image_data) == 0:
+        raise HTTPException(status_code=400, detail="图像文件为空")
+
+    return image_data
+
+
+async def _read_batch_uploads(files: List[UploadFile]) -> List[bytes]:
+    """验证并读取批量上传的图像文件（最多5张）"""
+    # 验证文件数量
+    if len(files) == 0:
+        raise HTTPException(status_code=400, detail="至少需要上传一张图像")
+
+    if len(files) > 5:
+        raise HTTPException(status_code=400, detail="最多只能上传5张图像")
+
+    images_data = []
+
+    # 处理每个文件
+    for i, file in enumerate(files):
+        # 验证文件类型
+        if file.content_type and not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"文件{i+1}必须是图像格式")
+
+        # 读取图像数据
+        image_data = await file.read()
+
+        if len(image_data) == 0:
+            raise HTTPException(status_code=400, detail=f"图像文件{i+1}为空")
+
+        images_data.append(image_data)
+
+    return images_data
+
+
+async def _guard_stream(events: AsyncIterator, description: str) -> AsyncIterator:
+    """流式分析出错时以error事件结束（响应头已发送，无法再返回HTTP错误）"""
+    try:
+        async for event in events:
+            yield event
+        logger.info(f"流式情绪分析完成: {description}")
+    except Exception as e:
+        logger.error(f"流式分析时发生错误: {e}")
+        yield "error", {"error_message": f"服务器内部错误: {str(e)}"}
+
+
+async def _batch_ndjson_lines(events: AsyncIterator) -> AsyncIterator:
+    """批量流式事件转为NDJSON行：每个 图像+服务 的结果一行，最后为最终判断与结构化结果"""
+    async for event, data in events:
+        if event == "result":
+            yield {"type": "result", **data}
+        elif event == "emotion_data":
+            yield {"type": "verdict", **data}
+        elif event == "error":
+            yield {"type": "error", **data}
+
+
 @app.post("/api/v1/analyze/image", response_model=AnalysisResponse)
-async def analyze_image(file: UploadFile = File(...)):
+async def analyze_image(file: UploadFile = File(...), budget: Optional[float] = None):
     """
     分析上传图像中的情绪
     
     Args:
         file: 上传的图像文件
+        budget: 延迟预算（秒，默认使用ANALYSIS_LATENCY_BUDGET）；超出时返回已有结果的融合
+            （partial=true），完整结果可通过 /api/v1/analyze/result/{request_id} 查询
         
     Returns:
         AnalysisResponse: 情绪分析结果
     """
     try:
-        # 验证文件类型
-        if not file.content_type or not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="文件必须是图像格式")
-        
-        # 读取图像数据
-        image_data = await file.read()
-        
-        if len(image_data) == 0:
-            raise HTTPException(status_code=400, detail="图像文件为空")
+        image_data = await _read_image_upload(file)
         
         # 分析情绪
-        result = await emotion_analyzer.analyze_image(image_data)
+        result = await emotion_analyzer.analyze_image(image_data, budget)
         
-        logger.info(f"情绪分析完成: {file.filename}, 成功: {result.success}")
+        logger.info(f"情绪分析完成: {file.filename}, 成功: {result.success}, 部分结果: {result.partial}")
         
-        return result
+        # 直接序列化响应数据类（跳过response_model校验，输出不变）
+        return FastJSONResponse(result)
         
     except HTTPException:
         raise
@@ -125,47 +205,53 @@ async def analyze_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
 
+@app.get("/api/v1/analyze/result/{request_id}", response_model=AnalysisResponse)
+async def get_analysis_result(request_id: str):
+    """
+    查询返回了部分结果的分析请求的当前结果
+
+    后台服务全部完成后返回完整结果（partial=false），否则返回已到达结果的融合（partial=true）
+
+    Args:
+        request_id: 部分结果响应中的请求ID
+
+    Returns:
+        AnalysisResponse: 情绪分析结果
+    """
+    result = emotion_analyzer.get_result(request_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="请求ID不存在或已过期")
+    return FastJSONResponse(result)
+
+
 @app.post("/api/v1/analyze/batch", response_model=BatchAnalysisResponse)
-async def analyze_batch_images(files: List[UploadFile] = File(...)):
+async def analyze_batch_images(files: List[UploadFile] = File(...), stream: bool = False):
     """
     批量分析多张图像中的情绪，使用裁判员AI给出最终判断
 
     Args:
         files: 上传的图像文件列表（最多5张）
+        stream: 是否以NDJSON逐行返回（默认False）：每个 图像+服务 完成时输出一行
+            {"type": "result", "image_id", "source", "success", ...}（失败或超时的服务为 "success": false 与 "error"），最后一行为
+            {"type": "verdict", "emotion_data", "judge_result", ...}；客户端可随时断开，进行中的分析随之取消
 
     Returns:
         BatchAnalysisResponse: 批量情绪分析结果
     """
     try:
-        # 验证文件数量
-        if len(files) == 0:
-            raise HTTPException(status_code=400, detail="至少需要上传一张图像")
-
-        if len(files) > 5:
-            raise HTTPException(status_code=400, detail="最多只能上传5张图像")
-
-        images_data = []
-
-        # 处理每个文件
-        for i, file in enumerate(files):
-            # 验证文件类型
-            if file.content_type and not file.content_type.startswith("image/"):
-                raise HTTPException(status_code=400, detail=f"文件{i+1}必须是图像格式")
-
-            # 读取图像数据
-            image_data = await file.read()
+        images_data = await _read_batch_uploads(files)
 
-            if len(image_data) == 0:
-                raise HTTPException(status_code=400, detail=f"图像文件{i+1}为空")
-
-            images_data.append(image_data)
+        if stream:
+            return NDJSONResponse(_batch_ndjson_lines(
+                _guard_stream(emotion_analyzer.stream_batch_images(images_data), f"{len(images_data)}张图像")
+            ))
 
         # 批量分析情绪
         result = await emotion_analyzer.analyze_batch_images(images_data)
 
         logger.info(f"批量情绪分析完成: {len(files)}张图像, 成功: {result.success}")
 
-        return result
+        return FastJSONResponse(result)
 
     except HTTPException:
         raise
@@ -174,6 +260,40 @@ async def analyze_batch_images(files: List[UploadFile] = File(...)):
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
 
+@app.post("/api/v1/analyze/image/stream")
+async def analyze_image_stream(file: UploadFile = File(...)):
+    """
+    流式分析上传图像中的情绪（Server-Sent Events）
+
+    事件依次为：header（报告头，立即发送）、section（每个服务成功时的结果段落）、
+    provider_error（每个服务失败或超时时，含source与error）、verdict（融合结论）、emotion_data（结构化结果）；出错时以error事件结束。
+    各事件text字段依次拼接即为完整的analysis_text
+
+    Args:
+        file: 上传的图像文件
+    """
+    image_data = await _read_image_upload(file)
+    return EventStreamResponse(_guard_stream(emotion_analyzer.stream_image(image_data), file.filename))
+
+
+@app.post("/api/v1/analyze/batch/stream")
+async def analyze_batch_images_stream(files: List[UploadFile] = File(...)):
+    """
+    流式批量分析多张图像中的情绪（Server-Sent Events）
+
+    事件依次为：header（报告头，立即发送）、result（每个 图像+服务 完成时，失败或超时的服务为success=false与error）、
+    section（每张图像完成时的结果段落）、verdict（最终判断）、emotion_data（结构化结果）；
+    出错时以error事件结束
+
+    Args:
+        files: 上传的图像文件列表（最多5张）
+    """
+    images_data = await _read_batch_uploads(files)
+    return EventStreamResponse(
+        _guard_stream(emotion_analyzer.stream_batch_images(images_data), f"{len(images_data)}张图像")
+    )
+
+
 @app.post("/api/v1/analyze-and-generate")
 async def analyze_and_generate_image(file: UploadFile = File(...), generate_image: bool = True):
     """
@@ -200,12 +320,12 @@ async def analyze_and_generate_image(file: UploadFile = File(...), generate_imag
         analysis_result = await emotion_analyzer.analyze_image(image_data)
 
         if not analysis_result.success:
-            return {
+            return FastJSONResponse({
                 "success": False,
                 "emotion_analysis": analysis_result,
                 "image_generation": None,
                 "error_message": "情绪分析失败"
-            }
+            })
 
         # 4. 如果需要生成图像
         generation_result = None
@@ -241,12 +361,12 @@ async def analyze_and_generate_image(file: UploadFile = File(...), generate_imag
                     error_message=f"图像生成失败: {str(gen_error)}"
                 )
 
-        return {
+        return FastJSONResponse({
             "success": True,
             "emotion_analysis": analysis_result,
             "image_generation": generation_result,
             "message": "分析完成" + ("，图像生成成功" if generation_result and generation_result.success else "")
-        }
+        })
 
     except HTTPException:
         raise
@@ -3,10 +3,13 @@
 兼容前端EmotionData格式和Face++ API返回格式
 """
 
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Union
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
 from datetime import datetime
 import json
+import os
+
+import numpy as np
 
 
 @dataclass
@@ -26,6 +29,29 @@ class EmotionResult:
     source: str               # 数据来源 (facepp/gemini/openrouter)
     timestamp: datetime       # 时间戳
     raw_data: Optional[Dict]  # 原始API返回数据
+    _vector: Optional["EmotionVector"] = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def create(cls, emotions: Dict[str, float], source: str, raw_data: Optional[Dict],
+               timestamp: Optional[datetime] = None) -> "EmotionResult":
+        """由标准化的情绪概率构建结果（标准化后的字典按EMOTION_KEYS顺序，并列时与向量一致取靠前者）；
+        向量在首次需要时才构建，构建结果不承担数组开销"""
+        dominant_emotion = get_dominant_emotion(emotions)
+        return cls(
+            emotions=emotions,
+            dominant_emotion=dominant_emotion,
+            confidence=emotions.get(dominant_emotion, 0.0),
+            source=source,
+            timestamp=timestamp or datetime.now(),
+            raw_data=raw_data
+        )
+
+    @property
+    def vector(self) -> "EmotionVector":
+        """情绪概率的向量形式（首次访问时构建）"""
+        if self._vector is None:
+            self._vector = EmotionVector.from_dict(self.emotions)
+        return self._vector
 
 
 @dataclass
@@ -35,6 +61,8 @@ class AnalysisResponse:
     emotion_data: List[EmotionData]
     analysis_text: str
     error_message: Optional[str] = None
+    partial: bool = False               # 超出延迟预算，只包含已返回的服务结果
+    request_id: Optional[str] = None    # 部分结果的请求ID，可通过 /api/v1/analyze/result/{request_id} 查询完整结果
 
 
 @dataclass
@@ -58,6 +86,155 @@ EMOTION_CONFIG = {
     "disgusted": {"name": "Disgusted", "color": "#9d4edd"},
     "fearful": {"name": "Fearful", "color": "#f72585"},
 }
+
+# 情绪向量的固定顺序（与EMOTION_CONFIG一致）
+EMOTION_KEYS = tuple(EMOTION_CONFIG.keys())
+_EMOTION_INDEX = {key: index for index, key in enumerate(EMOTION_KEYS)}
+_EMOTION_DISPLAY = tuple((config["name"], config["color"]) for config in EMOTION_CONFIG.values())
+
+
+class EmotionVector:
+    """7种标准情绪概率的定长向量（按EMOTION_KEYS顺序存放于NumPy数组）
+
+    服务内部的归一化、主导情绪与多结果融合都在向量上完成，
+    只在API边界转换为字典或EmotionData列表
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float64)
+
+    @classmethod
+    def from_dict(cls, emotions: Dict[str, float]) -> "EmotionVector":
+        return cls(np.array([float(emotions.get(key, 0.0)) for key in EMOTION_KEYS]))
+
+    @classmethod
+    def neutral(cls) -> "EmotionVector":
+        values = np.zeros(len(EMOTION_KEYS))
+        values[_EMOTION_INDEX["neutral"]] = 1.0
+        return cls(values)
+
+    @staticmethod
+    def matrix(emotions_list: Sequence[Dict[str, float]]) -> np.ndarray:
+        """N个情绪概率字典一次构建为 N×7 矩阵（按EMOTION_KEYS顺序），不逐个构建向量"""
+        return np.array([[emotions.get(key, 0.0) for key in EMOTION_KEYS] for emotions in emotions_list],
+                        dtype=np.float64)
+
+    @classmethod
+    def fuse(cls, matrix: np.ndarray, weights: Sequence[float]) -> "EmotionVector":
+        """N×7矩阵的各行按权重加权平均后归一化（一次矩阵乘法）"""
+        merged = np.asarray(weights, dtype=np.float64) @ matrix
+        # 权重总和为正时除以权重总和等价于直接按合计标准化
+        total = merged.sum()
+        if total <= 0:
+            return cls.neutral()
+        return cls(merged / total)
+
+    @property
+    def dominant(self) -> str:
+        """主导情绪（并列时取EMOTION_KEYS中靠前者）"""
+        return EMOTION_KEYS[int(self.values.argmax())]
+
+    @property
+    def confidence(self) -> float:
+        """主导情绪的概率"""
+        return float(self.values.max())
+
+    def __getitem__(self, key: str) -> float:
+        return float(self.values[_EMOTION_INDEX[key]])
+
+    def to_dict(self) -> Dict[str, float]:
+        return dict(zip(EMOTION_KEYS, self.values.tolist()))
+
+    def to_emotion_data(self) -> List[EmotionData]:
+        """转换为前端兼容的EmotionData列表（百分比保留一位小数）"""
+        return [
+            EmotionData(emotion=name, percentage=round(value * 100, 1), color=color)
+            for (name, color), value in zip(_EMOTION_DISPLAY, self.values.tolist())
+        ]
+
+    def __repr__(self) -> str:
+        return f"EmotionVector({self.to_dict()})"
+
+
+# 情绪分析服务配置（可通过环境变量覆盖）
+ANALYSIS_CONFIG = {
+    "http_timeout": float(os.getenv("API_TIMEOUT", "30")),                 # 外部API请求总超时（秒）
+    "http_connect_timeout": float(os.getenv("API_CONNECT_TIMEOUT", "10")),  # 建立连接超时（秒）
+    "http_pool_limit": int(os.getenv("HTTP_POOL_LIMIT", "100")),           # 连接池最大连接数
+    "http_pool_limit_per_host": int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20")),  # 每个主机最大连接数
+    "http_keepalive_timeout": float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60")),    # 空闲连接保持时间（秒）
+    "facepp_max_concurrency": int(os.getenv("FACEPP_MAX_CONCURRENCY", "5")),  # Face++并发调用上限（免费版QPS有限，可调低）
+    "gemini_max_concurrency": int(os.getenv("GEMINI_MAX_CONCURRENCY", "5")),  # Gemini并发调用上限
+    "result_cache_max_entries": int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024")),  # 结果缓存最大条目数
+    "result_cache_ttl": float(os.getenv("RESULT_CACHE_TTL", "600")),  # 结果缓存有效期（秒，0表示不过期）
+    "single_flight_enabled": os.getenv("SINGLE_FLIGHT_ENABLED", "True").lower() == "true",  # 相同图像的并发调用共享进行中的任务
+    "analysis_latency_budget": float(os.getenv("ANALYSIS_LATENCY_BUDGET", "0")),  # 单图分析延迟预算（秒），超出时返回已有结果（0表示等待所有服务）
+    "pending_result_ttl": float(os.getenv("PENDING_RESULT_TTL", "300")),  # 部分结果请求可按ID查询完整结果的有效期（秒）
+    "pending_result_max_entries": int(os.getenv("PENDING_RESULT_MAX_ENTRIES", "256")),  # 可查询的部分结果请求数上限
+    "result_store_enabled": os.getenv("RESULT_STORE_ENABLED", "False").lower() == "true",  # 结果持久化到SQLite（默认关闭）
+    "result_store_path": os.getenv("RESULT_STORE_PATH", "data/emotion_results.db"),  # SQLite文件路径（相对路径以后端根目录为基准）
+    "result_store_rehydrate": os.getenv("RESULT_STORE_REHYDRATE", "True").lower() == "true",  # 启动时从存储恢复结果缓存
+    "result_store_raw_max_chars": int(os.getenv("RESULT_STORE_RAW_MAX_CHARS", "2000")),  # 原始数据裁剪后的最大字符数
+    "result_store_queue_size": int(os.getenv("RESULT_STORE_QUEUE_SIZE", "10000")),  # 后台写入队列上限（写满时丢弃）
+    "frame_dedup_enabled": os.getenv("FRAME_DEDUP_ENABLED", "True").lower() == "true",  # 批量分析时合并近似重复帧
+    "frame_dedup_threshold": int(os.getenv("FRAME_DEDUP_THRESHOLD", "6")),  # dHash汉明距离阈值（64位）
+    "gemini_hedge_delay": float(os.getenv("GEMINI_HEDGE_DELAY", "4")),  # 对冲延迟（秒），超时未返回则并行启动下一个模型
+    "gemini_max_parallel_attempts": int(os.getenv("GEMINI_MAX_PARALLEL_ATTEMPTS", "2")),  # 同时进行的模型尝试上限（1为顺序回退）
+    "circuit_failure_threshold": int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),  # 连续失败多少次后熔断
+    "circuit_open_seconds": float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),  # 熔断持续时间（秒），之后半开探测
+    "routing_window": int(os.getenv("ROUTING_WINDOW", "50")),  # 成功率统计的滚动窗口大小
+    "routing_ewma_alpha": float(os.getenv("ROUTING_EWMA_ALPHA", "0.3")),  # 延迟EWMA平滑系数
+    "facepp_max_size_kb": int(os.getenv("MAX_IMAGE_SIZE_KB", "700")),  # Face++上传图像大小上限（KB）
+    "facepp_max_width": int(os.getenv("MAX_IMAGE_WIDTH", "1024")),  # Face++上传图像最大宽度
+    "facepp_max_height": int(os.getenv("MAX_IMAGE_HEIGHT", "1024")),  # Face++上传图像最大高度
+    "vision_max_dimension": int(os.getenv("VISION_MAX_DIMENSION", "1024")),  # 视觉大模型上传图像最长边
+    "vision_image_format": os.getenv("VISION_IMAGE_FORMAT", "JPEG").upper(),  # 视觉大模型上传格式（JPEG/WEBP）
+    "vision_image_quality": int(os.getenv("VISION_IMAGE_QUALITY", "85")),  # 视觉大模型上传图像质量
+    "face_crop_enabled": os.getenv("FACE_CROP_ENABLED", "False").lower() == "true",  # 本地人脸检测裁剪（需要opencv-python）
+    "face_crop_padding": float(os.getenv("FACE_CROP_PADDING", "0.3")),  # 人脸框四周扩展比例
+    "face_detect_max_dimension": int(os.getenv("FACE_DETECT_MAX_DIMENSION", "480")),  # 人脸检测时的缩放尺寸
+    "face_cascade_path": os.getenv("FACE_CASCADE_PATH", ""),  # 自定义级联模型路径（默认使用OpenCV自带模型）
+    "local_model_mode": os.getenv("LOCAL_MODEL_MODE", "off").lower(),  # 本地表情模型模式: off/primary/fallback/vote
+    "local_model_path": os.getenv("LOCAL_MODEL_PATH", ""),  # ONNX模型路径（如FER+ emotion-ferplus-8.onnx）
+    "local_model_labels": os.getenv("LOCAL_MODEL_LABELS",
+                                    "neutral,happiness,surprise,sadness,anger,disgust,fear,contempt"),  # 模型输出类别顺序
+    "local_model_input_size": int(os.getenv("LOCAL_MODEL_INPUT_SIZE", "64")),  # 模型输入边长
+    "local_model_input_scale": float(os.getenv("LOCAL_MODEL_INPUT_SCALE", "1.0")),  # 像素值缩放系数（FER+使用0-255原始值）
+    "local_model_output": os.getenv("LOCAL_MODEL_OUTPUT", "auto").lower(),  # 模型输出: auto（非负且每行和为1时视为概率）/logits/probabilities
+    "local_model_max_batch": int(os.getenv("LOCAL_MODEL_MAX_BATCH", "16")),  # 微批最大批量
+    "local_model_batch_wait_ms": float(os.getenv("LOCAL_MODEL_BATCH_WAIT_MS", "10")),  # 微批等待窗口（毫秒）
+    "local_model_threads": int(os.getenv("LOCAL_MODEL_THREADS", "2")),  # 推理线程数
+    "local_model_primary_confidence": float(os.getenv("LOCAL_MODEL_PRIMARY_CONFIDENCE", "0.7")),  # primary模式下跳过远程服务的置信度
+    "local_model_weight": float(os.getenv("LOCAL_MODEL_WEIGHT", "0.3")),  # 结果融合时本地模型的权重
+    "gemini_structured_output": os.getenv("GEMINI_STRUCTURED_OUTPUT", "True").lower() == "true",  # 使用responseSchema约束JSON输出
+    "gemini_schema_unsupported_models": os.getenv("GEMINI_SCHEMA_UNSUPPORTED_MODELS", "gemma"),  # 不支持JSON模式的模型前缀（逗号分隔）
+    "gemini_max_output_tokens": int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "256")),  # 结构化情绪分析最大输出token数
+    "gemini_judge_max_output_tokens": int(os.getenv("GEMINI_JUDGE_MAX_OUTPUT_TOKENS", "1024")),  # 结构化裁判输出最大token数
+    "gemini_streaming": os.getenv("GEMINI_STREAMING", "True").lower() == "true",  # 情绪分析使用流式接口，emotions完整即关闭流
+    "consensus_enabled": os.getenv("CONSENSUS_ENABLED", "True").lower() == "true",  # 批量结果一致时本地判定，跳过裁判员AI
+    "consensus_min_results": int(os.getenv("CONSENSUS_MIN_RESULTS", "2")),  # 本地判定所需的最少结果数
+    "consensus_vote_threshold": float(os.getenv("CONSENSUS_VOTE_THRESHOLD", "0.8")),  # 主导情绪得票率下限
+    "consensus_max_divergence": float(os.getenv("CONSENSUS_MAX_DIVERGENCE", "0.15")),  # 两两JS散度平均值上限（0-1）
+    "judge_input_token_budget": int(os.getenv("JUDGE_INPUT_TOKEN_BUDGET", "1500")),  # 裁判员输入数据token预算，超出时合并相邻图片
+    "openrouter_mode": os.getenv("OPENROUTER_MODE", "hedge").lower(),  # OpenRouter模式: off/hedge/parallel
+    "openrouter_max_concurrency": int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "3")),  # OpenRouter并发调用上限
+    "openrouter_max_output_tokens": int(os.getenv("OPENROUTER_MAX_OUTPUT_TOKENS", "512")),  # OpenRouter最大输出token数
+    "gemini_batch_mode": os.getenv("GEMINI_BATCH_MODE", "False").lower() == "true",  # 批量分析时所有图像合并为一次Gemini调用
+    "gemini_batch_max_output_tokens": int(os.getenv("GEMINI_BATCH_MAX_OUTPUT_TOKENS", "2048")),  # 多图单次调用最大输出token数
+    "facepp_rate_limit": float(os.getenv("FACEPP_RATE_LIMIT", "2")),  # Face++每个API密钥的调用速率（次/秒，0表示不限流）
+    "facepp_rate_burst": float(os.getenv("FACEPP_RATE_BURST", "2")),  # Face++突发调用数
+    "gemini_rate_limit": float(os.getenv("GEMINI_RATE_LIMIT", "1")),  # Gemini每个API密钥的调用速率（次/秒）
+    "gemini_rate_burst": float(os.getenv("GEMINI_RATE_BURST", "5")),  # Gemini突发调用数
+    "openrouter_rate_limit": float(os.getenv("OPENROUTER_RATE_LIMIT", "0.3")),  # OpenRouter每个API密钥的调用速率（次/秒）
+    "openrouter_rate_burst": float(os.getenv("OPENROUTER_RATE_BURST", "3")),  # OpenRouter突发调用数
+    "rate_limit_max_wait": float(os.getenv("RATE_LIMIT_MAX_WAIT", "10")),  # 限流排队的最长等待时间（秒）
+    "rate_limit_decrease_factor": float(os.getenv("RATE_LIMIT_DECREASE_FACTOR", "0.5")),  # 收到429后速率乘以该系数
+    "rate_limit_min_factor": float(os.getenv("RATE_LIMIT_MIN_FACTOR", "0.2")),  # 自适应速率下限（相对配置速率）
+    "rate_limit_recovery_step": float(os.getenv("RATE_LIMIT_RECOVERY_STEP", "0.05")),  # 每次成功调用恢复的速率（相对配置速率）
+}
+
 # Face++ API情绪映射表
 FACEPP_EMOTION_MAPPING = {
     "anger": "angry",
@@ -95,18 +272,9 @@ def normalize_emotion_name(emotion: str) -> str:
 
 def create_emotion_data_list(emotions: Dict[str, float]) -> List[EmotionData]:
     """将情绪概率字典转换为前端兼容的EmotionData列表"""
-    emotion_data_list = []
-    
-    for emotion_key, config in EMOTION_CONFIG.items():
-        percentage = emotions.get(emotion_key, 0.0) * 100  # 转换为百分比
-        emotion_data = EmotionData(
-            emotion=config["name"],
-            percentage=round(percentage, 1),
-            color=config["color"]
-        )
-        emotion_data_list.append(emotion_data)
-    
-    return emotion_data_list
+    return EmotionVector.from_dict(emotions).to_emotion_data()
+
+
 def normalize_probabilities(emotions: Dict[str, float]) -> Dict[str, float]:
     """标准化情绪概率，确保总和为1.0"""
     # 确保所有7种情绪都存在
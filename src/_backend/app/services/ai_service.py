@@ -6,22 +6,41 @@ AI模型服务
 import os
 import json
 import base64
-import requests
 import logging
+import re
+import time
 from typing import Dict, List, Optional, Union
-from datetime import datetime
-from openai import OpenAI
 
 from ..models.emotion import (
     EmotionResult,
-    AI_EMOTION_MAPPING,
-    normalize_probabilities,
-    get_dominant_emotion,
-    json_to_emotions
+    ANALYSIS_CONFIG,
+    json_to_emotions,
+    normalize_probabilities
+)
+from .http_client import get_http_client
+from .image_preprocess import PreparedImage
+from .judge_encoder import encode_judge_input, estimate_tokens
+from .rate_limiter import ProviderThrottled, RateLimitExceeded, get_rate_limiter, parse_retry_after
+from .response_parser import (
+    parse_emotion_response,
+    parse_judge_response,
+    parse_json_payload,
+    parse_structured_emotions,
+    parse_structured_judge,
+    StreamingObjectParser
 )
 
 logger = logging.getLogger(__name__)
 
+# Gemini 429错误详情中的重试间隔（RetryInfo.retryDelay，如 "20s"）
+RETRY_DELAY_PATTERN = re.compile(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"')
+
+# 模型拒绝结构化输出时400错误详情中的特征（其他400错误按普通失败处理）
+SCHEMA_REJECTED_PATTERN = re.compile(
+    r"responseSchema|response_schema|responseMimeType|response_mime_type|response_format|JSON mode",
+    re.IGNORECASE
+)
+
 
 # 标准化的情绪分析Prompt
 EMOTION_ANALYSIS_PROMPT = """
@@ -87,6 +106,121 @@ JUDGE_AI_PROMPT = """
 
 **再次强调：只返回JSON，不要任何其他文字！**
 """
+
+# 结构化输出模式的Prompt（输出格式由responseSchema约束，无需在提示词中描述）
+EMOTION_ANALYSIS_SCHEMA_PROMPT = """
+请分析这张图片中人物的情绪，给出7种情绪的概率（angry、disgusted、fearful、happy、neutral、sad、surprised），
+概率之和为1.0。仔细观察面部表情、眼神、嘴角等细节。
+"""
+
+JUDGE_AI_SCHEMA_PROMPT = """
+你是专业的情绪分析裁判员。分析多个AI的情绪识别结果，给出最终判断。
+
+分析原则：
+1. 综合所有结果的一致性
+2. 排除明显异常值
+3. Face++和Gemini权重相等
+4. 结果差异大时降低置信度
+5. 情绪概率总和必须为1.0
+"""
+
+# 多图单次调用的Prompt（{count}为图片数量）
+BATCH_ANALYSIS_PROMPT = """
+以下依次给出{count}张图片，每张图片前标注了编号（图片1、图片2……）。
+请分别分析每张图片中人物的情绪，并综合所有图片给出最终判断，严格按照以下JSON格式返回：
+
+{
+  "images": [
+    {
+      "image_id": 1,
+      "emotions": {
+        "angry": 0.0到1.0之间的数值,
+        "disgusted": 0.0到1.0之间的数值,
+        "fearful": 0.0到1.0之间的数值,
+        "happy": 0.0到1.0之间的数值,
+        "neutral": 0.0到1.0之间的数值,
+        "sad": 0.0到1.0之间的数值,
+        "surprised": 0.0到1.0之间的数值
+      }
+    }
+  ],
+  "verdict": {
+    "final_emotion": "主导情绪名称(英文小写)",
+    "confidence": 0.0到1.0之间的置信度,
+    "reasoning": "判断依据",
+    "consistency_analysis": "各图片结果的一致性分析",
+    "emotions": {"angry": 0.0, "disgusted": 0.0, "fearful": 0.0, "happy": 0.0, "neutral": 0.0, "sad": 0.0, "surprised": 0.0}
+  }
+}
+
+要求：
+1. images中每张图片一项，image_id与图片编号对应，每项情绪概率之和必须等于1.0
+2. 只返回JSON格式，不要其他文字
+3. 情绪名称必须使用英文小写
+4. 仔细观察面部表情、眼神、嘴角等细节
+"""
+
+BATCH_ANALYSIS_SCHEMA_PROMPT = """
+以下依次给出{count}张图片，每张图片前标注了编号（图片1、图片2……）。
+请分别分析每张图片中人物的情绪（7种情绪的概率，之和为1.0，image_id与图片编号对应），
+并综合所有图片给出最终判断。仔细观察面部表情、眼神、嘴角等细节。
+"""
+
+# 裁判员输入数据说明（紧凑列式编码）
+JUDGE_INPUT_DESCRIPTION = (
+    "输入数据（columns为列名，rows每行为一张图片的一个数据源的情绪概率；"
+    "image为多张图片如\"1-4\"、\"1-3,5\"时表示所列图片的平均值）："
+)
+
+EMOTION_NAMES = ["angry", "disgusted", "fearful", "happy", "neutral", "sad", "surprised"]
+
+# 7类情绪概率对象（Gemini responseSchema，OpenAPI子集）
+EMOTIONS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {name: {"type": "NUMBER"} for name in EMOTION_NAMES},
+    "required": EMOTION_NAMES,
+    "propertyOrdering": EMOTION_NAMES
+}
+
+# 情绪分析输出：只要求概率，主导情绪与置信度在本地计算
+EMOTION_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"emotions": EMOTIONS_SCHEMA},
+    "required": ["emotions"]
+}
+
+JUDGE_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "final_emotion": {"type": "STRING", "enum": EMOTION_NAMES},
+        "confidence": {"type": "NUMBER"},
+        "reasoning": {"type": "STRING"},
+        "consistency_analysis": {"type": "STRING"},
+        "emotions": EMOTIONS_SCHEMA
+    },
+    "required": ["final_emotion", "confidence", "reasoning", "consistency_analysis", "emotions"],
+    "propertyOrdering": ["final_emotion", "confidence", "emotions", "reasoning", "consistency_analysis"]
+}
+
+BATCH_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "images": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"image_id": {"type": "INTEGER"}, "emotions": EMOTIONS_SCHEMA},
+                "required": ["image_id", "emotions"],
+                "propertyOrdering": ["image_id", "emotions"]
+            }
+        },
+        "verdict": JUDGE_RESPONSE_SCHEMA
+    },
+    "required": ["images", "verdict"],
+    "propertyOrdering": ["images", "verdict"]
+}
+
+
 class GeminiService:
     """Gemini API服务类"""
     
@@ -97,119 +231,296 @@ class GeminiService:
             "gemini-2.0-flash-lite-001",
             "gemini-2.0-flash-lite"
         ]
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
+        self.base_url = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+        self.http = get_http_client()
+        self.rate_limiter = get_rate_limiter()
+        self.structured_output = ANALYSIS_CONFIG["gemini_structured_output"]
+        self.schema_unsupported_prefixes = tuple(
+            prefix.strip() for prefix in ANALYSIS_CONFIG["gemini_schema_unsupported_models"].split(",")
+            if prefix.strip()
+        )
+        self.streaming = ANALYSIS_CONFIG["gemini_streaming"]
+        # 运行时拒绝过JSON模式的模型，之后直接使用提示词方式
+        self._schema_rejected = set()
+        self._judge_metrics = {
+            "calls": 0, "prompt_chars": 0, "prompt_tokens_estimate": 0, "prompt_tokens_reported": 0,
+            "latency_total": 0.0, "last_prompt_chars": 0, "last_latency": 0.0
+        }
     
     def encode_image(self, image_data: bytes) -> str:
         """将图像编码为base64"""
         return base64.b64encode(image_data).decode("utf-8")
+
+    def supports_structured_output(self, model: str) -> bool:
+        """模型是否使用结构化JSON输出"""
+        return (self.structured_output
+                and not model.startswith(self.schema_unsupported_prefixes)
+                and model not in self._schema_rejected)
+
+    @property
+    def judge_model(self) -> str:
+        """裁判员模型：优先使用支持结构化输出的模型"""
+        for model in self.models:
+            if self.supports_structured_output(model):
+                return model
+        return self.models[0]
+
+    def _request_body(self, model: str, prompt: str, structured_prompt: str, parts: List[Dict],
+                      schema: Dict, max_output_tokens: int):
+        """构建请求体，返回 (请求体, 是否为结构化输出)；模型支持时附带responseSchema"""
+        structured = self.supports_structured_output(model)
+        data = {
+            "contents": [{
+                "parts": [{"text": structured_prompt if structured else prompt}] + parts
+            }]
+        }
+        if structured:
+            data["generationConfig"] = {
+                "responseMimeType": "application/json",
+                "responseSchema": schema,
+                "maxOutputTokens": max_output_tokens,
+                "temperature": 0
+            }
+        return data, structured
+
+    def _reject_schema(self, model: str, detail: str):
+        """模型以400拒绝JSON模式（错误详情提及responseSchema等）：记录后该模型改用提示词方式"""
+        logger.warning(f"模型 {model} 不支持结构化输出，改用提示词方式: {detail[:200]}")
+        self._schema_rejected.add(model)
+
+    @staticmethod
+    async def _schema_rejected_detail(response) -> str:
+        """结构化请求的HTTP 400：错误详情与JSON模式相关时返回详情，否则抛出普通错误（不重试）"""
+        detail = await response.text()
+        if not SCHEMA_REJECTED_PATTERN.search(detail):
+            raise Exception(f"Gemini API错误 (HTTP 400): {detail[:200]}")
+        return detail
+
+    @staticmethod
+    async def _raise_if_throttled(response, provider: str):
+        """HTTP 429时抛出ProviderThrottled（优先使用Retry-After，其次使用错误详情中的retryDelay）"""
+        if response.status != 429:
+            return
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        detail = await response.text()
+        if retry_after is None:
+            match = RETRY_DELAY_PATTERN.search(detail)
+            if match:
+                retry_after = float(match.group(1))
+        raise ProviderThrottled(f"{provider} 限流 (HTTP 429): {detail[:200]}", retry_after)
+
+    async def _generate(self, model: str, prompt: str, structured_prompt: str, parts: List[Dict],
+                        schema: Dict, max_output_tokens: int):
+        """调用generateContent，返回 (原始响应, 文本, 是否为结构化输出)"""
+        url = f"{self.base_url}/{model}:generateContent"
+        headers = {"Content-Type": "application/json"}
+        params = {"key": self.api_key}
+        data, structured = self._request_body(model, prompt, structured_prompt, parts, schema, max_output_tokens)
+
+        async def exchange():
+            async with self.http.session.post(url, headers=headers, params=params,
+                                              json=data) as response:
+                await self._raise_if_throttled(response, "Gemini")
+                if structured and response.status == 400:
+                    return None, await self._schema_rejected_detail(response)
+                response.raise_for_status()
+                return await response.json(content_type=None), None
+
+        result, rejected_detail = await self.rate_limiter.call("gemini", self.api_key, exchange)
+        if rejected_detail is not None:
+            self._reject_schema(model, rejected_detail)
+            return await self._generate(model, prompt, structured_prompt, parts, schema, max_output_tokens)
+
+        return result, self._response_text(result), structured
+
+    async def _stream_generate(self, model: str, prompt: str, structured_prompt: str, parts: List[Dict],
+                               schema: Dict, max_output_tokens: int, key: str):
+        """调用streamGenerateContent（SSE），key对应的对象语法完整时立即关闭流
+
+        返回 (合成的原始响应, 已收到的文本, 是否为结构化输出, 提前解析出的对象或None)
+        """
+        url = f"{self.base_url}/{model}:streamGenerateContent"
+        headers = {"Content-Type": "application/json"}
+        params = {"key": self.api_key, "alt": "sse"}
+        data, structured = self._request_body(model, prompt, structured_prompt, parts, schema, max_output_tokens)
+
+        async def exchange():
+            parser = StreamingObjectParser(key)
+            value = None
+            usage = None
+            async with self.http.session.post(url, headers=headers, params=params,
+                                              json=data) as response:
+                await self._raise_if_throttled(response, "Gemini")
+                if structured and response.status == 400:
+                    return None, None, None, await self._schema_rejected_detail(response)
+                response.raise_for_status()
+                async for line in response.content:
+                    if not line.startswith(b"data:"):
+                        continue
+                    chunk = json.loads(line[5:])
+                    usage = chunk.get("usageMetadata", usage)
+                    for candidate in chunk.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            value = parser.feed(part.get("text", ""))
+                    if value is not None:
+                        # 所需数据已完整，不再等待模型输出剩余的解释文字
+                        response.close()
+                        break
+            return parser, value, usage, None
+
+        parser, value, usage, rejected_detail = await self.rate_limiter.call("gemini", self.api_key, exchange)
+        if rejected_detail is not None:
+            self._reject_schema(model, rejected_detail)
+            return await self._stream_generate(model, prompt, structured_prompt, parts, schema,
+                                               max_output_tokens, key)
+
+        if not parser.text:
+            raise Exception("Gemini API未返回有效响应")
+
+        result = {
+            "candidates": [{"content": {"parts": [{"text": parser.text}]}}],
+            "usageMetadata": usage,
+            "streamed": True,
+            "closed_early": value is not None
+        }
+        return result, parser.text, structured, value
+
+    @staticmethod
+    def _response_text(result: Dict) -> str:
+        """提取响应文本"""
+        candidates = result.get("candidates", [])
+        if not candidates:
+            raise Exception("Gemini API未返回有效响应")
+
+        content = candidates[0].get("content", {})
+        parts = content.get("parts", [])
+        if not parts:
+            raise Exception("Gemini API响应格式错误")
+
+        return parts[0].get("text", "")
     
-    async def analyze_emotion(self, image_data: bytes, model: Optional[str] = None) -> EmotionResult:
+    async def analyze_emotion(self, image: Union[bytes, PreparedImage],
+                              model: Optional[str] = None) -> EmotionResult:
         """使用Gemini分析情绪"""
         if model is None:
             model = self.models[0]
             
         try:
-            image_base64 = self.encode_image(image_data)
-            
-            url = f"{self.base_url}/{model}:generateContent"
-            headers = {"Content-Type": "application/json"}
-            params = {"key": self.api_key}
-            
-            data = {
-                "contents": [{
-                    "parts": [
-                        {"text": EMOTION_ANALYSIS_PROMPT},
-                        {
-                            "inlineData": {
-                                "mimeType": "image/jpeg",
-                                "data": image_base64
-                            }
-                        }
-                    ]
-                }]
+            # 缩小后的base64负载在同一请求的所有模型尝试间共享
+            mime_type, image_base64 = await PreparedImage.ensure(image).vision_inline_data()
+            image_part = {
+                "inlineData": {
+                    "mimeType": mime_type,
+                    "data": image_base64
+                }
             }
-            
-            response = requests.post(url, headers=headers, params=params, 
-                                   json=data, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            # 解析响应
-            candidates = result.get("candidates", [])
-            if not candidates:
-                raise Exception("Gemini API未返回有效响应")
-            
-            content = candidates[0].get("content", {})
-            parts = content.get("parts", [])
-            if not parts:
-                raise Exception("Gemini API响应格式错误")
-            
-            text_response = parts[0].get("text", "")
+
+            request_args = (model, EMOTION_ANALYSIS_PROMPT, EMOTION_ANALYSIS_SCHEMA_PROMPT, [image_part],
+                            EMOTION_RESPONSE_SCHEMA, ANALYSIS_CONFIG["gemini_max_output_tokens"])
+            emotions_value = None
+            if self.streaming:
+                result, text_response, structured, emotions_value = await self._stream_generate(
+                    *request_args, "emotions"
+                )
+            else:
+                result, text_response, structured = await self._generate(*request_args)
             
             # 解析JSON响应
-            emotions = self.parse_ai_response(text_response)
-            dominant_emotion = get_dominant_emotion(emotions)
-            confidence = emotions.get(dominant_emotion, 0.0)
+            if emotions_value is not None:
+                emotions = normalize_probabilities(emotions_value)
+            elif structured:
+                emotions = parse_structured_emotions(text_response)
+            else:
+                emotions = self.parse_ai_response(text_response)
             
-            return EmotionResult(
+            return EmotionResult.create(
                 emotions=emotions,
-                dominant_emotion=dominant_emotion,
-                confidence=confidence,
                 source=f"gemini-{model}",
-                timestamp=datetime.now(),
                 raw_data=result
             )
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Gemini API调用失败 (model: {model}): {e}")
             raise Exception(f"Gemini 情绪分析失败: {str(e)}")
 
-    async def judge_emotions(self, analysis_results: List[Dict]) -> Dict:
-        """裁判员AI：综合多个分析结果给出最终判断"""
-        try:
-            # 构建输入数据
-            input_data = {
-                "analysis_results": analysis_results
-            }
-
-            # 构建prompt
-            prompt_text = f"{JUDGE_AI_PROMPT}\n\n输入数据：\n{json.dumps(input_data, ensure_ascii=False, indent=2)}"
+    async def analyze_batch(self, images: List[Union[bytes, PreparedImage]],
+                            model: Optional[str] = None):
+        """多图单次调用：一个请求分析所有图像并给出综合判断
 
-            # 使用第一个可用模型
+        返回 (每张图像的EmotionResult列表（响应中缺失的为None）, 综合判断或None)
+        """
+        if model is None:
             model = self.models[0]
-            url = f"{self.base_url}/{model}:generateContent"
-            headers = {"Content-Type": "application/json"}
-            params = {"key": self.api_key}
 
-            data = {
-                "contents": [{
-                    "parts": [{"text": prompt_text}]
-                }]
-            }
-
-            response = requests.post(url, headers=headers, params=params,
-                                   json=data, timeout=30)
-            response.raise_for_status()
-
-            result = response.json()
-
-            # 解析响应
-            candidates = result.get("candidates", [])
-            if not candidates:
-                raise Exception("裁判员AI未返回有效响应")
+        try:
+            parts = []
+            for index, image in enumerate(images, start=1):
+                mime_type, image_base64 = await PreparedImage.ensure(image).vision_inline_data()
+                parts.append({"text": f"图片{index}"})
+                parts.append({"inlineData": {"mimeType": mime_type, "data": image_base64}})
+
+            count = str(len(images))
+            result, text_response, _ = await self._generate(
+                model, BATCH_ANALYSIS_PROMPT.replace("{count}", count),
+                BATCH_ANALYSIS_SCHEMA_PROMPT.replace("{count}", count), parts,
+                BATCH_RESPONSE_SCHEMA, ANALYSIS_CONFIG["gemini_batch_max_output_tokens"]
+            )
 
-            content = candidates[0].get("content", {})
-            parts = content.get("parts", [])
-            if not parts:
-                raise Exception("裁判员AI响应格式错误")
+            data = parse_json_payload(text_response)
+            if data is None or not isinstance(data.get("images"), list):
+                raise Exception("Gemini批量响应格式错误")
+
+            results: List[Optional[EmotionResult]] = [None] * len(images)
+            for position, entry in enumerate(data["images"]):
+                if not isinstance(entry, dict) or not isinstance(entry.get("emotions"), dict):
+                    continue
+                image_id = entry.get("image_id", position + 1)
+                if not isinstance(image_id, int) or not 1 <= image_id <= len(images):
+                    continue
+                results[image_id - 1] = EmotionResult.create(
+                    emotions=normalize_probabilities(entry["emotions"]),
+                    source=f"gemini-{model}",
+                    raw_data={"batch": True, "image_id": image_id, "usageMetadata": result.get("usageMetadata")}
+                )
+
+            verdict = data.get("verdict")
+            if isinstance(verdict, dict) and isinstance(verdict.get("emotions"), dict):
+                verdict = dict(verdict, emotions=normalize_probabilities(verdict["emotions"]), method="gemini_batch")
+            else:
+                verdict = None
+
+            return results, verdict
+
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Gemini批量分析失败 (model: {model}): {e}")
+            raise Exception(f"Gemini 批量情绪分析失败: {str(e)}")
 
-            text_response = parts[0].get("text", "")
-            logger.info(f"裁判员AI原始响应: {text_response[:500]}...")
+    async def judge_emotions(self, analysis_results: List[Dict]) -> Dict:
+        """裁判员AI：综合多个分析结果给出最终判断"""
+        try:
+            # 紧凑列式编码，超出token预算时合并相邻图片
+            input_text = f"\n\n{JUDGE_INPUT_DESCRIPTION}\n{encode_judge_input(analysis_results)}"
+            prompt_text = JUDGE_AI_PROMPT + input_text
+            structured_prompt_text = JUDGE_AI_SCHEMA_PROMPT + input_text
+
+            model = self.judge_model
+            start = time.perf_counter()
+            result, text_response, structured = await self._generate(
+                model, prompt_text, structured_prompt_text, [],
+                JUDGE_RESPONSE_SCHEMA, ANALYSIS_CONFIG["gemini_judge_max_output_tokens"]
+            )
+            self._record_judge_call(structured_prompt_text if structured else prompt_text,
+                                    time.perf_counter() - start, result)
+            logger.debug(f"裁判员AI原始响应: {text_response[:200]}...")
 
-            # 解析JSON响应 - 增强版本
-            judge_result = self._parse_judge_response(text_response)
-            return judge_result
+            # 解析JSON响应
+            if structured:
+                return parse_structured_judge(text_response)
+            return self._parse_judge_response(text_response)
 
         except Exception as e:
             logger.error(f"裁判员AI调用失败: {e}")
@@ -223,114 +534,44 @@ class GeminiService:
                            "surprised": 0.0, "disgusted": 0.0, "fearful": 0.0}
             }
 
+    def _record_judge_call(self, prompt_text: str, latency: float, result: Dict):
+        """记录裁判员调用的提示词大小与延迟"""
+        metrics = self._judge_metrics
+        metrics["calls"] += 1
+        metrics["prompt_chars"] += len(prompt_text)
+        metrics["prompt_tokens_estimate"] += estimate_tokens(prompt_text)
+        prompt_tokens = (result.get("usageMetadata") or {}).get("promptTokenCount")
+        if prompt_tokens is not None:
+            metrics["prompt_tokens_reported"] += prompt_tokens
+        metrics["latency_total"] += latency
+        metrics["last_prompt_chars"] = len(prompt_text)
+        metrics["last_latency"] = latency
+
+    def judge_stats(self) -> Dict:
+        """裁判员调用统计"""
+        metrics = self._judge_metrics
+        calls = metrics["calls"]
+        return {
+            "calls": calls,
+            "avg_prompt_chars": round(metrics["prompt_chars"] / calls, 1) if calls else 0.0,
+            "avg_prompt_tokens_estimate": round(metrics["prompt_tokens_estimate"] / calls, 1) if calls else 0.0,
+            "avg_prompt_tokens_reported": round(metrics["prompt_tokens_reported"] / calls, 1) if calls else 0.0,
+            "avg_latency": round(metrics["latency_total"] / calls, 4) if calls else 0.0,
+            "last_prompt_chars": metrics["last_prompt_chars"],
+            "last_latency": round(metrics["last_latency"], 4)
+        }
+
     def _parse_judge_response(self, text_response: str) -> Dict:
         """解析裁判员AI的响应，支持多种格式"""
-        try:
-            # 方法1: 直接解析JSON
-            if text_response.strip().startswith("{"):
-                return json.loads(text_response.strip())
-
-            # 方法2: 提取```json```代码块
-            import re
-            json_match = re.search(r'```json\s*\n(.*?)\n```', text_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1).strip()
-                logger.info(f"从代码块提取JSON: {json_str[:200]}...")
-                return json.loads(json_str)
-
-            # 方法3: 提取```代码块（无json标识）
-            code_match = re.search(r'```\s*\n(.*?)\n```', text_response, re.DOTALL)
-            if code_match:
-                json_str = code_match.group(1).strip()
-                if json_str.startswith("{"):
-                    logger.info(f"从通用代码块提取JSON: {json_str[:200]}...")
-                    return json.loads(json_str)
-
-            # 方法4: 查找第一个完整的JSON对象
-            brace_count = 0
-            start_idx = -1
-            for i, char in enumerate(text_response):
-                if char == '{':
-                    if start_idx == -1:
-                        start_idx = i
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0 and start_idx != -1:
-                        json_str = text_response[start_idx:i+1]
-                        logger.info(f"提取JSON对象: {json_str[:200]}...")
-                        return json.loads(json_str)
-
-            # 如果都失败了，记录详细错误
-            logger.error(f"无法解析裁判员AI响应，原始内容: {text_response}")
-            raise Exception("裁判员AI未返回有效JSON格式")
-
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析错误: {e}, 内容: {text_response[:500]}")
-            raise Exception(f"JSON格式错误: {str(e)}")
-        except Exception as e:
-            logger.error(f"解析裁判员AI响应失败: {e}")
-            raise
+        return parse_judge_response(text_response)
+
     def parse_ai_response(self, text_response: str) -> Dict[str, float]:
         """解析AI模型的文本响应"""
-        try:
-            logger.info(f"解析AI响应: {text_response[:200]}...")
-
-            # 方法1: 尝试直接解析JSON
-            if text_response.strip().startswith("{"):
-                data = json.loads(text_response.strip())
-                emotions = data.get("emotions", {})
-                logger.info(f"直接JSON解析成功: {emotions}")
-                return normalize_probabilities(emotions)
-
-            # 方法2: 提取```json```代码块
-            import re
-            json_match = re.search(r'```json\s*\n(.*?)\n```', text_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1).strip()
-                logger.info(f"从代码块提取JSON: {json_str}")
-                data = json.loads(json_str)
-                emotions = data.get("emotions", {})
-                logger.info(f"代码块JSON解析成功: {emotions}")
-                return normalize_probabilities(emotions)
-
-            # 方法3: 提取```代码块（无json标识）
-            code_match = re.search(r'```\s*\n(.*?)\n```', text_response, re.DOTALL)
-            if code_match:
-                json_str = code_match.group(1).strip()
-                if json_str.startswith("{"):
-                    logger.info(f"从通用代码块提取JSON: {json_str}")
-                    data = json.loads(json_str)
-                    emotions = data.get("emotions", {})
-                    logger.info(f"通用代码块JSON解析成功: {emotions}")
-                    return normalize_probabilities(emotions)
-
-            # 方法4: 如果不是JSON，尝试提取情绪关键词
-            logger.warning(f"无法解析为JSON，尝试关键词提取: {text_response}")
-            text_lower = text_response.lower()
-            detected_emotions = {}
-
-            for keyword, emotion in AI_EMOTION_MAPPING.items():
-                if keyword in text_lower:
-                    detected_emotions[emotion] = detected_emotions.get(emotion, 0) + 1
-
-            if detected_emotions:
-                # 转换为概率
-                total = sum(detected_emotions.values())
-                for emotion in detected_emotions:
-                    detected_emotions[emotion] = detected_emotions[emotion] / total
-                logger.info(f"关键词提取成功: {detected_emotions}")
-                return normalize_probabilities(detected_emotions)
-
-            # 默认返回中性情绪
-            logger.warning("所有解析方法都失败，返回默认中性情绪")
-            return {"neutral": 1.0}
+        return parse_emotion_response(text_response)
+
 
-        except Exception as e:
-            logger.error(f"解析AI响应失败: {e}, 原始响应: {text_response}")
-            return {"neutral": 1.0}
 class OpenRouterService:
-    """OpenRouter API服务类"""
+    """OpenRouter API服务类（OpenAI兼容的chat/completions接口，复用共享连接池）"""
     
     def __init__(self):
         self.api_key = os.getenv("OPENROUTER_API_KEY", 
@@ -340,120 +581,80 @@ class OpenRouterService:
             "google/gemini-2.0-flash-exp:free",
             "qwen/qwen2.5-vl-32b-instruct:free"
         ]
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key,
-        )
+        self.base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+        self.http = get_http_client()
+        self.rate_limiter = get_rate_limiter()
     
     def encode_image(self, image_data: bytes) -> str:
         """将图像编码为base64"""
         return base64.b64encode(image_data).decode("utf-8")
     
-    async def analyze_emotion(self, image_data: bytes, model: Optional[str] = None) -> EmotionResult:
+    async def analyze_emotion(self, image: Union[bytes, PreparedImage],
+                              model: Optional[str] = None) -> EmotionResult:
         """使用OpenRouter分析情绪"""
         if model is None:
             model = self.models[0]
             
         try:
-            image_base64 = self.encode_image(image_data)
+            mime_type, image_base64 = await PreparedImage.ensure(image).vision_inline_data()
             
-            completion = self.client.chat.completions.create(
-                model=model,
-                messages=[
+            url = f"{self.base_url}/chat/completions"
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://emoscan-app.com",
+                "X-Title": "EmoScan Emotion Analysis"
+            }
+            data = {
+                "model": model,
+                "messages": [
                     {
                         "role": "user",
                         "content": [
                             {"type": "text", "text": EMOTION_ANALYSIS_PROMPT},
                             {
                                 "type": "image_url", 
-                                "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
+                                "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}
                             }
                         ]
                     }
                 ],
-                extra_headers={
-                    "HTTP-Referer": "https://emoscan-app.com",
-                    "X-Title": "EmoScan Emotion Analysis"
-                },
-                timeout=30
-            )
-            
-            text_response = completion.choices[0].message.content
+                "max_tokens": ANALYSIS_CONFIG["openrouter_max_output_tokens"],
+                "temperature": 0
+            }
+
+            async def exchange():
+                async with self.http.session.post(url, headers=headers, json=data) as response:
+                    await GeminiService._raise_if_throttled(response, "OpenRouter")
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+            result = await self.rate_limiter.call("openrouter", self.api_key, exchange)
+
+            # OpenRouter在200响应中也可能返回错误对象
+            if "error" in result:
+                raise Exception(result["error"].get("message", result["error"]))
+
+            choices = result.get("choices", [])
+            text_response = choices[0].get("message", {}).get("content") if choices else None
             if not text_response:
                 raise Exception("OpenRouter返回空响应")
 
             # 解析响应
             emotions = self.parse_ai_response(text_response)
-            dominant_emotion = get_dominant_emotion(emotions)
-            confidence = emotions.get(dominant_emotion, 0.0)
             
-            return EmotionResult(
+            return EmotionResult.create(
                 emotions=emotions,
-                dominant_emotion=dominant_emotion,
-                confidence=confidence,
                 source=f"openrouter-{model}",
-                timestamp=datetime.now(),
-                raw_data={"response": text_response}
+                raw_data={"response": text_response, "usage": result.get("usage")}
             )
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"OpenRouter API调用失败 (model: {model}): {e}")
-            raise Exception(f"OpenRouter 情绪分析失败: {str(e)}")    
+            raise Exception(f"OpenRouter 情绪分析失败: {str(e)}")
+
     def parse_ai_response(self, text_response: str) -> Dict[str, float]:
         """解析AI模型的文本响应（与GeminiService共用）"""
-        try:
-            logger.info(f"解析AI响应: {text_response[:200]}...")
-
-            # 方法1: 尝试直接解析JSON
-            if text_response.strip().startswith("{"):
-                data = json.loads(text_response.strip())
-                emotions = data.get("emotions", {})
-                logger.info(f"直接JSON解析成功: {emotions}")
-                return normalize_probabilities(emotions)
-
-            # 方法2: 提取```json```代码块
-            import re
-            json_match = re.search(r'```json\s*\n(.*?)\n```', text_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1).strip()
-                logger.info(f"从代码块提取JSON: {json_str}")
-                data = json.loads(json_str)
-                emotions = data.get("emotions", {})
-                logger.info(f"代码块JSON解析成功: {emotions}")
-                return normalize_probabilities(emotions)
-
-            # 方法3: 提取```代码块（无json标识）
-            code_match = re.search(r'```\s*\n(.*?)\n```', text_response, re.DOTALL)
-            if code_match:
-                json_str = code_match.group(1).strip()
-                if json_str.startswith("{"):
-                    logger.info(f"从通用代码块提取JSON: {json_str}")
-                    data = json.loads(json_str)
-                    emotions = data.get("emotions", {})
-                    logger.info(f"通用代码块JSON解析成功: {emotions}")
-                    return normalize_probabilities(emotions)
-
-            # 方法4: 如果不是JSON，尝试提取情绪关键词
-            logger.warning(f"无法解析为JSON，尝试关键词提取: {text_response}")
-            text_lower = text_response.lower()
-            detected_emotions = {}
-
-            for keyword, emotion in AI_EMOTION_MAPPING.items():
-                if keyword in text_lower:
-                    detected_emotions[emotion] = detected_emotions.get(emotion, 0) + 1
-
-            if detected_emotions:
-                # 转换为概率
-                total = sum(detected_emotions.values())
-                for emotion in detected_emotions:
-                    detected_emotions[emotion] = detected_emotions[emotion] / total
-                logger.info(f"关键词提取成功: {detected_emotions}")
-                return normalize_probabilities(detected_emotions)
-
-            # 默认返回中性情绪
-            logger.warning("所有解析方法都失败，返回默认中性情绪")
-            return {"neutral": 1.0}
-
-        except Exception as e:
-            logger.error(f"解析AI响应失败: {e}, 原始响应: {text_response}")
-            return {"neutral": 1.0}
\ No newline at end of file
+        return parse_emotion_response(text_response)
@@ -0,0 +1,133 @@
+"""
+本地一致性判定
+统计批量分析中所有结果的一致程度（主导情绪得票率、熵、两两Jensen-Shannon散度），
+结果高度一致时在本地生成裁判结果，只有存在分歧的批次才调用裁判员AI
+"""
+
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..models.emotion import EmotionResult, EmotionVector, EMOTION_CONFIG, EMOTION_KEYS, ANALYSIS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTROPY = math.log2(len(EMOTION_KEYS))
+
+
+def _xlog2(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """逐元素计算 x * log2(x / y)，x为0的位置取0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(x > 0, x * np.log2(x / y), 0.0)
+
+
+def entropy(matrix: np.ndarray) -> np.ndarray:
+    """每行概率分布的归一化熵（0为完全确定，1为均匀分布）"""
+    return -_xlog2(matrix, 1.0).sum(axis=-1) / MAX_ENTROPY
+
+
+def jensen_shannon(matrix: np.ndarray) -> np.ndarray:
+    """所有行两两之间的Jensen-Shannon散度矩阵（以2为底，取值0-1）"""
+    p = matrix[:, None, :]
+    q = matrix[None, :, :]
+    m = (p + q) / 2
+    divergence = (_xlog2(p, m) + _xlog2(q, m)).sum(axis=-1) / 2
+    return np.maximum(divergence, 0.0)
+
+
+@dataclass
+class ConsensusStats:
+    """一致性统计结果"""
+    count: int                   # 参与统计的结果数
+    final_emotion: str           # 得票最多的主导情绪
+    vote_share: float            # 主导情绪得票率
+    mean_entropy: float          # 各结果归一化熵的平均值
+    mean_divergence: float       # 两两JS散度的平均值
+    emotions: Dict[str, float]   # 各结果等权平均后的情绪概率
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "vote_share": round(self.vote_share, 4),
+            "mean_entropy": round(self.mean_entropy, 4),
+            "mean_divergence": round(self.mean_divergence, 4)
+        }
+
+
+class ConsensusEngine:
+    """本地一致性判定器"""
+
+    def __init__(self):
+        self.enabled = ANALYSIS_CONFIG["consensus_enabled"]
+        self.min_results = ANALYSIS_CONFIG["consensus_min_results"]
+        self.vote_threshold = ANALYSIS_CONFIG["consensus_vote_threshold"]
+        self.max_divergence = ANALYSIS_CONFIG["consensus_max_divergence"]
+        self.local_judgements = 0
+        self.llm_judgements = 0
+
+    def evaluate(self, results: List[EmotionResult]) -> ConsensusStats:
+        """计算一组结果的一致性统计"""
+        matrix = EmotionVector.matrix([result.emotions for result in results])
+        count = len(results)
+
+        votes = Counter(result.dominant_emotion for result in results)
+        final_emotion, final_votes = votes.most_common(1)[0]
+
+        # 上三角为两两散度（对角线为0）
+        pair_count = count * (count - 1) // 2
+        divergence = float(np.triu(jensen_shannon(matrix), k=1).sum())
+
+        return ConsensusStats(
+            count=count,
+            final_emotion=final_emotion,
+            vote_share=final_votes / count,
+            mean_entropy=float(entropy(matrix).mean()),
+            mean_divergence=divergence / pair_count if pair_count else 0.0,
+            emotions=EmotionVector(matrix.mean(axis=0)).to_dict()
+        )
+
+    def is_agreed(self, stats: ConsensusStats) -> bool:
+        return (stats.count >= self.min_results
+                and stats.vote_share >= self.vote_threshold
+                and stats.mean_divergence <= self.max_divergence)
+
+    def judge(self, results: List[EmotionResult]) -> Optional[Dict]:
+        """结果足够一致时返回与裁判员AI相同结构的判断结果，否则返回None"""
+        if not self.enabled or not results:
+            self.llm_judgements += 1
+            return None
+
+        stats = self.evaluate(results)
+        if not self.is_agreed(stats):
+            logger.info(f"结果存在分歧，交由裁判员AI判断: {stats.to_dict()}")
+            self.llm_judgements += 1
+            return None
+
+        self.local_judgements += 1
+        emotion_name = EMOTION_CONFIG[stats.final_emotion]["name"]
+        # 散度越大置信度越低
+        confidence = stats.emotions[stats.final_emotion] * (1 - stats.mean_divergence)
+        return {
+            "final_emotion": stats.final_emotion,
+            "confidence": round(confidence, 4),
+            "reasoning": f"{stats.count}个分析结果中{stats.vote_share:.0%}的主导情绪为{emotion_name}，"
+                         f"各结果等权平均得出最终概率",
+            "consistency_analysis": f"平均JS散度{stats.mean_divergence:.3f}，平均熵{stats.mean_entropy:.2f}，"
+                                    f"结果高度一致（本地一致性判定，未调用裁判员AI）",
+            "emotions": stats.emotions,
+            "method": "local_consensus",
+            "statistics": stats.to_dict()
+        }
+
+    def stats(self) -> Dict:
+        total = self.local_judgements + self.llm_judgements
+        return {
+            "enabled": self.enabled,
+            "local_judgements": self.local_judgements,
+            "llm_judgements": self.llm_judgements,
+            "local_rate": round(self.local_judgements / total, 4) if total else 0.0
+        }
@@ -5,7 +5,8 @@
 
 import asyncio
 import logging
-from typing import List, Optional, Dict
+import time
+from typing import AsyncIterator, Callable, List, Optional, Dict, Tuple, Union
 from datetime import datetime
 
 from ..models.emotion import (
@@ -13,15 +14,74 @@ from ..models.emotion import (
     AnalysisResponse,
     BatchAnalysisResponse,
     EmotionData,
-    create_emotion_data_list,
-    normalize_probabilities,
-    get_dominant_emotion
+    EmotionVector,
+    ANALYSIS_CONFIG,
+    create_emotion_data_list
 )
 from .facepp_service import FacePPService
 from .ai_service import GeminiService, OpenRouterService
+from .result_cache import EmotionResultCache
+from .result_store import ResultStore
+from .image_preprocess import PreparedImage
+from .image_hash import dhash, group_near_duplicates
+from .model_router import CircuitOpenError, ModelRouter
+from .face_detector import get_face_detector
+from .local_model_service import LocalEmotionService
+from .consensus import ConsensusEngine
+from .rate_limiter import RateLimitExceeded, get_rate_limiter
+from .single_flight import SingleFlight
+from .pending_results import PendingResults
 
 logger = logging.getLogger(__name__)
 
+# 旧版本缓存/结果存储中的无人脸占位结果来源（中性、置信度0），不作为投票参与融合与判断
+NO_FACE_SOURCE = "local-noface"
+
+
+class NoFaceDetected(Exception):
+    """本地人脸检测未发现人脸，未调用AI模型"""
+
+
+# 单个服务完成时的回调，参数为服务名（facepp/gemini/local/openrouter）与该服务的结果（EmotionResult/None/异常）
+ResultCallback = Callable[[str, Union[EmotionResult, Exception, None]], None]
+# 流式分析事件：(事件名, 数据)
+StreamEvent = Tuple[str, Dict]
+
+
+class _Progress:
+    """把后台任务的进度回调转为异步迭代，迭代结束（任务完成）后由result()取得任务返回值"""
+
+    _END = object()
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Future] = None
+
+    def report(self, *item):
+        self._queue.put_nowait(item)
+
+    def start(self, coro) -> "_Progress":
+        self.task = asyncio.ensure_future(coro)
+        self.task.add_done_callback(lambda _task: self._queue.put_nowait(self._END))
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._queue.get()
+        if item is self._END:
+            raise StopAsyncIteration
+        return item
+
+    def result(self):
+        return self.task.result()
+
+    def cancel(self):
+        # 客户端断开等情况下停止后台分析
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
 
 class EmotionAnalyzer:
     """情绪分析统合服务"""
@@ -29,32 +89,205 @@ class EmotionAnalyzer:
     def __init__(self):
         self.facepp_service = FacePPService()
         self.gemini_service = GeminiService()
-        # 暂时禁用OpenRouter服务以避免版本兼容问题
-        # self.openrouter_service = OpenRouterService()
-        self.openrouter_service = None
-    async def analyze_image(self, image_data: bytes) -> AnalysisResponse:
-        """分析图像情绪，整合多个API结果"""
-        results = []
-        errors = []
+        # OpenRouter模式: off/hedge（Gemini较慢或失败时作为对冲目标）/parallel（与Face++、Gemini并行调用）
+        self.openrouter_mode = ANALYSIS_CONFIG["openrouter_mode"]
+        self.openrouter_service = OpenRouterService() if self.openrouter_mode != "off" else None
+        # 每个服务独立的并发上限（信号量在首次使用时于事件循环内创建）
+        self._concurrency_limits = {
+            "facepp": ANALYSIS_CONFIG["facepp_max_concurrency"],
+            "gemini": ANALYSIS_CONFIG["gemini_max_concurrency"],
+            "openrouter": ANALYSIS_CONFIG["openrouter_max_concurrency"],
+        }
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 结果持久化存储（重启后恢复缓存、离线回放）
+        self.result_store = ResultStore() if ANALYSIS_CONFIG["result_store_enabled"] else None
+        # 内容寻址结果缓存（相同图像字节不再重复调用外部API）
+        self.result_cache = EmotionResultCache(store=self.result_store)
+        # 相同图像+服务的并发调用共享一个进行中的任务
+        self.in_flight = SingleFlight()
+        # 超出延迟预算后仍在后台运行的请求（可按请求ID查询完整结果）
+        self.pending_results = PendingResults()
+        # 模型健康度路由与熔断
+        self.model_router = ModelRouter()
+        # 本地表情模型（off/primary/fallback/vote）
+        self.local_service = LocalEmotionService()
+        self.local_mode = ANALYSIS_CONFIG["local_model_mode"] if self.local_service.available else "off"
+        self.consensus = ConsensusEngine()
+
+    def _provider_semaphore(self, provider: str) -> asyncio.Semaphore:
+        """获取服务对应的并发信号量"""
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._concurrency_limits[provider])
+            self._semaphores[provider] = semaphore
+        return semaphore
+
+    def get_stats(self) -> Dict:
+        """运行时统计信息"""
+        return {
+            "result_cache": self.result_cache.stats(),
+            "single_flight": self.in_flight.stats(),
+            "pending_results": self.pending_results.stats(),
+            "routing": self.model_router.snapshot(),
+            "local_model": dict(self.local_service.stats(), mode=self.local_mode),
+            "consensus": self.consensus.stats(),
+            "judge": self.gemini_service.judge_stats(),
+            "rate_limits": get_rate_limiter().stats(),
+            "result_store": self.result_store.stats() if self.result_store is not None else None
+        }
+
+    async def close(self):
+        """释放后台任务"""
+        self.pending_results.cancel_all()
+        await self.local_service.close()
+        if self.result_store is not None:
+            # 等待后台线程写完队列中的结果
+            await asyncio.get_running_loop().run_in_executor(None, self.result_store.close)
+
+    async def rehydrate_cache(self) -> int:
+        """从结果存储恢复内存缓存（只恢复仍在缓存有效期内的结果），返回恢复的条目数"""
+        if self.result_store is None or not ANALYSIS_CONFIG["result_store_rehydrate"]:
+            return 0
+        loop = asyncio.get_running_loop()
+        try:
+            loaded = await loop.run_in_executor(
+                None, self.result_store.load_recent, self.result_cache.ttl, self.result_cache.max_entries
+            )
+        except Exception as e:
+            logger.error(f"从结果存储恢复缓存失败: {e}")
+            return 0
+        # 旧结果先写入，LRU顺序与存储时一致
+        for cache_key, result, age in reversed(loaded):
+            self.result_cache.put(cache_key, result, age=age, persist=False)
+        logger.info(f"已从结果存储恢复{len(loaded)}条缓存结果")
+        return len(loaded)
+
+    def replay_image(self, digest: str) -> AnalysisResponse:
+        """用存储的各服务最新结果重新生成分析响应（不调用外部API）；只采用当前配置会调用的服务/模型组合"""
+        if self.result_store is None:
+            raise RuntimeError("结果存储未启用")
+        results = self.result_store.latest_results(digest, self._cache_providers())
+        if not results:
+            return AnalysisResponse(
+                success=False,
+                emotion_data=[],
+                analysis_text="",
+                error_message=f"结果存储中没有该图像的记录: {digest}"
+            )
+        return self._build_response(results)
+
+    async def analyze_image(self, image_data: bytes, budget: Optional[float] = None) -> AnalysisResponse:
+        """分析图像情绪，整合多个API结果
+
+        budget为延迟预算（秒，默认使用配置，0表示等待所有服务）：超出时返回已到达结果的融合（partial），
+        未完成的服务在后台继续运行并写入结果缓存，完整结果可按request_id查询
+        """
+        # 同一请求内所有服务共享一次解码的预处理图像
+        image = PreparedImage(image_data)
+        budget = ANALYSIS_CONFIG["analysis_latency_budget"] if budget is None else budget
 
         # 并发调用Face++和AI模型
-        tasks = [
-            self._call_facepp(image_data),
-            self._call_ai_models(image_data)
-        ]
+        if budget <= 0:
+            completed_results = await self._call_providers(image)
+            return self._build_response(completed_results)
 
-        # 等待所有任务完成
-        completed_results = await asyncio.gather(*tasks, return_exceptions=True)
+        outcomes = []
+        has_result = asyncio.Event()
 
-        # 处理结果
+        def collect(provider, outcome):
+            outcomes.append(outcome)
+            if isinstance(outcome, EmotionResult):
+                has_result.set()
+
+        task = asyncio.ensure_future(self._call_providers(image, on_result=collect))
+        try:
+            await asyncio.wait([task], timeout=budget)
+            if not task.done() and not has_result.is_set():
+                # 预算内没有任何成功结果：等到第一个成功结果或全部完成
+                waiter = asyncio.ensure_future(has_result.wait())
+                try:
+                    await asyncio.wait([task, waiter], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        if task.done():
+            return self._build_response(task.result())
+
+        # 返回部分结果，未完成的服务在后台继续运行
+        request_id = self.pending_results.register(task, outcomes)
+        logger.info(f"超出延迟预算{budget}s，返回部分结果（{len(outcomes)}个服务已返回），请求ID: {request_id}")
+        return self._build_response(list(outcomes), partial=True, request_id=request_id)
+
+    def get_result(self, request_id: str) -> Optional[AnalysisResponse]:
+        """查询部分结果请求的当前结果：后台任务完成后为完整结果，否则为已到达结果的融合；请求ID不存在或已过期时返回None"""
+        entry = self.pending_results.get(request_id)
+        if entry is None:
+            return None
+        if not entry.done:
+            return self._build_response(list(entry.outcomes), partial=True, request_id=request_id)
+        if entry.task.cancelled() or entry.task.exception() is not None:
+            # 后台任务被取消（服务关闭）或异常时只有已到达的结果
+            return self._build_response(list(entry.outcomes), partial=True, request_id=request_id)
+        return self._build_response(entry.task.result(), request_id=request_id)
+
+    async def stream_image(self, image_data: bytes) -> AsyncIterator[StreamEvent]:
+        """流式分析图像情绪，依次产出事件：header（报告头，立即产出）、section（每个服务成功时）、
+        provider_error（每个服务失败或超时时）、verdict（融合结论）、emotion_data（结构化结果）；
+        迭代中途停止时取消进行中的分析"""
+        image = PreparedImage(image_data)
+        yield "header", {"text": self._text_chunk(self._analysis_header_lines())}
+
+        progress = _Progress()
+        progress.start(self._call_providers(image, on_result=progress.report))
+        try:
+            async for provider, outcome in progress:
+                if isinstance(outcome, EmotionResult):
+                    yield "section", dict(self._result_summary(outcome),
+                                          text=self._text_chunk(self._analysis_result_lines(outcome)))
+                else:
+                    yield "provider_error", self._provider_failure(provider, outcome)
+            completed_results = progress.result()
+        finally:
+            progress.cancel()
+
+        results, errors = self._partition_results(completed_results)
+        if not results:
+            yield "verdict", {"text": self._text_chunk(self._analysis_failed_lines())}
+            yield "emotion_data", {"success": False, "emotion_data": [],
+                                   "error_message": "所有情绪分析API都失败了: " + "; ".join(errors)}
+            return
+
+        merged = self._merge_results(results)
+        yield "verdict", {"text": self._text_chunk(self._analysis_verdict_lines(results, errors, merged)),
+                          "dominant_emotion": merged.dominant, "confidence": merged.confidence}
+        yield "emotion_data", {"success": True, "emotion_data": merged.to_emotion_data(),
+                               "error_message": "; ".join(errors) if errors else None}
+
+    @staticmethod
+    def _partition_results(completed_results: list) -> Tuple[List[EmotionResult], List[str]]:
+        """各服务的结果（EmotionResult/None/异常）分为成功结果与错误信息"""
+        results = []
+        errors = []
         for result in completed_results:
             if isinstance(result, Exception):
                 errors.append(str(result))
                 logger.warning(f"API调用失败: {result}")
-            elif result is not None:
+            elif result is not None and result.source != NO_FACE_SOURCE:
                 results.append(result)
                 # 添加详细日志
                 logger.info(f"API调用成功 - 来源: {result.source}, 主导情绪: {result.dominant_emotion}, 置信度: {result.confidence:.2f}")
+        return results, errors
+
+    def _build_response(self, completed_results: list, partial: bool = False,
+                        request_id: Optional[str] = None) -> AnalysisResponse:
+        """融合各服务的结果（EmotionResult/None/异常）生成分析响应
+
+        partial表示超出延迟预算、只包含已返回的服务结果，request_id为可查询完整结果的请求ID
+        """
+        results, errors = self._partition_results(completed_results)
 
         # 如果没有任何成功结果，返回错误
         if not results:
@@ -63,82 +296,388 @@ class EmotionAnalyzer:
                 success=False,
                 emotion_data=[],
                 analysis_text="",
-                error_message=error_msg
+                error_message=error_msg,
+                partial=partial,
+                request_id=request_id
             )
 
-        # 融合结果
-        merged_emotions = self._merge_results(results)
-        emotion_data_list = create_emotion_data_list(merged_emotions)
-        analysis_text = self._generate_analysis_text(results, errors)
+        # 融合结果（每个请求只计算一次，分析文本复用同一结果）
+        merged = self._merge_results(results)
+        analysis_text = self._generate_analysis_text(results, errors, merged, partial)
 
         return AnalysisResponse(
             success=True,
-            emotion_data=emotion_data_list,
+            emotion_data=merged.to_emotion_data(),
             analysis_text=analysis_text,
-            error_message=None if not errors else "; ".join(errors)
+            error_message=None if not errors else "; ".join(errors),
+            partial=partial,
+            request_id=request_id
         )
-    async def _call_facepp(self, image_data: bytes) -> Optional[EmotionResult]:
+
+    async def _call_providers(self, image: PreparedImage, ai_call=None,
+                              on_result: Optional[ResultCallback] = None) -> list:
+        """按配置调用各情绪分析服务，返回结果列表（EmotionResult/None/异常）
+
+        ai_call为AI模型结果的协程（批量模式下由多图单次调用提供），默认单独调用；
+        on_result在每个服务完成时以服务名与其结果调用（流式响应用）
+        """
+        def observe(coro, provider: str):
+            return self._observed(coro, on_result, provider) if on_result is not None else coro
+
+        results = []
+        if self.local_mode == "primary":
+            # 本地模型优先：置信度足够时不再调用远程服务
+            local_result = await observe(self._call_local(image), "local")
+            if local_result is not None and local_result.confidence >= ANALYSIS_CONFIG["local_model_primary_confidence"]:
+                if ai_call is not None:
+                    ai_call.close()
+                return [local_result]
+            results.append(local_result)
+
+        tasks = [
+            (self._call_facepp(image), "facepp"),
+            (ai_call if ai_call is not None else self._call_ai_models(image), "gemini")
+        ]
+        if self.local_mode == "vote":
+            tasks.append((self._call_local(image), "local"))
+        if self.openrouter_mode == "parallel":
+            tasks.append((self._call_openrouter(image), "openrouter"))
+
+        results.extend(await asyncio.gather(*[observe(task, provider) for task, provider in tasks],
+                                            return_exceptions=True))
+
+        if self.local_mode == "fallback" and not any(isinstance(result, EmotionResult) for result in results):
+            # 远程服务全部失败时使用本地模型
+            results.append(await observe(self._call_local(image), "local"))
+
+        return results
+
+    @staticmethod
+    async def _observed(coro, on_result: ResultCallback, provider: str):
+        """等待一个服务调用，并把服务名与结果（或异常）交给回调"""
+        try:
+            result = await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            on_result(provider, e)
+            raise
+        on_result(provider, result)
+        return result
+
+    async def _call_local(self, image: PreparedImage) -> Optional[EmotionResult]:
+        """调用本地表情模型"""
+        cache_key = self.result_cache.make_key(image.digest, self.local_service.identity)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return await self.in_flight.do(cache_key, lambda: self._fetch_local(image, cache_key))
+
+    async def _fetch_local(self, image: PreparedImage, cache_key: str) -> Optional[EmotionResult]:
+        try:
+            result = await self.local_service.analyze_emotion(image)
+            self.result_cache.put(cache_key, result)
+            return result
+        except Exception as e:
+            logger.error(f"本地表情模型调用失败: {e}")
+            return None
+
+    async def _call_facepp(self, image: PreparedImage) -> Optional[EmotionResult]:
         """调用Face++ API"""
+        cache_key = self.result_cache.make_key(image.digest, "facepp")
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return await self.in_flight.do(cache_key, lambda: self._fetch_facepp(image, cache_key))
+
+    async def _fetch_facepp(self, image: PreparedImage, cache_key: str) -> Optional[EmotionResult]:
+        if not self.model_router.is_available("facepp"):
+            logger.warning("Face++ 熔断中，跳过调用")
+            return None
+
         try:
-            return await self.facepp_service.analyze_emotion(image_data)
+            async with self._provider_semaphore("facepp"):
+                result = await self._routed_call("facepp", self.facepp_service.analyze_emotion(image))
+            self.result_cache.put(cache_key, result)
+            return result
         except Exception as e:
             logger.error(f"Face++ API调用失败: {e}")
             return None
+
+    async def _routed_call(self, route_name: str, coro):
+        """执行一次外部调用，并把结果与延迟记录到模型路由"""
+        if not self.model_router.try_acquire_probe(route_name):
+            coro.close()
+            raise CircuitOpenError(f"{route_name} 熔断中（半开探测进行中），跳过调用")
+        start = time.monotonic()
+        try:
+            result = await coro
+        except (asyncio.CancelledError, RateLimitExceeded):
+            # 取消或本地限流排队超时不计为服务故障
+            self.model_router.release(route_name)
+            raise
+        except Exception:
+            self.model_router.record_failure(route_name)
+            raise
+        self.model_router.record_success(route_name, time.monotonic() - start)
+        return result
     
-    async def _call_ai_models(self, image_data: bytes) -> Optional[EmotionResult]:
+    def _ordered_routes(self, provider: str, models: List[str]) -> List[str]:
+        """按健康度与延迟排序某个服务的模型路由（跳过熔断中的模型）"""
+        routes = [f"{provider}:{model}" for model in models]
+        ordered = self.model_router.order(routes)
+        if len(ordered) < len(routes):
+            logger.warning(f"跳过熔断中的模型: {sorted(set(routes) - set(ordered))}")
+        return ordered
+
+    def _ai_cache_provider(self) -> str:
+        """AI模型结果的缓存标识（包含模型列表，模型配置变化后不会命中旧结果）"""
+        cache_provider = "gemini:" + ",".join(self.gemini_service.models)
+        if self.openrouter_mode == "hedge":
+            cache_provider += "|openrouter:" + ",".join(self.openrouter_service.models)
+        return cache_provider
+
+    def _openrouter_cache_provider(self) -> str:
+        """parallel模式下OpenRouter结果的缓存标识"""
+        return "openrouter:" + ",".join(self.openrouter_service.models)
+
+    def _cache_providers(self) -> List[str]:
+        """当前配置下各服务的缓存标识"""
+        providers = ["facepp", self._ai_cache_provider()]
+        if self.local_mode != "off":
+            providers.append(self.local_service.identity)
+        if self.openrouter_mode == "parallel":
+            providers.append(self._openrouter_cache_provider())
+        return providers
+
+    def _ai_cache_key(self, image: PreparedImage) -> str:
+        return self.result_cache.make_key(image.digest, self._ai_cache_provider())
+
+    async def _call_ai_models(self, image: PreparedImage) -> Optional[EmotionResult]:
         """调用AI模型API（带容错机制）"""
-        # 尝试Gemini模型
-        for model in self.gemini_service.models:
-            try:
-                return await self.gemini_service.analyze_emotion(image_data, model)
-            except Exception as e:
-                logger.warning(f"Gemini模型 {model} 调用失败: {e}")
-                continue
-        
-        # OpenRouter模型暂时禁用（版本兼容问题）
-        # 后续可以在修复版本兼容性后重新启用
+        cache_key = self._ai_cache_key(image)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return self._reject_no_face(cached)
+        return await self.in_flight.do(cache_key, lambda: self._fetch_ai_models(image, cache_key))
+
+    @staticmethod
+    def _reject_no_face(result: Optional[EmotionResult]) -> Optional[EmotionResult]:
+        """旧版本缓存的无人脸占位结果按无人脸处理（不作为中性投票）"""
+        if result is not None and result.source == NO_FACE_SOURCE:
+            raise NoFaceDetected("本地检测未发现人脸，未调用AI模型")
+        return result
+
+    async def _fetch_ai_models(self, image: PreparedImage, cache_key: str) -> Optional[EmotionResult]:
+        hedge_openrouter = self.openrouter_mode == "hedge"
+        # 本地人脸检测：无人脸的帧不调用外部API，也不产生结果（避免作为中性投票影响融合）
+        if not await self._has_face(image):
+            logger.info("本地检测未发现人脸，跳过AI模型调用")
+            raise NoFaceDetected("本地检测未发现人脸，未调用AI模型")
+
+        # 按健康度与延迟排序；hedge模式下首选OpenRouter模型紧随首选Gemini模型，
+        # Gemini较慢时对冲到另一家服务，而不是同一服务的另一个模型
+        routes = self._ordered_routes("gemini", self.gemini_service.models)
+        if hedge_openrouter:
+            openrouter_routes = self._ordered_routes("openrouter", self.openrouter_service.models)
+            routes = routes[:1] + openrouter_routes[:1] + routes[1:] + openrouter_routes[1:]
+
+        result = await self._race_ai_models(image, routes)
+        if result is not None:
+            self.result_cache.put(cache_key, result)
+            return result
         
         logger.error("所有AI模型都调用失败")
         return None
+
+    @staticmethod
+    async def _has_face(image: PreparedImage) -> bool:
+        """启用人脸裁剪时本地检测是否发现人脸（未启用或检测器不可用时视为有人脸）"""
+        if ANALYSIS_CONFIG["face_crop_enabled"] and get_face_detector().available:
+            return await image.face_box() is not None
+        return True
+
+    async def _call_ai_models_batch(self, images: List[PreparedImage]):
+        """多图单次调用Gemini，返回 (每张图像的结果（失败或缺失为None，无人脸为NoFaceDetected）, 综合判断或None)
+
+        已缓存的图像与本地检测无人脸的图像不再发送；只有本次调用覆盖了全部图像时综合判断才有效；
+        需要发送的图像不足两张时不做单次调用，由各图像单独调用
+        """
+        results: List[Union[EmotionResult, NoFaceDetected, None]] = [
+            self.result_cache.get(self._ai_cache_key(image)) for image in images
+        ]
+        pending = [index for index, result in enumerate(results) if result is None]
+        has_face = await asyncio.gather(*[self._has_face(images[index]) for index in pending])
+        for index, face in zip(pending, has_face):
+            if not face:
+                results[index] = NoFaceDetected("本地检测未发现人脸，未调用AI模型")
+        pending = [index for index, face in zip(pending, has_face) if face]
+        if len(pending) < 2:
+            return results, None
+
+        # 批量调用的延迟与单图不同，使用独立的路由统计
+        for route in self.model_router.order([f"gemini-batch:{model}" for model in self.gemini_service.models]):
+            model = route.split(":", 1)[1]
+            try:
+                async with self._provider_semaphore("gemini"):
+                    batch_results, verdict = await self._routed_call(
+                        route, self.gemini_service.analyze_batch([images[index] for index in pending], model)
+                    )
+            except Exception as e:
+                logger.warning(f"Gemini批量调用失败 (model: {model}): {e}")
+                continue
+
+            for index, result in zip(pending, batch_results):
+                if result is not None:
+                    results[index] = result
+                    self.result_cache.put(self._ai_cache_key(images[index]), result)
+            logger.info(f"Gemini多图单次调用完成: {len(pending)}张图像, 模型: {model}")
+            return results, verdict if len(pending) == len(images) else None
+
+        return results, None
+
+    async def _batch_ai_result(self, batch_task: asyncio.Future, index: int,
+                               image: PreparedImage) -> Optional[EmotionResult]:
+        """从多图单次调用中取出一张图像的结果，缺失时单独调用，本地检测无人脸时抛出NoFaceDetected"""
+        try:
+            results, _ = await asyncio.shield(batch_task)
+            result = results[index]
+        except Exception:
+            result = None
+        if isinstance(result, NoFaceDetected):
+            logger.info(f"图像{index + 1}本地检测未发现人脸，未发送到Gemini多图单次调用")
+            raise result
+        if result is None:
+            return await self._call_ai_models(image)
+        return self._reject_no_face(result)
+
+    async def _call_openrouter(self, image: PreparedImage) -> Optional[EmotionResult]:
+        """parallel模式：OpenRouter作为独立服务调用"""
+        cache_key = self.result_cache.make_key(image.digest, self._openrouter_cache_provider())
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return await self.in_flight.do(cache_key, lambda: self._fetch_openrouter(image, cache_key))
+
+    async def _fetch_openrouter(self, image: PreparedImage, cache_key: str) -> Optional[EmotionResult]:
+        result = await self._race_ai_models(
+            image, self._ordered_routes("openrouter", self.openrouter_service.models)
+        )
+        if result is None:
+            raise Exception("OpenRouter所有模型都调用失败")
+        self.result_cache.put(cache_key, result)
+        return result
+
+    async def _attempt_ai_model(self, image: PreparedImage, route: str) -> EmotionResult:
+        """单个模型的一次调用尝试（route为 "服务:模型"）"""
+        provider, model = route.split(":", 1)
+        service = self.openrouter_service if provider == "openrouter" else self.gemini_service
+        async with self._provider_semaphore(provider):
+            return await self._routed_call(route, service.analyze_emotion(image, model))
+
+    async def _race_ai_models(self, image: PreparedImage, routes: List[str]) -> Optional[EmotionResult]:
+        """对冲请求：主模型超过对冲延迟未返回时并行启动下一个模型，最先成功者胜出，其余取消"""
+        hedge_delay = ANALYSIS_CONFIG["gemini_hedge_delay"]
+        max_parallel = max(1, ANALYSIS_CONFIG["gemini_max_parallel_attempts"])
+        pending: Dict[asyncio.Task, str] = {}
+        remaining = list(routes)
+
+        def launch_next():
+            route = remaining.pop(0)
+            task = asyncio.ensure_future(self._attempt_ai_model(image, route))
+            pending[task] = route
+
+        try:
+            if remaining:
+                launch_next()
+
+            while pending:
+                can_hedge = bool(remaining) and len(pending) < max_parallel
+                done, _ = await asyncio.wait(
+                    list(pending),
+                    timeout=hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # 对冲延迟已到，启动下一个模型并行竞速
+                    logger.info(f"AI模型 {list(pending.values())} 超过对冲延迟{hedge_delay}s，启动 {remaining[0]}")
+                    launch_next()
+                    continue
+
+                winner = None
+                for task in done:
+                    route = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        winner = winner or task.result()
+                    else:
+                        logger.warning(f"AI模型 {route} 调用失败: {error}")
+
+                if winner is not None:
+                    logger.info(f"AI模型竞速胜出: {winner.source}")
+                    return winner
+
+                # 失败后立即补位下一个模型
+                while remaining and len(pending) < max_parallel:
+                    launch_next()
+
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
     
-    def _merge_results(self, results: List[EmotionResult]) -> Dict[str, float]:
-        """融合多个分析结果"""
+    @staticmethod
+    def _result_weight(result: EmotionResult) -> float:
+        """融合权重：Face++ 0.6，AI模型 0.4，本地模型按配置权重，无人脸占位结果不参与"""
+        if result.source == NO_FACE_SOURCE:
+            return 0.0
+        if result.source == "facepp":
+            return 0.6
+        if result.source == "local":
+            return ANALYSIS_CONFIG["local_model_weight"]
+        return 0.4
+
+    def _merge_results(self, results: List[EmotionResult]) -> EmotionVector:
+        """融合多个分析结果（加权平均后标准化）"""
         if not results:
-            return {"neutral": 1.0}
-        
+            return EmotionVector.neutral()
+
         if len(results) == 1:
-            return results[0].emotions
-        
-        # 加权平均：Face++ 权重0.6，AI模型权重0.4
-        merged_emotions = {}
-        total_weight = 0
-        
-        for result in results:
-            weight = 0.6 if result.source == "facepp" else 0.4
-            total_weight += weight
-            
-            for emotion, value in result.emotions.items():
-                merged_emotions[emotion] = merged_emotions.get(emotion, 0) + value * weight
-        
-        # 标准化
-        if total_weight > 0:
-            for emotion in merged_emotions:
-                merged_emotions[emotion] = merged_emotions[emotion] / total_weight
-        
-        return normalize_probabilities(merged_emotions)    
-    def _generate_analysis_text(self, results: List[EmotionResult], 
-                               errors: List[str]) -> str:
-        """生成分析文本（兼容前端打字机效果）"""
-        if not results:
-            return ">>> 情绪分析失败 <<<\n\n所有API调用都失败了。"
-        
-        # 获取融合后的主导情绪
-        merged_emotions = self._merge_results(results)
-        dominant_emotion = get_dominant_emotion(merged_emotions)
-        confidence = merged_emotions.get(dominant_emotion, 0.0)
-        
-        # 生成分析报告
-        analysis_lines = [
+            return results[0].vector
+
+        return EmotionVector.fuse(EmotionVector.matrix([result.emotions for result in results]),
+                                  [self._result_weight(result) for result in results])
+
+    @staticmethod
+    def _text_chunk(lines: List[str]) -> str:
+        """流式输出的文本片段（各片段依次拼接即为完整报告）"""
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _result_summary(result: EmotionResult) -> Dict:
+        """单个服务结果的摘要（流式事件数据）"""
+        return {
+            "source": result.source,
+            "dominant_emotion": result.dominant_emotion,
+            "confidence": result.confidence,
+            "emotions": result.emotions
+        }
+
+    @staticmethod
+    def _provider_failure(provider: str, outcome: Union[Exception, None]) -> Dict:
+        """单个服务失败或超时的摘要（流式事件数据；服务内部已处理的失败返回None）"""
+        error = str(outcome) if isinstance(outcome, Exception) else f"{provider} 调用失败或超时，未返回结果"
+        return {"source": provider, "success": False, "error": error}
+
+    @staticmethod
+    def _analysis_failed_lines() -> List[str]:
+        return [">>> 情绪分析失败 <<<", "", "所有API调用都失败了。"]
+
+    @staticmethod
+    def _analysis_header_lines() -> List[str]:
+        """分析报告头"""
+        return [
             ">>> NEURAL NETWORK ANALYSIS COMPLETE <<<",
             "",
             "EMOTIONAL SIGNATURE DETECTED:",
@@ -146,26 +685,29 @@ class EmotionAnalyzer:
             "",
             "MULTI-API ANALYSIS RESULTS:",
         ]
-        
-        # 添加各API结果 - 增强调试信息
-        for result in results:
-            source_name = result.source.upper()
-            result_dominant = result.dominant_emotion.upper()
-            result_confidence = int(result.confidence * 100)
 
-            # 记录详细信息用于调试
-            logger.info(f"分析结果 - 来源: {source_name}, 主导情绪: {result_dominant}, 置信度: {result_confidence}%, 时间戳: {result.timestamp}")
-            logger.info(f"详细情绪分布: {result.emotions}")
+    @staticmethod
+    def _analysis_result_lines(result: EmotionResult) -> List[str]:
+        """单个服务结果的报告段落"""
+        source_name = result.source.upper()
+        result_dominant = result.dominant_emotion.upper()
+        result_confidence = int(result.confidence * 100)
 
-            analysis_lines.extend([
-                f"• {source_name}: {result_dominant} ({result_confidence}%)"
-            ])
-        
-        analysis_lines.extend([
+        # 记录详细信息用于调试
+        logger.info(f"分析结果 - 来源: {source_name}, 主导情绪: {result_dominant}, 置信度: {result_confidence}%, 时间戳: {result.timestamp}")
+        logger.info(f"详细情绪分布: {result.emotions}")
+
+        return [f"• {source_name}: {result_dominant} ({result_confidence}%)"]
+
+    @staticmethod
+    def _analysis_verdict_lines(results: List[EmotionResult], errors: List[str],
+                                merged: EmotionVector, partial: bool = False) -> List[str]:
+        """融合结论、系统状态与警告段落（partial为只包含部分服务结果）"""
+        verdict_lines = [
             "",
             "CONSOLIDATED ANALYSIS:",
-            f"• Primary Emotion: {dominant_emotion.upper()}",
-            f"• Confidence Level: {int(confidence * 100)}%",
+            f"• Primary Emotion: {merged.dominant.upper()}",
+            f"• Confidence Level: {int(merged.confidence * 100)}%",
             f"• Data Sources: {len(results)} API(s)",
             "",
             "BIOMETRIC DATA:",
@@ -175,79 +717,231 @@ class EmotionAnalyzer:
             "",
             f"ANALYSIS TIMESTAMP: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
             "SYSTEM STATUS: OPERATIONAL",
-        ])
-        
+        ]
+
+        if partial:
+            verdict_lines.extend([
+                "",
+                "⚠ PARTIAL RESULT:",
+                "• 部分服务超出延迟预算，结果将在后台补全"
+            ])
+
         # 如果有错误，添加错误信息
         if errors:
-            analysis_lines.extend([
+            verdict_lines.extend([
                 "",
                 "⚠ SYSTEM WARNINGS:",
                 *[f"• {error}" for error in errors[:3]]  # 最多显示3个错误
             ])
-        
+
+        return verdict_lines
+
+    def _generate_analysis_text(self, results: List[EmotionResult],
+                               errors: List[str], merged: EmotionVector, partial: bool = False) -> str:
+        """生成分析文本（兼容前端打字机效果），merged为已计算的融合结果"""
+        if not results:
+            return "\n".join(self._analysis_failed_lines())
+
+        # 报告头、各API结果、融合结论（流式接口按同样的段落逐段输出）
+        analysis_lines = self._analysis_header_lines()
+        for result in results:
+            analysis_lines.extend(self._analysis_result_lines(result))
+        analysis_lines.extend(self._analysis_verdict_lines(results, errors, merged, partial))
+
         return "\n".join(analysis_lines)
 
     async def analyze_batch_images(self, images_data: List[bytes]) -> BatchAnalysisResponse:
         """批量分析多张图像，使用裁判员AI给出最终判断"""
         if not images_data:
-            return BatchAnalysisResponse(
-                success=False,
-                emotion_data=[],
-                analysis_text="",
-                detailed_results=[],
-                judge_result=None,
-                error_message="没有提供图像数据"
-            )
+            return self._empty_batch_response()
+
+        detailed_results, all_results, judge_result, errors = await self._analyze_batch(images_data)
+        return self._build_batch_response(detailed_results, all_results, judge_result, errors, len(images_data))
+
+    async def stream_batch_images(self, images_data: List[bytes]) -> AsyncIterator[StreamEvent]:
+        """流式批量分析，依次产出事件：header（报告头，立即产出）、result（每个 图像+服务 完成时，含失败）、
+        section（每张图像的所有服务完成时）、verdict（最终判断）、emotion_data（结构化结果）；
+        迭代中途停止时取消进行中的分析"""
+        if not images_data:
+            response = self._empty_batch_response()
+            yield "emotion_data", {"success": False, "emotion_data": [], "detailed_results": [],
+                                   "judge_result": None, "error_message": response.error_message}
+            return
+
+        total_images = len(images_data)
+        yield "header", {"text": self._text_chunk(self._batch_stream_header_lines(total_images)),
+                         "total_images": total_images}
+
+        progress = _Progress()
+        progress.start(self._analyze_batch(
+            images_data,
+            on_result=lambda image_id, provider, outcome: progress.report("result", image_id, provider, outcome),
+            on_image=lambda image_analysis: progress.report("section", image_analysis)
+        ))
+        try:
+            async for item in progress:
+                if item[0] == "result":
+                    _, image_id, provider, outcome = item
+                    if isinstance(outcome, EmotionResult):
+                        yield "result", dict(self._result_summary(outcome), image_id=image_id, success=True)
+                    else:
+                        yield "result", dict(self._provider_failure(provider, outcome), image_id=image_id)
+                else:
+                    image_analysis = item[1]
+                    yield "section", {
+                        "image_id": image_analysis["image_id"],
+                        "duplicate_of": image_analysis["duplicate_of"],
+                        "text": self._text_chunk(self._batch_image_lines(image_analysis, total_images))
+                    }
+            detailed_results, all_results, judge_result, errors = progress.result()
+        finally:
+            progress.cancel()
+
+        response = self._build_batch_response(detailed_results, all_results, judge_result, errors, total_images)
+        if response.success:
+            verdict_lines = (["━" * 80, ""] + self._batch_verdict_lines(judge_result, total_images)
+                             + self._batch_footer_lines(judge_result, errors))
+        else:
+            verdict_lines = self._analysis_failed_lines()
+        yield "verdict", {"text": self._text_chunk(verdict_lines), "judge_result": response.judge_result}
+        yield "emotion_data", {
+            "success": response.success,
+            "emotion_data": response.emotion_data,
+            "detailed_results": response.detailed_results,
+            "judge_result": response.judge_result,
+            "error_message": response.error_message
+        }
 
+    @staticmethod
+    def _empty_batch_response() -> BatchAnalysisResponse:
+        return BatchAnalysisResponse(
+            success=False,
+            emotion_data=[],
+            analysis_text="",
+            detailed_results=[],
+            judge_result=None,
+            error_message="没有提供图像数据"
+        )
+
+    async def _analyze_batch(self, images_data: List[bytes],
+                             on_result: Optional[Callable[[int, str, Union[EmotionResult, Exception, None]], None]] = None,
+                             on_image: Optional[Callable[[Dict], None]] = None):
+        """分析所有图像并给出最终判断，返回 (详细结果, 成功的EmotionResult列表, 判断结果, 错误信息)
+
+        on_result在每个 图像+服务 完成时调用，on_image在每张图像的所有服务完成时调用（流式响应用）；
+        重复帧随其代表帧一起报告，但每组重复帧只以代表帧计入一致性判定、融合与裁判员AI输入
+        """
         all_results = []
+        judge_rows = []
         detailed_results = []
         errors = []
 
-        # 并发分析所有图像
-        for i, image_data in enumerate(images_data):
-            try:
-                # 并发调用Face++和Gemini
-                tasks = [
-                    self._call_facepp(image_data),
-                    self._call_ai_models(image_data)
-                ]
-
-                image_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # 处理单张图像的结果
-                image_analysis = {
-                    "image_id": i + 1,
-                    "facepp_result": None,
-                    "gemini_result": None,
-                    "errors": []
-                }
-
-                for result in image_results:
-                    if isinstance(result, Exception):
-                        image_analysis["errors"].append(str(result))
-                        logger.warning(f"图像{i+1}分析失败: {result}")
-                    elif result is not None:
-                        all_results.append(result)
-                        if result.source == "facepp":
-                            image_analysis["facepp_result"] = {
-                                "emotions": result.emotions,
-                                "dominant_emotion": result.dominant_emotion,
-                                "confidence": result.confidence
-                            }
-                        else:  # Gemini结果
-                            image_analysis["gemini_result"] = {
-                                "emotions": result.emotions,
-                                "dominant_emotion": result.dominant_emotion,
-                                "confidence": result.confidence
-                            }
-
-                detailed_results.append(image_analysis)
+        # 近似重复帧合并：每组只分析代表帧
+        assignment = await self._group_duplicate_frames(images_data)
+        representative_ids = sorted(set(assignment))
+
+        rep_images = [PreparedImage(images_data[rep]) for rep in representative_ids]
+        batch_task = None
+        ai_calls = [None] * len(rep_images)
+        if ANALYSIS_CONFIG["gemini_batch_mode"] and len(rep_images) > 1:
+            # 所有代表帧合并为一次Gemini调用，Face++等其他服务仍逐张并发调用
+            batch_task = asyncio.ensure_future(self._call_ai_models_batch(rep_images))
+            ai_calls = [self._batch_ai_result(batch_task, index, image) for index, image in enumerate(rep_images)]
+
+        # 代表帧 -> 同组所有图像（含代表帧本身），代表帧的进度同时作为重复帧的进度
+        members: Dict[int, List[int]] = {}
+        for i, rep in enumerate(assignment):
+            members.setdefault(rep, []).append(i)
+
+        def report_result(rep: int, provider: str, outcome):
+            for i in members[rep]:
+                on_result(i + 1, provider, outcome)
 
+        async def analyze_group(rep: int, image: PreparedImage, ai_call):
+            image_on_result = None
+            if on_result is not None:
+                image_on_result = lambda provider, outcome: report_result(rep, provider, outcome)
+            outcome = await self._analyze_batch_image(rep + 1, image, ai_call, image_on_result)
+            if on_image is not None:
+                for i in members[rep]:
+                    on_image(self._frame_analysis(outcome[0], i, rep))
+            return outcome
+
+        # 并发分析所有代表帧（各服务的并发量由信号量限制）
+        try:
+            rep_outcomes = await asyncio.gather(
+                *[analyze_group(rep, image, ai_call)
+                  for rep, image, ai_call in zip(representative_ids, rep_images, ai_calls)],
+                return_exceptions=True
+            )
+        finally:
+            if batch_task is not None and not batch_task.done():
+                batch_task.cancel()
+        outcomes = dict(zip(representative_ids, rep_outcomes))
+
+        # 多图单次调用同时返回的综合判断
+        batch_verdict = None
+        if batch_task is not None and not batch_task.cancelled() and batch_task.exception() is None:
+            _, batch_verdict = batch_task.result()
+
+        # 按image_id顺序整理结果，重复帧复用代表帧的详细结果，但不重复计入判断输入
+        for i, rep in enumerate(assignment):
+            outcome = outcomes[rep]
+            if isinstance(outcome, Exception):
+                error_msg = f"图像{i+1}处理异常: {str(outcome)}"
+                errors.append(error_msg)
+                logger.error(error_msg)
+                continue
+
+            rep_analysis, image_results = outcome
+            if i == rep:
+                all_results.extend(image_results)
+                judge_rows.extend((i + 1, result) for result in image_results)
+            detailed_results.append(self._frame_analysis(rep_analysis, i, rep))
+
+        # 没有任何成功结果时不再判断
+        if not all_results:
+            return detailed_results, all_results, None, errors
+
+        # 多图单次调用已给出综合判断时直接使用；结果高度一致时本地给出判断，省去裁判员AI的一次往返
+        judge_result = batch_verdict or self.consensus.judge(all_results)
+        if batch_verdict is not None:
+            logger.info(f"使用Gemini多图调用的综合判断: {judge_result.get('final_emotion')}")
+        elif judge_result is not None:
+            logger.info(f"本地一致性判定完成: {judge_result['final_emotion']}")
+        else:
+            # 准备裁判员AI的输入数据
+            judge_input = []
+            for image_id, result in judge_rows:
+                judge_input.append({
+                    "image_id": image_id,
+                    "source": result.source,
+                    "emotions": result.emotions
+                })
+
+            # 调用裁判员AI
+            try:
+                judge_result = await self.gemini_service.judge_emotions(judge_input)
+                logger.info("裁判员AI判断完成")
             except Exception as e:
-                error_msg = f"图像{i+1}处理异常: {str(e)}"
+                error_msg = f"裁判员AI调用失败: {str(e)}"
                 errors.append(error_msg)
                 logger.error(error_msg)
 
+        return detailed_results, all_results, judge_result, errors
+
+    @staticmethod
+    def _frame_analysis(rep_analysis: Dict, index: int, rep: int) -> Dict:
+        """第index张图像的详细结果（重复帧复用代表帧rep的结果）"""
+        image_analysis = dict(rep_analysis, image_id=index + 1)
+        image_analysis["deduplicated"] = rep != index
+        image_analysis["duplicate_of"] = rep + 1 if rep != index else None
+        return image_analysis
+
+    def _build_batch_response(self, detailed_results: List[Dict], all_results: List[EmotionResult],
+                              judge_result: Optional[Dict], errors: List[str],
+                              total_images: int) -> BatchAnalysisResponse:
+        """由批量分析的结果与最终判断生成响应"""
         # 如果没有任何成功结果，返回错误
         if not all_results:
             error_msg = "所有图像分析都失败了: " + "; ".join(errors)
@@ -260,39 +954,17 @@ class EmotionAnalyzer:
                 error_message=error_msg
             )
 
-        # 准备裁判员AI的输入数据
-        judge_input = []
-        for result in all_results:
-            judge_input.append({
-                "source": result.source,
-                "emotions": result.emotions,
-                "dominant_emotion": result.dominant_emotion,
-                "confidence": result.confidence,
-                "timestamp": result.timestamp.isoformat()
-            })
-
-        # 调用裁判员AI
-        judge_result = None
-        try:
-            judge_result = await self.gemini_service.judge_emotions(judge_input)
-            logger.info("裁判员AI判断完成")
-        except Exception as e:
-            error_msg = f"裁判员AI调用失败: {str(e)}"
-            errors.append(error_msg)
-            logger.error(error_msg)
-
         # 生成最终结果
         if judge_result and "emotions" in judge_result:
             final_emotions = judge_result["emotions"]
             emotion_data_list = create_emotion_data_list(final_emotions)
         else:
             # 如果裁判员AI失败，使用传统融合方法
-            merged_emotions = self._merge_results(all_results)
-            emotion_data_list = create_emotion_data_list(merged_emotions)
+            emotion_data_list = self._merge_results(all_results).to_emotion_data()
 
         # 生成分析文本
         analysis_text = self._generate_batch_analysis_text(
-            detailed_results, judge_result, errors, len(images_data)
+            detailed_results, judge_result, errors, total_images
         )
 
         return BatchAnalysisResponse(
@@ -304,21 +976,100 @@ class EmotionAnalyzer:
             error_message="; ".join(errors) if errors else None
         )
 
+    async def _group_duplicate_frames(self, images_data: List[bytes]) -> List[int]:
+        """计算感知哈希并合并近似重复帧，返回每帧的代表帧下标"""
+        if not ANALYSIS_CONFIG["frame_dedup_enabled"] or len(images_data) < 2:
+            return list(range(len(images_data)))
+
+        loop = asyncio.get_running_loop()
+        hashes = await asyncio.gather(
+            *[loop.run_in_executor(None, dhash, image_data) for image_data in images_data]
+        )
+        assignment = group_near_duplicates(hashes, ANALYSIS_CONFIG["frame_dedup_threshold"])
+
+        unique_count = len(set(assignment))
+        if unique_count < len(images_data):
+            logger.info(f"近似重复帧合并: {len(images_data)}张图像 -> {unique_count}组")
+        return assignment
+
+    async def _analyze_batch_image(self, image_id: int, image_data: Union[bytes, PreparedImage], ai_call=None,
+                                   on_result: Optional[ResultCallback] = None):
+        """分析批量中的单张图像，返回(详细结果, 成功的EmotionResult列表)"""
+        image = PreparedImage.ensure(image_data)
+
+        # 并发调用Face++和Gemini（以及按配置调用本地模型）
+        image_results = await self._call_providers(image, ai_call, on_result)
+
+        # 处理单张图像的结果
+        image_analysis = {
+            "image_id": image_id,
+            "facepp_result": None,
+            "gemini_result": None,
+            "errors": []
+        }
+        if self.local_mode != "off":
+            image_analysis["local_result"] = None
+        if self.openrouter_mode == "parallel":
+            image_analysis["openrouter_result"] = None
+        successful_results = []
+
+        for result in image_results:
+            if isinstance(result, Exception):
+                image_analysis["errors"].append(str(result))
+                logger.warning(f"图像{image_id}分析失败: {result}")
+            elif result is not None:
+                successful_results.append(result)
+                if result.source == "facepp":
+                    image_analysis["facepp_result"] = {
+                        "emotions": result.emotions,
+                        "dominant_emotion": result.dominant_emotion,
+                        "confidence": result.confidence
+                    }
+                elif result.source == "local":
+                    image_analysis["local_result"] = {
+                        "emotions": result.emotions,
+                        "dominant_emotion": result.dominant_emotion,
+                        "confidence": result.confidence
+                    }
+                elif self.openrouter_mode == "parallel" and result.source.startswith("openrouter-"):
+                    image_analysis["openrouter_result"] = {
+                        "emotions": result.emotions,
+                        "dominant_emotion": result.dominant_emotion,
+                        "confidence": result.confidence
+                    }
+                else:  # Gemini结果
+                    image_analysis["gemini_result"] = {
+                        "emotions": result.emotions,
+                        "dominant_emotion": result.dominant_emotion,
+                        "confidence": result.confidence
+                    }
+
+        return image_analysis, successful_results
+
     def _generate_batch_analysis_text(self, detailed_results: List[Dict],
                                     judge_result: Optional[Dict],
                                     errors: List[str],
                                     total_images: int) -> str:
         """生成批量分析的文本报告"""
-        analysis_lines = []
+        # 最终判断结果、详细分析结果、系统状态（流式接口先输出各图像段落，最终判断在最后）
+        analysis_lines = self._batch_verdict_lines(judge_result, total_images)
+        analysis_lines.extend(self._batch_breakdown_header_lines())
+        for result in detailed_results:
+            analysis_lines.extend(self._batch_image_lines(result, total_images))
+        analysis_lines.extend(self._batch_footer_lines(judge_result, errors))
 
-        # 最终判断结果
+        return "\n".join(analysis_lines)
+
+    @staticmethod
+    def _batch_verdict_lines(judge_result: Optional[Dict], total_images: int) -> List[str]:
+        """最终判断段落（裁判员AI不可用时为传统融合方法说明）"""
         if judge_result:
             final_emotion = judge_result.get("final_emotion", "unknown").upper()
             confidence = int(judge_result.get("confidence", 0) * 100)
             reasoning = judge_result.get("reasoning", "无判断依据")
             consistency = judge_result.get("consistency_analysis", "无一致性分析")
 
-            analysis_lines.extend([
+            return [
                 ">>> FINAL EMOTION ANALYSIS RESULT <<<",
                 "",
                 f"PRIMARY EMOTION: {final_emotion} ({confidence}%)",
@@ -326,88 +1077,124 @@ class EmotionAnalyzer:
                 f"DATA SOURCES: {total_images} IMAGES ANALYZED",
                 f"ANALYSIS TIMESTAMP: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
                 "",
-                "JUDGE AI REASONING:",
+                {"local_consensus": "LOCAL CONSENSUS REASONING:",
+                 "gemini_batch": "GEMINI BATCH VERDICT REASONING:"}.get(judge_result.get("method"),
+                                                                      "JUDGE AI REASONING:"),
                 f"• {reasoning}",
                 "",
                 "CONSISTENCY ANALYSIS:",
                 f"• {consistency}",
                 "",
-                "━" * 80,
-                "",
-                ">>> DETAILED ANALYSIS BREAKDOWN <<<",
+            ]
+
+        return [
+            ">>> EMOTION ANALYSIS RESULT <<<",
+            "",
+            "⚠ 裁判员AI不可用，使用传统融合方法",
+            f"DATA SOURCES: {total_images} IMAGES ANALYZED",
+            f"ANALYSIS TIMESTAMP: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            "",
+        ]
+
+    @staticmethod
+    def _batch_breakdown_header_lines() -> List[str]:
+        return [
+            "━" * 80,
+            "",
+            ">>> DETAILED ANALYSIS BREAKDOWN <<<",
+            ""
+        ]
+
+    def _batch_stream_header_lines(self, total_images: int) -> List[str]:
+        """流式批量分析的报告头（最终判断在各图像段落之后输出）"""
+        return [
+            ">>> MULTI-FRAME EMOTION ANALYSIS <<<",
+            "",
+            f"DATA SOURCES: {total_images} IMAGES QUEUED",
+            "",
+            *self._batch_breakdown_header_lines()
+        ]
+
+    @staticmethod
+    def _batch_image_lines(result: Dict, total_images: int) -> List[str]:
+        """单张图像的详细分析段落"""
+        image_id = result["image_id"]
+        analysis_lines = [f"IMAGE {image_id}/{total_images} ANALYSIS:"]
+
+        # Face++ 结果
+        if result["facepp_result"]:
+            facepp = result["facepp_result"]
+            emotions_str = " | ".join([
+                f"{emotion.title()}: {int(prob*100)}%"
+                for emotion, prob in facepp["emotions"].items()
+                if prob > 0.01  # 只显示概率大于1%的情绪
+            ])
+            analysis_lines.extend([
+                "┌─ FACE++ API RESULT:",
+                f"│  • {emotions_str}",
+                f"│  • Dominant: {facepp['dominant_emotion'].upper()} ({int(facepp['confidence']*100)}%)",
+                "│"
+            ])
+        else:
+            analysis_lines.extend([
+                "┌─ FACE++ API RESULT:",
+                "│  • ANALYSIS FAILED",
+                "│"
+            ])
+
+        # Gemini 结果
+        if result["gemini_result"]:
+            gemini = result["gemini_result"]
+            emotions_str = " | ".join([
+                f"{emotion.title()}: {int(prob*100)}%"
+                for emotion, prob in gemini["emotions"].items()
+                if prob > 0.01
+            ])
+            analysis_lines.extend([
+                "└─ GEMINI AI RESULT:",
+                f"   • {emotions_str}",
+                f"   • Dominant: {gemini['dominant_emotion'].upper()} ({int(gemini['confidence']*100)}%)",
                 ""
             ])
         else:
             analysis_lines.extend([
-                ">>> EMOTION ANALYSIS RESULT <<<",
-                "",
-                "⚠ 裁判员AI不可用，使用传统融合方法",
-                f"DATA SOURCES: {total_images} IMAGES ANALYZED",
-                f"ANALYSIS TIMESTAMP: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                "",
-                "━" * 80,
-                "",
-                ">>> DETAILED ANALYSIS BREAKDOWN <<<",
+                "└─ GEMINI AI RESULT:",
+                "   • ANALYSIS FAILED",
                 ""
             ])
 
-        # 详细分析结果
-        for result in detailed_results:
-            image_id = result["image_id"]
-            analysis_lines.append(f"IMAGE {image_id}/{total_images} ANALYSIS:")
-
-            # Face++ 结果
-            if result["facepp_result"]:
-                facepp = result["facepp_result"]
-                emotions_str = " | ".join([
-                    f"{emotion.title()}: {int(prob*100)}%"
-                    for emotion, prob in facepp["emotions"].items()
-                    if prob > 0.01  # 只显示概率大于1%的情绪
-                ])
-                analysis_lines.extend([
-                    "┌─ FACE++ API RESULT:",
-                    f"│  • {emotions_str}",
-                    f"│  • Dominant: {facepp['dominant_emotion'].upper()} ({int(facepp['confidence']*100)}%)",
-                    "│"
-                ])
-            else:
-                analysis_lines.extend([
-                    "┌─ FACE++ API RESULT:",
-                    "│  • ANALYSIS FAILED",
-                    "│"
-                ])
-
-            # Gemini 结果
-            if result["gemini_result"]:
-                gemini = result["gemini_result"]
-                emotions_str = " | ".join([
-                    f"{emotion.title()}: {int(prob*100)}%"
-                    for emotion, prob in gemini["emotions"].items()
-                    if prob > 0.01
-                ])
-                analysis_lines.extend([
-                    "└─ GEMINI AI RESULT:",
-                    f"   • {emotions_str}",
-                    f"   • Dominant: {gemini['dominant_emotion'].upper()} ({int(gemini['confidence']*100)}%)",
-                    ""
-                ])
-            else:
-                analysis_lines.extend([
-                    "└─ GEMINI AI RESULT:",
-                    "   • ANALYSIS FAILED",
-                    ""
-                ])
-
-            # 错误信息
-            if result["errors"]:
-                analysis_lines.extend([
-                    "⚠ ERRORS:",
-                    *[f"   • {error}" for error in result["errors"]],
-                    ""
-                ])
-
-        # 系统状态
-        analysis_lines.extend([
+        # OpenRouter结果（parallel模式）
+        if result.get("openrouter_result"):
+            openrouter = result["openrouter_result"]
+            analysis_lines.extend([
+                "   OPENROUTER RESULT:",
+                f"   • Dominant: {openrouter['dominant_emotion'].upper()} ({int(openrouter['confidence']*100)}%)",
+                ""
+            ])
+
+        # 本地模型结果
+        if result.get("local_result"):
+            local = result["local_result"]
+            analysis_lines.extend([
+                "   LOCAL MODEL RESULT:",
+                f"   • Dominant: {local['dominant_emotion'].upper()} ({int(local['confidence']*100)}%)",
+                ""
+            ])
+
+        # 错误信息
+        if result["errors"]:
+            analysis_lines.extend([
+                "⚠ ERRORS:",
+                *[f"   • {error}" for error in result["errors"]],
+                ""
+            ])
+
+        return analysis_lines
+
+    @staticmethod
+    def _batch_footer_lines(judge_result: Optional[Dict], errors: List[str]) -> List[str]:
+        """系统状态与错误汇总段落"""
+        analysis_lines = [
             "━" * 80,
             "",
             "BIOMETRIC DATA:",
@@ -416,7 +1203,7 @@ class EmotionAnalyzer:
             "• Judge AI Analysis: " + ("COMPLETE" if judge_result else "FAILED"),
             "",
             "SYSTEM STATUS: OPERATIONAL"
-        ])
+        ]
 
         # 错误汇总
         if errors:
@@ -426,4 +1213,4 @@ class EmotionAnalyzer:
                 *[f"• {error}" for error in errors[:5]]  # 最多显示5个错误
             ])
 
-        return "\n".join(analysis_lines)
\ No newline at end of file
+        return analysis_lines
\ No newline at end of file
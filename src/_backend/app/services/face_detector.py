@@ -0,0 +1,90 @@
+"""
+本地人脸检测服务
+基于OpenCV Haar级联（纯CPU），用于在上传视觉大模型前裁剪人脸区域、过滤无人脸的帧
+OpenCV为可选依赖，未安装时检测器不可用，调用方按未启用处理
+"""
+
+import logging
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from ..models.emotion import ANALYSIS_CONFIG
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    cv2 = None
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 人脸框 (left, top, right, bottom)
+FaceBox = Tuple[int, int, int, int]
+
+
+class FaceDetector:
+    """Haar级联人脸检测器"""
+
+    def __init__(self, cascade_path: Optional[str] = None):
+        self._cascade = None
+        if cv2 is None or not hasattr(cv2, "CascadeClassifier"):
+            logger.warning("未安装支持Haar级联的opencv-python，本地人脸检测不可用")
+            return
+
+        path = cascade_path or ANALYSIS_CONFIG["face_cascade_path"] or (
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
+            logger.warning(f"加载人脸检测模型失败: {path}")
+            return
+        self._cascade = cascade
+
+    @property
+    def available(self) -> bool:
+        return self._cascade is not None
+
+    def detect(self, img: Image.Image) -> Optional[FaceBox]:
+        """检测最大的人脸，返回原图坐标系下的人脸框；未检测到时返回None"""
+        if not self.available:
+            return None
+
+        # 在缩小的灰度图上检测以降低CPU开销
+        max_dimension = ANALYSIS_CONFIG["face_detect_max_dimension"]
+        scale = min(1.0, max_dimension / max(img.size))
+        small = img.convert("L")
+        if scale < 1.0:
+            small = small.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))),
+                                 Image.Resampling.BILINEAR)
+
+        gray = cv2.equalizeHist(np.asarray(small))
+        faces = self._cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        if len(faces) == 0:
+            return None
+
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+        return (int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale))
+
+
+def pad_face_box(box: FaceBox, image_size: Tuple[int, int], padding: float) -> FaceBox:
+    """按比例向四周扩展人脸框（包含发际线、下巴等表情相关区域），并限制在图像范围内"""
+    left, top, right, bottom = box
+    pad_x = int((right - left) * padding)
+    pad_y = int((bottom - top) * padding)
+    width, height = image_size
+    return (max(0, left - pad_x), max(0, top - pad_y),
+            min(width, right + pad_x), min(height, bottom + pad_y))
+
+
+# 进程内共享的人脸检测器（首次使用时加载）
+_face_detector: Optional[FaceDetector] = None
+
+
+def get_face_detector() -> FaceDetector:
+    """获取共享人脸检测器"""
+    global _face_detector
+    if _face_detector is None:
+        _face_detector = FaceDetector()
+    return _face_detector
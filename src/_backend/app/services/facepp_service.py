@@ -4,19 +4,19 @@ Face++ API服务
 """
 
 import os
-import requests
 import logging
-from typing import Dict, Optional, Tuple
-from datetime import datetime
-from PIL import Image
-from io import BytesIO
+from typing import Dict, Tuple, Union
+
+import aiohttp
 
 from ..models.emotion import (
     EmotionResult, 
     FACEPP_EMOTION_MAPPING, 
-    normalize_probabilities,
-    get_dominant_emotion
+    normalize_probabilities
 )
+from .http_client import get_http_client
+from .image_preprocess import PreparedImage
+from .rate_limiter import ProviderThrottled, RateLimitExceeded, get_rate_limiter, parse_retry_after
 
 logger = logging.getLogger(__name__)
 
@@ -27,39 +27,10 @@ class FacePPService:
     def __init__(self):
         self.api_key = os.getenv("FACEPP_API_KEY", "wvv-yzcDhvSx-vIs7tl3DZ2vJnEp-NCr")
         self.api_secret = os.getenv("FACEPP_API_SECRET", "Q82rf7NWaheJEQ6Az5_aJoN1MlpfDipT")
-        self.base_url = "https://api-cn.faceplusplus.com/facepp/v3/detect"        
-    def compress_image(self, image_data: bytes, max_size_kb: int = 700, 
-                      max_width: int = 1024) -> BytesIO:
-        """压缩图像以满足API要求"""
-        try:
-            img = Image.open(BytesIO(image_data))
-            
-            # 限制宽度
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
-            # 转换为RGB格式
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            
-            # 循环压缩直到小于max_size_kb
-            quality = 90
-            while True:
-                buffer = BytesIO()
-                img.save(buffer, format="JPEG", quality=quality)
-                size_kb = buffer.tell() / 1024
-                
-                if size_kb <= max_size_kb or quality < 30:
-                    buffer.seek(0)
-                    return buffer
-                    
-                quality -= 10
-                
-        except Exception as e:
-            logger.error(f"图像压缩失败: {e}")
-            raise ValueError(f"图像处理失败: {e}")    
+        self.base_url = os.getenv("FACEPP_BASE_URL", "https://api-cn.faceplusplus.com/facepp/v3/detect")
+        self.http = get_http_client()
+        self.rate_limiter = get_rate_limiter()
+
     def parse_facepp_response(self, response_data: Dict) -> Dict[str, float]:
         """解析Face++ API响应，转换为标准情绪格式"""
         try:
@@ -91,25 +62,37 @@ class FacePPService:
         except Exception as e:
             logger.error(f"解析Face++ API响应失败: {e}")
             return {"neutral": 1.0}    
-    async def analyze_emotion(self, image_data: bytes) -> EmotionResult:
+    async def _detect(self, compressed_image: bytes) -> Dict:
+        """调用detect接口（每次调用重新构建表单，限流重试时可重复执行）"""
+        form = aiohttp.FormData()
+        form.add_field("api_key", self.api_key)
+        form.add_field("api_secret", self.api_secret)
+        form.add_field("return_attributes", "emotion")
+        form.add_field("image_file", compressed_image,
+                       filename="image.jpg", content_type="image/jpeg")
+
+        async with self.http.session.post(self.base_url, data=form) as response:
+            if response.status in (403, 429):
+                # Face++以403 CONCURRENCY_LIMIT_EXCEEDED表示超出QPS限制
+                error_data = await response.json(content_type=None)
+                if response.status == 429 or "CONCURRENCY_LIMIT_EXCEEDED" in str(error_data.get("error_message", "")):
+                    raise ProviderThrottled(
+                        f"Face++ 并发超限: {error_data.get('error_message', response.status)}",
+                        parse_retry_after(response.headers.get("Retry-After"))
+                    )
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def analyze_emotion(self, image: Union[bytes, PreparedImage]) -> EmotionResult:
         """分析图像中的情绪"""
         try:
-            # 压缩图像
-            compressed_image = self.compress_image(image_data)
+            # 压缩图像（在线程池中生成，同一请求内只生成一次）
+            compressed_image = await PreparedImage.ensure(image).facepp_jpeg()
             
-            # 准备API请求
-            files = {"image_file": ("image.jpg", compressed_image, "image/jpeg")}
-            data = {
-                "api_key": self.api_key,
-                "api_secret": self.api_secret,
-                "return_attributes": "emotion"
-            }
-            
-            # 发送请求
-            response = requests.post(self.base_url, data=data, files=files, timeout=30)
-            response.raise_for_status()
-            
-            response_data = response.json()
+            # 发送请求（复用共享连接池，按API密钥限流）
+            response_data = await self.rate_limiter.call(
+                "facepp", self.api_key, lambda: self._detect(compressed_image)
+            )
             
             # 检查API错误
             if "error_message" in response_data:
@@ -117,20 +100,16 @@ class FacePPService:
             
             # 解析情绪数据
             emotions = self.parse_facepp_response(response_data)
-            dominant_emotion = get_dominant_emotion(emotions)
-            
-            # 计算置信度（使用主导情绪的概率）
-            confidence = emotions.get(dominant_emotion, 0.0)
             
-            return EmotionResult(
+            # 置信度为主导情绪的概率
+            return EmotionResult.create(
                 emotions=emotions,
-                dominant_emotion=dominant_emotion,
-                confidence=confidence,
                 source="facepp",
-                timestamp=datetime.now(),
                 raw_data=response_data
             )
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Face++ API调用失败: {e}")
             raise Exception(f"Face++ 情绪分析失败: {str(e)}")
\ No newline at end of file
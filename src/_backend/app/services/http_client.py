@@ -0,0 +1,73 @@
+"""
+共享异步HTTP传输层
+所有外部API服务复用同一个aiohttp连接池（keep-alive、每主机连接数限制、可配置超时）
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+
+from ..models.emotion import ANALYSIS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    """带连接池的异步HTTP客户端，进程内创建一次并由所有服务共享"""
+
+    def __init__(self, limit: Optional[int] = None, limit_per_host: Optional[int] = None,
+                 keepalive_timeout: Optional[float] = None, timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None):
+        self.limit = limit or ANALYSIS_CONFIG["http_pool_limit"]
+        self.limit_per_host = limit_per_host or ANALYSIS_CONFIG["http_pool_limit_per_host"]
+        self.keepalive_timeout = keepalive_timeout or ANALYSIS_CONFIG["http_keepalive_timeout"]
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout or ANALYSIS_CONFIG["http_timeout"],
+            connect=connect_timeout or ANALYSIS_CONFIG["http_connect_timeout"]
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环上的共享会话（首次使用时创建）"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+            logger.info(f"HTTP连接池已创建: limit={self.limit}, limit_per_host={self.limit_per_host}")
+        return self._session
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP连接池已关闭")
+        self._session = None
+        self._loop = None
+
+
+# 进程内共享的HTTP客户端
+_http_client: Optional[HTTPClient] = None
+
+
+def get_http_client() -> HTTPClient:
+    """获取共享HTTP客户端"""
+    global _http_client
+    if _http_client is None:
+        _http_client = HTTPClient()
+    return _http_client
+
+
+async def close_http_client():
+    """关闭共享HTTP客户端（应用关闭时调用）"""
+    if _http_client is not None:
+        await _http_client.close()
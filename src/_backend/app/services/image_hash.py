@@ -0,0 +1,59 @@
+"""
+图像感知哈希
+使用dHash识别连续抓拍中几乎相同的帧，批量分析时只对每组的代表帧调用外部API
+"""
+
+import logging
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(image_data: bytes, hash_size: int = 8) -> Optional[int]:
+    """计算图像的差值哈希（hash_size*hash_size位），无法解码时返回None"""
+    try:
+        img = Image.open(BytesIO(image_data))
+        # JPEG按缩小比例解码，避免完整解码大图
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        img = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = list(img.getdata())
+    except Exception as e:
+        logger.warning(f"计算感知哈希失败: {e}")
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个哈希之间的汉明距离"""
+    return bin(a ^ b).count("1")
+
+
+def group_near_duplicates(hashes: List[Optional[int]], threshold: int) -> List[int]:
+    """按汉明距离阈值分组，返回每一帧对应的代表帧下标（代表帧指向自身）"""
+    representatives: List[int] = []
+    assignment: List[int] = []
+
+    for index, frame_hash in enumerate(hashes):
+        match = None
+        if frame_hash is not None:
+            for rep in representatives:
+                if hamming_distance(frame_hash, hashes[rep]) <= threshold:
+                    match = rep
+                    break
+
+        if match is None:
+            if frame_hash is not None:
+                representatives.append(index)
+            match = index
+        assignment.append(match)
+
+    return assignment
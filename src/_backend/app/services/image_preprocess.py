@@ -0,0 +1,213 @@
+"""
+图像预处理服务
+每张上传图像只解码一次（含EXIF方向校正），并按服务生成、缓存各自的上传负载，供所有服务及重试共享
+"""
+
+import asyncio
+import base64
+import logging
+import threading
+from io import BytesIO
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+from ..models.emotion import ANALYSIS_CONFIG
+from .result_cache import image_digest
+from .face_detector import FaceBox, get_face_detector, pad_face_box
+
+logger = logging.getLogger(__name__)
+
+# EXIF方向标签
+EXIF_ORIENTATION_TAG = 0x0112
+
+# JPEG大小预测模型参数（实测照片类图像指数约0.55~0.85，取保守值）
+JPEG_SIZE_EXPONENT = 0.55
+JPEG_SIZE_SAFETY = 0.95
+# 预测编码仍超出预算时的逐步降级：每次降低的质量，以及缩小尺寸的最小边长
+JPEG_QUALITY_STEP = 10
+JPEG_MIN_DIMENSION = 16
+
+
+def _jpeg_scale(quality: int) -> float:
+    """libjpeg质量参数对应的量化表缩放比例"""
+    return 5000.0 / quality if quality < 50 else 200.0 - 2 * quality
+
+
+def _quality_for_scale(scale: float) -> int:
+    """_jpeg_scale的反函数（向下取整，保证不超过预测大小）"""
+    if scale <= 100:
+        return int((200 - scale) // 2)
+    return int(5000 // scale)
+
+
+def bounded_size(width: int, height: int, max_width: int, max_height: int) -> Tuple[int, int]:
+    """等比缩放到宽高上限以内"""
+    ratio = min(1.0, max_width / width, max_height / height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def encode_jpeg(img: Image.Image, max_size_kb: int = 700, max_width: int = 1024,
+                max_height: Optional[int] = None, quality: int = 90, min_quality: int = 30) -> bytes:
+    """编码满足大小预算的JPEG：同时限制宽高，通常最多两次编码
+
+    第一次按指定质量编码；超出预算时按JPEG大小-量化比例模型预测满足预算的质量，
+    预测质量低于min_quality时改为同时缩小尺寸，再编码一次。
+    预测偏差导致仍超出预算时逐步降低质量（不低于min_quality），之后按超出比例缩小尺寸，直到满足预算。
+    """
+    max_height = max_height or max_width
+    target_size = bounded_size(img.width, img.height, max_width, max_height)
+    if target_size != img.size:
+        img = img.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    budget = max_size_kb * 1024
+    data = _save_jpeg(img, quality)
+    if len(data) <= budget:
+        return data
+
+    # 大小近似服从 size ∝ scale^(-k)，取偏保守的k并预留余量
+    target = budget * JPEG_SIZE_SAFETY
+    required_scale = _jpeg_scale(quality) * (len(data) / target) ** (1 / JPEG_SIZE_EXPONENT)
+    next_quality = _quality_for_scale(required_scale)
+
+    if next_quality < min_quality:
+        # 仅降低质量不够：按像素数等比缩小尺寸
+        predicted = len(data) * (_jpeg_scale(min_quality) / _jpeg_scale(quality)) ** -JPEG_SIZE_EXPONENT
+        factor = (target / predicted) ** 0.5
+        img = img.resize(bounded_size(img.width, img.height, int(img.width * factor), int(img.height * factor)),
+                         Image.Resampling.LANCZOS)
+        next_quality = min_quality
+
+    data = _save_jpeg(img, next_quality)
+    while len(data) > budget and (next_quality > min_quality or min(img.size) > JPEG_MIN_DIMENSION):
+        if next_quality > min_quality:
+            next_quality = max(min_quality, next_quality - JPEG_QUALITY_STEP)
+        else:
+            factor = min(0.9, (target / len(data)) ** 0.5)
+            img = img.resize(bounded_size(img.width, img.height, int(img.width * factor), int(img.height * factor)),
+                             Image.Resampling.LANCZOS)
+        data = _save_jpeg(img, next_quality)
+    return data
+
+
+def _save_jpeg(img: Image.Image, quality: int) -> bytes:
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class PreparedImage:
+    """单次请求内共享的预处理图像"""
+
+    def __init__(self, image_data: bytes):
+        self.data = image_data
+        self._digest: Optional[str] = None
+        self._image: Optional[Image.Image] = None
+        self._format: Optional[str] = None
+        self._orientation: Optional[int] = None
+        self._original_size: Tuple[int, int] = (0, 0)
+        self._payloads: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def ensure(cls, image: Union[bytes, "PreparedImage"]) -> "PreparedImage":
+        """兼容直接传入原始字节的调用方"""
+        return image if isinstance(image, PreparedImage) else cls(image)
+
+    @property
+    def digest(self) -> str:
+        """图像内容哈希（结果缓存键）"""
+        if self._digest is None:
+            self._digest = image_digest(self.data)
+        return self._digest
+
+    @property
+    def image(self) -> Image.Image:
+        """解码后的RGB图像（已按EXIF方向校正），只解码一次"""
+        with self._lock:
+            if self._image is None:
+                img = Image.open(BytesIO(self.data))
+                self._format = img.format
+                self._orientation = img.getexif().get(EXIF_ORIENTATION_TAG)
+                self._original_size = img.size
+                # 大尺寸JPEG按DCT缩放解码，只解到各服务所需的最大尺寸
+                decode_dimension = max(ANALYSIS_CONFIG["facepp_max_width"],
+                                       ANALYSIS_CONFIG["facepp_max_height"],
+                                       ANALYSIS_CONFIG["vision_max_dimension"])
+                img.draft(img.mode, (decode_dimension, decode_dimension))
+                img = ImageOps.exif_transpose(img)
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                self._image = img
+            return self._image
+
+    def _is_passthrough(self, max_width: int, max_height: int, max_bytes: Optional[int] = None) -> bool:
+        """原图已是方向正确、尺寸与大小合规的JPEG时可直接上传"""
+        self.image  # 确保已读取格式信息
+        width, height = self._original_size
+        return (self._format == "JPEG" and self._orientation in (None, 1)
+                and width <= max_width and height <= max_height
+                and (max_bytes is None or len(self.data) <= max_bytes))
+
+    def _memo(self, key: str, builder: Callable[[], object]):
+        if key not in self._payloads:
+            self._payloads[key] = builder()
+        return self._payloads[key]
+
+    async def _memo_async(self, key: str, builder: Callable[[], object]):
+        """在线程池中生成负载（已缓存时直接返回）"""
+        if key in self._payloads:
+            return self._payloads[key]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._memo, key, builder)
+
+    def _build_facepp_jpeg(self) -> bytes:
+        max_size_kb = ANALYSIS_CONFIG["facepp_max_size_kb"]
+        max_width = ANALYSIS_CONFIG["facepp_max_width"]
+        max_height = ANALYSIS_CONFIG["facepp_max_height"]
+        if self._is_passthrough(max_width, max_height, max_size_kb * 1024):
+            return self.data
+        return encode_jpeg(self.image, max_size_kb=max_size_kb, max_width=max_width, max_height=max_height)
+
+    def _build_face_box(self) -> Optional[FaceBox]:
+        box = get_face_detector().detect(self.image)
+        if box is None:
+            return None
+        return pad_face_box(box, self.image.size, ANALYSIS_CONFIG["face_crop_padding"])
+
+    def _build_vision_inline_data(self) -> Tuple[str, str]:
+        max_dimension = ANALYSIS_CONFIG["vision_max_dimension"]
+        image_format = ANALYSIS_CONFIG["vision_image_format"]
+        face_box = self._payloads.get("face_box") if ANALYSIS_CONFIG["face_crop_enabled"] else None
+
+        if face_box is None and image_format == "JPEG" and self._is_passthrough(max_dimension, max_dimension):
+            encoded = self.data
+        else:
+            # 检测到人脸时只上传带边距的人脸区域
+            img = self.image.crop(face_box) if face_box is not None else self.image
+            if max(img.size) > max_dimension:
+                img = img.copy()
+                img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            img.save(buffer, format=image_format, quality=ANALYSIS_CONFIG["vision_image_quality"])
+            encoded = buffer.getvalue()
+
+        mime_type = "image/webp" if image_format == "WEBP" else "image/jpeg"
+        return mime_type, base64.b64encode(encoded).decode("utf-8")
+
+    async def facepp_jpeg(self) -> bytes:
+        """Face++上传用的缩小JPEG"""
+        return await self._memo_async("facepp", self._build_facepp_jpeg)
+
+    async def face_box(self) -> Optional[FaceBox]:
+        """本地检测到的（已加边距的）人脸框，未检测到时为None"""
+        return await self._memo_async("face_box", self._build_face_box)
+
+    async def vision_inline_data(self) -> Tuple[str, str]:
+        """视觉大模型上传用的(mime类型, base64数据)，尺寸受限；启用人脸裁剪时只包含人脸区域"""
+        if ANALYSIS_CONFIG["face_crop_enabled"] and get_face_detector().available:
+            await self.face_box()
+        return await self._memo_async("vision", self._build_vision_inline_data)
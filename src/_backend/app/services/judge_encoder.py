@@ -0,0 +1,94 @@
+"""
+裁判员AI输入编码
+将批量分析结果编码为紧凑的列式表格：每个数据源/图片一行，概率保留两位小数，
+不含时间戳与缩进；超出token预算时逐级合并相邻图片的行（按数据源取平均）
+"""
+
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+from ..models.emotion import EMOTION_KEYS, ANALYSIS_CONFIG, get_dominant_emotion
+
+JUDGE_INPUT_COLUMNS = ["image", "source", *EMOTION_KEYS, "dominant"]
+
+# 行: (包含的图片ID（升序）, 数据源, 情绪概率)
+_Row = Tuple[Tuple[int, ...], str, Dict[str, float]]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（按UTF-8字节数/4，对数字与ASCII偏保守）"""
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+def _frame_label(frames: Tuple[int, ...]):
+    """图片列：单张为ID，多张按实际包含的图片标注（连续区间写作 "1-3"，不连续用逗号分隔，如 "1-3,5"）"""
+    if len(frames) == 1:
+        return frames[0]
+    runs: List[List[int]] = []
+    for frame in frames:
+        if runs and frame == runs[-1][1] + 1:
+            runs[-1][1] = frame
+        else:
+            runs.append([frame, frame])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in runs)
+
+
+def _format_row(row: _Row) -> List:
+    frames, source, emotions = row
+    image = _frame_label(frames)
+    return ([image, source]
+            + [round(emotions.get(key, 0.0), 2) for key in EMOTION_KEYS]
+            + [get_dominant_emotion(emotions)])
+
+
+def _render(rows: List[_Row]) -> str:
+    table = {"columns": JUDGE_INPUT_COLUMNS, "rows": [_format_row(row) for row in rows]}
+    return json.dumps(table, ensure_ascii=False, separators=(",", ":"))
+
+
+def _merge_adjacent(rows: List[_Row]) -> List[_Row]:
+    """同一数据源中相邻的两行合并为一行（概率按图片数加权平均，图片列标注实际包含的图片）"""
+    by_source: Dict[str, List[_Row]] = {}
+    for row in rows:
+        by_source.setdefault(row[1], []).append(row)
+
+    merged: List[_Row] = []
+    for source, source_rows in by_source.items():
+        for index in range(0, len(source_rows), 2):
+            pair = source_rows[index:index + 2]
+            weights = [len(row[0]) for row in pair]
+            total = sum(weights)
+            emotions = {
+                key: sum(row[2].get(key, 0.0) * weight for row, weight in zip(pair, weights)) / total
+                for key in EMOTION_KEYS
+            }
+            frames = tuple(sorted(frame for row in pair for frame in row[0]))
+            merged.append((frames, source, emotions))
+    merged.sort(key=lambda row: (row[0][0], row[1]))
+    return merged
+
+
+def encode_judge_input(analysis_results: List[Dict], token_budget: Optional[int] = None) -> str:
+    """编码裁判员AI的输入数据
+
+    analysis_results中每项包含image_id、source、emotions；超出预算时逐级合并，
+    直到每个数据源只剩一行为止
+    """
+    if token_budget is None:
+        token_budget = ANALYSIS_CONFIG["judge_input_token_budget"]
+
+    rows: List[_Row] = [
+        ((item.get("image_id", index + 1),), item["source"], item["emotions"])
+        for index, item in enumerate(analysis_results)
+    ]
+    rows.sort(key=lambda row: (row[0][0], row[1]))
+
+    text = _render(rows)
+    while estimate_tokens(text) > token_budget:
+        merged = _merge_adjacent(rows)
+        if len(merged) == len(rows):
+            break
+        rows = merged
+        text = _render(rows)
+    return text
@@ -0,0 +1,179 @@
+"""
+本地表情识别服务
+使用ONNX Runtime在CPU上运行小型表情分类模型（如FER+），输出与其他服务一致的7类EmotionResult
+并发请求与批量分析中的多帧通过微批队列合并为一次批量推理
+onnxruntime为可选依赖，未安装或未配置模型时服务不可用
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from ..models.emotion import (
+    EmotionResult,
+    AI_EMOTION_MAPPING,
+    ANALYSIS_CONFIG,
+    normalize_probabilities
+)
+from .image_preprocess import PreparedImage
+
+try:
+    import onnxruntime as ort
+except ImportError:  # pragma: no cover - 可选依赖
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEmotionService:
+    """本地ONNX表情分类服务"""
+
+    def __init__(self, model_path: Optional[str] = None):
+        self.model_path = model_path or ANALYSIS_CONFIG["local_model_path"]
+        self.labels = [label.strip() for label in ANALYSIS_CONFIG["local_model_labels"].split(",")]
+        self.input_size = ANALYSIS_CONFIG["local_model_input_size"]
+        self.input_scale = ANALYSIS_CONFIG["local_model_input_scale"]
+        self.output_type = ANALYSIS_CONFIG["local_model_output"]
+        self.max_batch_size = ANALYSIS_CONFIG["local_model_max_batch"]
+        self.max_batch_wait = ANALYSIS_CONFIG["local_model_batch_wait_ms"] / 1000.0
+        self._session = None
+        self._input_name: Optional[str] = None
+        self._channels = 1
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def available(self) -> bool:
+        return ort is not None and bool(self.model_path) and os.path.exists(self.model_path)
+
+    @property
+    def identity(self) -> str:
+        """服务/模型标识（结果缓存键）"""
+        return f"local:{os.path.basename(self.model_path)}"
+
+    def _get_session(self):
+        if self._session is None:
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = ANALYSIS_CONFIG["local_model_threads"]
+            self._session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+            model_input = self._session.get_inputs()[0]
+            self._input_name = model_input.name
+            # 输入为NCHW，通道数1为灰度、3为RGB
+            self._channels = model_input.shape[1] if isinstance(model_input.shape[1], int) else 1
+            logger.info(f"本地表情模型已加载: {self.model_path}, 输入: {model_input.shape}")
+        return self._session
+
+    def _preprocess(self, image: PreparedImage, face_box) -> "np.ndarray":
+        """裁剪人脸区域并转换为模型输入张量（不含batch维）"""
+        self._get_session()
+        img = image.image.crop(face_box) if face_box is not None else image.image
+        img = img.convert("L" if self._channels == 1 else "RGB")
+        img = img.resize((self.input_size, self.input_size), Image.Resampling.BILINEAR)
+        array = np.asarray(img, dtype=np.float32) * self.input_scale
+        if self._channels == 1:
+            return array[np.newaxis, :, :]
+        return array.transpose(2, 0, 1)
+
+    def _is_probabilities(self, outputs: "np.ndarray") -> bool:
+        """模型输出是否已经是概率：按配置，auto时以每行非负且和为1判断（导出时带softmax的分类模型）"""
+        if self.output_type != "auto":
+            return self.output_type == "probabilities"
+        return bool((outputs >= 0).all() and np.allclose(outputs.sum(axis=1), 1.0, atol=1e-3))
+
+    def _infer(self, batch: "np.ndarray") -> "np.ndarray":
+        """批量推理，返回每行概率（模型输出logits时做softmax）"""
+        outputs = self._get_session().run(None, {self._input_name: batch})[0]
+        if self._is_probabilities(outputs):
+            return outputs
+        logits = outputs - outputs.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def _to_result(self, probabilities: "np.ndarray") -> EmotionResult:
+        emotions: Dict[str, float] = {}
+        for label, value in zip(self.labels, probabilities.tolist()):
+            emotion = AI_EMOTION_MAPPING.get(label.lower())
+            if emotion:  # 模型中7类以外的类别（如contempt）忽略
+                emotions[emotion] = emotions.get(emotion, 0.0) + value
+        return EmotionResult.create(
+            emotions=normalize_probabilities(emotions),
+            source="local",
+            raw_data={"model": os.path.basename(self.model_path)}
+        )
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._batch_worker())
+
+    async def _batch_worker(self):
+        """微批处理：收集等待窗口内的请求，合并为一次推理"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple["np.ndarray", asyncio.Future]] = [await self._queue.get()]
+            deadline = loop.time() + self.max_batch_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [(tensor, future) for tensor, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            try:
+                stacked = np.stack([tensor for tensor, _ in batch])
+                probabilities = await loop.run_in_executor(None, self._infer, stacked)
+                self.batches += 1
+                self.items += len(batch)
+                for (_, future), row in zip(batch, probabilities):
+                    if not future.done():
+                        future.set_result(self._to_result(row))
+            except Exception as e:
+                logger.error(f"本地表情模型推理失败: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def analyze_emotion(self, image: Union[bytes, PreparedImage]) -> EmotionResult:
+        """分析图像中的情绪（进入微批队列）"""
+        if not self.available:
+            raise Exception("本地表情模型不可用（未安装onnxruntime或未配置LOCAL_MODEL_PATH）")
+
+        prepared = PreparedImage.ensure(image)
+        face_box = await prepared.face_box() if ANALYSIS_CONFIG["face_crop_enabled"] else None
+        loop = asyncio.get_running_loop()
+        tensor = await loop.run_in_executor(None, self._preprocess, prepared, face_box)
+
+        self._ensure_worker()
+        future = loop.create_future()
+        await self._queue.put((tensor, future))
+        return await future
+
+    async def analyze_batch(self, images: List[Union[bytes, PreparedImage]]) -> List[EmotionResult]:
+        """批量分析（所有图像在同一个微批中推理）"""
+        return await asyncio.gather(*[self.analyze_emotion(image) for image in images])
+
+    async def close(self):
+        """停止微批处理任务"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    def stats(self) -> Dict:
+        return {
+            "available": self.available,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
@@ -0,0 +1,152 @@
+"""
+模型路由服务
+按模型/服务记录滚动成功率与延迟EWMA，连续失败时熔断（半开探测恢复），并按预期延迟排序调用顺序
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from ..models.emotion import ANALYSIS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断打开或半开探测进行中，拒绝本次调用"""
+
+
+class ModelHealth:
+    """单个模型/服务的健康状态"""
+
+    def __init__(self, name: str, window: int):
+        self.name = name
+        self.outcomes = deque(maxlen=window)  # 最近调用结果（True成功/False失败）
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.probe_started_at: Optional[float] = None
+        self.total_calls = 0
+
+    @property
+    def success_rate(self) -> float:
+        if not self.outcomes:
+            return 1.0
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def to_dict(self) -> Dict:
+        return {
+            "state": self.state,
+            "success_rate": round(self.success_rate, 4),
+            "latency_ewma": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "window_size": len(self.outcomes),
+            "total_calls": self.total_calls
+        }
+
+
+class ModelRouter:
+    """健康度与延迟评分的模型路由（带熔断器）"""
+
+    def __init__(self, failure_threshold: Optional[int] = None, open_seconds: Optional[float] = None,
+                 window: Optional[int] = None, ewma_alpha: Optional[float] = None):
+        self.failure_threshold = failure_threshold or ANALYSIS_CONFIG["circuit_failure_threshold"]
+        self.open_seconds = open_seconds or ANALYSIS_CONFIG["circuit_open_seconds"]
+        self.window = window or ANALYSIS_CONFIG["routing_window"]
+        self.ewma_alpha = ewma_alpha or ANALYSIS_CONFIG["routing_ewma_alpha"]
+        self._health: Dict[str, ModelHealth] = {}
+
+    def _get(self, name: str) -> ModelHealth:
+        health = self._health.get(name)
+        if health is None:
+            health = ModelHealth(name, self.window)
+            self._health[name] = health
+        return health
+
+    def is_available(self, name: str) -> bool:
+        """是否允许调用（熔断打开且未到探测时间时返回False）"""
+        health = self._get(name)
+        now = time.monotonic()
+        if health.state == CIRCUIT_OPEN:
+            return now - health.opened_at >= self.open_seconds
+        if health.state == CIRCUIT_HALF_OPEN:
+            # 半开状态只允许一个探测请求；探测请求长时间无结果时允许重新探测
+            return health.probe_started_at is None or now - health.probe_started_at >= self.open_seconds
+        return True
+
+    def order(self, names: List[str]) -> List[str]:
+        """过滤熔断中的模型，并按预期延迟（延迟EWMA / 成功率）排序"""
+        available = [name for name in names if self.is_available(name)]
+        known = [self._get(name).latency_ewma for name in available if self._get(name).latency_ewma is not None]
+        # 尚无延迟数据的模型按已知模型的平均值估计，保持配置顺序作为次序
+        default_latency = sum(known) / len(known) if known else 0.0
+
+        def expected_cost(item):
+            index, name = item
+            health = self._get(name)
+            latency = health.latency_ewma if health.latency_ewma is not None else default_latency
+            return (latency / max(health.success_rate, 0.1), index)
+
+        return [name for _, name in sorted(enumerate(available), key=expected_cost)]
+
+    def try_acquire_probe(self, name: str) -> bool:
+        """开始调用前获取调用许可：熔断关闭时总是允许；熔断打开且已到探测时间时转为半开，
+        半开状态同一时间只发放一个探测名额（检查与占用之间没有await，对并发调用是原子的），
+        探测名额在调用成功、失败或取消时释放"""
+        health = self._get(name)
+        now = time.monotonic()
+        if health.state == CIRCUIT_CLOSED:
+            return True
+        if health.state == CIRCUIT_OPEN:
+            if now - health.opened_at < self.open_seconds:
+                return False
+            health.state = CIRCUIT_HALF_OPEN
+            logger.info(f"熔断器半开探测: {name}")
+        elif health.probe_started_at is not None and now - health.probe_started_at < self.open_seconds:
+            # 已有探测请求进行中（长时间无结果时允许重新探测）
+            return False
+        health.probe_started_at = now
+        return True
+
+    def release(self, name: str):
+        """调用被取消：不计入统计，只释放半开探测名额"""
+        self._get(name).probe_started_at = None
+
+    def record_success(self, name: str, latency: float):
+        """记录成功调用"""
+        health = self._get(name)
+        health.total_calls += 1
+        health.outcomes.append(True)
+        health.consecutive_failures = 0
+        if health.latency_ewma is None:
+            health.latency_ewma = latency
+        else:
+            health.latency_ewma = self.ewma_alpha * latency + (1 - self.ewma_alpha) * health.latency_ewma
+        if health.state != CIRCUIT_CLOSED:
+            logger.info(f"熔断器关闭: {name}")
+        health.state = CIRCUIT_CLOSED
+        health.probe_started_at = None
+
+    def record_failure(self, name: str):
+        """记录失败调用，连续失败达到阈值或半开探测失败时打开熔断器"""
+        health = self._get(name)
+        health.total_calls += 1
+        health.outcomes.append(False)
+        health.consecutive_failures += 1
+        health.probe_started_at = None
+        if health.state == CIRCUIT_HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+            if health.state != CIRCUIT_OPEN:
+                logger.warning(f"熔断器打开: {name} (连续失败{health.consecutive_failures}次)")
+            health.state = CIRCUIT_OPEN
+            health.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        """运行时路由状态"""
+        return {name: health.to_dict() for name, health in self._health.items()}
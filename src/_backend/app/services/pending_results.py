@@ -0,0 +1,103 @@
+"""
+超出延迟预算的分析请求
+请求在延迟预算内返回部分结果后，未完成的服务调用在后台继续运行（结果写入结果缓存）；
+这里按请求ID保存这些后台任务与已到达的结果，供后续查询完整结果（LRU淘汰 + TTL过期）
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ..models.emotion import ANALYSIS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class PendingAnalysis:
+    """一个返回了部分结果的请求"""
+
+    __slots__ = ("request_id", "task", "outcomes", "created_at")
+
+    def __init__(self, request_id: str, task: asyncio.Future, outcomes: List):
+        self.request_id = request_id
+        # 后台继续运行的服务调用，完成后返回全部结果（EmotionResult/None/异常）
+        self.task = task
+        # 已到达的结果（后台任务运行期间持续追加）
+        self.outcomes = outcomes
+        self.created_at = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return self.task.done()
+
+
+class PendingResults:
+    """按请求ID保存部分结果请求的后台任务"""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else ANALYSIS_CONFIG["pending_result_ttl"]
+        self.max_entries = max_entries if max_entries is not None else ANALYSIS_CONFIG["pending_result_max_entries"]
+        self._entries: "OrderedDict[str, PendingAnalysis]" = OrderedDict()
+        self.partial = 0
+        self.backfilled = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _consume(task: asyncio.Future):
+        # 后台任务的异常只在查询时使用，这里取走避免"Task exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def _on_done(self, task: asyncio.Future):
+        self._consume(task)
+        if not task.cancelled():
+            self.backfilled += 1
+
+    def register(self, task: asyncio.Future, outcomes: List) -> str:
+        """登记一个后台任务，返回请求ID"""
+        self._prune()
+        request_id = uuid.uuid4().hex
+        task.add_done_callback(self._on_done)
+        self._entries[request_id] = PendingAnalysis(request_id, task, outcomes)
+        self.partial += 1
+
+        # 超出容量时淘汰最早的请求（后台任务继续运行，只是不能再按ID查询）
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return request_id
+
+    def get(self, request_id: str) -> Optional[PendingAnalysis]:
+        """按请求ID查询，过期或不存在时返回None"""
+        self._prune()
+        return self._entries.get(request_id)
+
+    def _prune(self):
+        if self.ttl <= 0:
+            return
+        deadline = time.monotonic() - self.ttl
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.created_at >= deadline:
+                break
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def cancel_all(self):
+        """取消所有仍在运行的后台任务（服务关闭时）"""
+        for entry in self._entries.values():
+            if not entry.task.done():
+                entry.task.cancel()
+
+    def stats(self) -> Dict:
+        """运行时统计信息"""
+        return {
+            "entries": len(self._entries),
+            "running": sum(1 for entry in self._entries.values() if not entry.done),
+            "partial": self.partial,
+            "backfilled": self.backfilled,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,224 @@
+"""
+外部API限流
+每个服务、每个API密钥一个令牌桶：超出速率的调用排队等待（不超过截止时间）而不是直接失败；
+收到429时遵守Retry-After暂停发放令牌，并按乘性减小速率，之后随成功调用逐步恢复
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..models.emotion import ANALYSIS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ProviderThrottled(Exception):
+    """外部服务返回限流响应（HTTP 429等）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(Exception):
+    """截止时间内无法获得调用令牌"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头（秒数形式）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """自适应令牌桶（等待者按先到先得排队，只有队首等待令牌，暂停与降速立即作用于整个队列）"""
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.min_rate = rate * ANALYSIS_CONFIG["rate_limit_min_factor"]
+        self.decrease_factor = ANALYSIS_CONFIG["rate_limit_decrease_factor"]
+        self.recovery_step = rate * ANALYSIS_CONFIG["rate_limit_recovery_step"]
+        self._updated_at: Optional[float] = None
+        self._paused_until = 0.0
+        # 排队用的锁绑定到创建它的事件循环，事件循环变化（测试、基准脚本多次asyncio.run）时重建
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waiting = 0
+        self.queued = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def _refill(self, now: float):
+        if self._updated_at is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _reject(self, wait: float):
+        self.rejected += 1
+        raise RateLimitExceeded(f"{self.name} 限流排队超过截止时间（需等待{wait:.1f}s）")
+
+    def _loop_lock(self, loop: asyncio.AbstractEventLoop) -> asyncio.Lock:
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    @staticmethod
+    async def _acquire_lock(lock: asyncio.Lock, timeout: float) -> bool:
+        """在超时内获取锁，超时返回False
+
+        不使用wait_for：Python 3.12之前wait_for可能在获取成功后仍报告超时，锁将永远不被释放；
+        这里超时或被取消时取消获取，若获取已经完成则立即释放
+        """
+        def release_if_acquired(task: asyncio.Future):
+            if not task.cancelled() and task.exception() is None:
+                lock.release()
+
+        acquiring = asyncio.ensure_future(lock.acquire())
+        try:
+            done, _ = await asyncio.wait([acquiring], timeout=timeout)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(release_if_acquired)
+            acquiring.cancel()
+            raise
+        if done:
+            return acquiring.result()
+        acquiring.add_done_callback(release_if_acquired)
+        acquiring.cancel()
+        return False
+
+    async def acquire(self, deadline: float):
+        """获取一个令牌，需要等待时排队；等待会超过截止时间则抛出RateLimitExceeded"""
+        loop = asyncio.get_running_loop()
+        lock = self._loop_lock(loop)
+        waited = False
+        self.waiting += 1
+        try:
+            if lock.locked():
+                waited = True
+                if not await self._acquire_lock(lock, max(0.0, deadline - loop.time())):
+                    self._reject(deadline - loop.time())
+            else:
+                await lock.acquire()
+
+            try:
+                while True:
+                    now = loop.time()
+                    self._refill(now)
+                    wait = max((1.0 - self.tokens) / self.rate if self.tokens < 1.0 else 0.0,
+                               self._paused_until - now)
+                    if wait <= 0:
+                        self.tokens -= 1
+                        return
+                    if now + wait > deadline:
+                        self._reject(wait)
+                    waited = True
+                    await asyncio.sleep(wait)
+            finally:
+                lock.release()
+        finally:
+            self.waiting -= 1
+            if waited:
+                self.queued += 1
+
+    def on_success(self):
+        """调用成功：速率逐步恢复到配置值"""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.recovery_step)
+
+    def on_throttled(self, retry_after: Optional[float]):
+        """收到限流响应：暂停发放令牌并降低速率"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._refill(now)
+        self.throttled += 1
+        # 同一批在途请求陆续返回的429只降速一次
+        if now >= self._paused_until:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self._paused_until = max(self._paused_until, now + pause)
+        self.tokens = min(self.tokens, 0.0)
+        logger.warning(f"{self.name} 被限流，暂停{pause:.1f}s，速率调整为{self.rate:.2f}/s")
+
+    @property
+    def resume_at(self) -> float:
+        return self._paused_until
+
+    def stats(self) -> Dict:
+        return {
+            "rate": round(self.rate, 4),
+            "base_rate": self.base_rate,
+            "tokens": round(self.tokens, 2),
+            "queue_depth": self.waiting,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "rejected": self.rejected
+        }
+
+
+class RateLimiter:
+    """按 服务+API密钥 划分的限流器"""
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.max_wait = ANALYSIS_CONFIG["rate_limit_max_wait"]
+
+    def bucket(self, provider: str, api_key: str) -> Optional[TokenBucket]:
+        """获取令牌桶，服务未配置速率时返回None（不限流）"""
+        rate = ANALYSIS_CONFIG.get(f"{provider}_rate_limit", 0.0)
+        if rate <= 0:
+            return None
+        # 统计信息中不暴露API密钥
+        name = f"{provider}:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8]}"
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = TokenBucket(name, rate, ANALYSIS_CONFIG.get(f"{provider}_rate_burst", 1.0))
+            self._buckets[name] = bucket
+        return bucket
+
+    async def call(self, provider: str, api_key: str, func: Callable[[], Awaitable[T]],
+                   max_wait: Optional[float] = None) -> T:
+        """在限流下执行一次外部调用；被限流时等待后重试，直到截止时间"""
+        bucket = self.bucket(provider, api_key)
+        if bucket is None:
+            return await func()
+
+        deadline = asyncio.get_running_loop().time() + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            await bucket.acquire(deadline)
+            try:
+                result = await func()
+            except ProviderThrottled as e:
+                bucket.on_throttled(e.retry_after)
+                if bucket.resume_at > deadline:
+                    raise
+                continue
+            bucket.on_success()
+            return result
+
+    def stats(self) -> Dict:
+        return {name: bucket.stats() for name, bucket in self._buckets.items()}
+
+
+# 进程内共享的限流器（同一API密钥的所有调用共用令牌桶）
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取共享限流器"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,275 @@
+"""
+AI模型响应解析
+Gemini、OpenRouter情绪分析与裁判员AI共用的解析引擎：
+预编译正则、单次扫描的平衡JSON提取、预编译的多关键词匹配，热路径上不记录完整响应文本
+结构化输出（responseSchema约束的JSON）直接解析，失败时才退回通用解析
+"""
+
+import json
+import logging
+import re
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+from ..models.emotion import AI_EMOTION_MAPPING, normalize_probabilities
+
+logger = logging.getLogger(__name__)
+
+# ```json ... ``` 代码块
+JSON_FENCE_PATTERN = re.compile(r'```json\s*\n(.*?)\n```', re.DOTALL)
+# ``` ... ``` 代码块（无语言标识）
+CODE_FENCE_PATTERN = re.compile(r'```\s*\n(.*?)\n```', re.DOTALL)
+# JSON中的完整字符串（含转义）或花括号：字符串整体跳过，其中的括号不计入嵌套深度
+JSON_BRACE_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}]', re.DOTALL)
+
+
+class KeywordMatcher:
+    """多关键词匹配器：所有关键词编译为一个正则，一次扫描找出文本中出现的全部关键词"""
+
+    def __init__(self, keywords: Iterable[str]):
+        keywords = sorted(set(keywords), key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+        # 长关键词命中时，其中包含的短关键词（如sadness中的sad）也视为出现
+        self._implied = {
+            keyword: {other for other in keywords if other in keyword}
+            for keyword in keywords
+        }
+
+    def find_all(self, text: str) -> Set[str]:
+        """返回文本中出现的所有不同关键词"""
+        found: Set[str] = set()
+        for match in self._pattern.finditer(text):
+            found |= self._implied[match.group(0)]
+        return found
+
+
+EMOTION_KEYWORDS = KeywordMatcher(AI_EMOTION_MAPPING.keys())
+
+
+def extract_json_object(text: str, start: int = 0) -> Optional[str]:
+    """单次扫描提取第一个括号平衡的JSON对象（正确跳过字符串中的括号与转义）
+
+    由预编译正则在C层跳过普通字符与整个字符串，Python层只处理花括号
+    """
+    begin = text.find("{", start)
+    if begin == -1:
+        return None
+
+    depth = 0
+    for match in JSON_BRACE_PATTERN.finditer(text, begin):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return text[begin:match.end()]
+    return None
+
+
+def _balanced_objects(text: str) -> Iterator[str]:
+    """依次产出文本中互不重叠的括号平衡对象"""
+    start = 0
+    while True:
+        begin = text.find("{", start)
+        if begin == -1:
+            return
+        extracted = extract_json_object(text, begin)
+        if extracted is None:
+            return
+        yield extracted
+        start = begin + len(extracted)
+
+
+def _candidate_json(text: str) -> Optional[str]:
+    """按优先级定位响应中的JSON文本：整段JSON、```json代码块、通用代码块、首个平衡对象"""
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        return stripped
+
+    match = JSON_FENCE_PATTERN.search(text)
+    if match:
+        return match.group(1).strip()
+
+    match = CODE_FENCE_PATTERN.search(text)
+    if match and match.group(1).strip().startswith("{"):
+        return match.group(1).strip()
+
+    return extract_json_object(text)
+
+
+def parse_json_payload(text: str) -> Optional[Dict]:
+    """从模型响应中解析JSON对象，无法解析时返回None"""
+    candidate = _candidate_json(text)
+    if candidate is None:
+        return None
+
+    try:
+        data = json.loads(candidate)
+    except json.JSONDecodeError:
+        # 整段或代码块内容后面带有多余文字、或前文中有非JSON的括号片段时，依次尝试后续的平衡对象
+        data = None
+        for extracted in _balanced_objects(text):
+            if extracted == candidate:
+                continue
+            try:
+                data = json.loads(extracted)
+                break
+            except json.JSONDecodeError:
+                continue
+    return data if isinstance(data, dict) else None
+
+
+def keyword_emotions(text: str) -> Dict[str, float]:
+    """关键词兜底：按出现的不同情绪关键词计数并转换为概率"""
+    detected: Dict[str, float] = {}
+    for keyword in EMOTION_KEYWORDS.find_all(text.lower()):
+        emotion = AI_EMOTION_MAPPING[keyword]
+        detected[emotion] = detected.get(emotion, 0) + 1
+
+    total = sum(detected.values())
+    return {emotion: count / total for emotion, count in detected.items()}
+
+
+def parse_emotion_response(text_response: str) -> Dict[str, float]:
+    """解析情绪分析响应为标准化的7类情绪概率"""
+    try:
+        data = parse_json_payload(text_response)
+        if data is not None:
+            return normalize_probabilities(data.get("emotions", {}))
+
+        detected = keyword_emotions(text_response)
+        if detected:
+            logger.debug("AI响应非JSON，使用关键词提取")
+            return normalize_probabilities(detected)
+
+        logger.warning(f"所有解析方法都失败，返回默认中性情绪 (响应长度: {len(text_response)})")
+        return {"neutral": 1.0}
+
+    except Exception as e:
+        logger.error(f"解析AI响应失败: {e}")
+        return {"neutral": 1.0}
+
+
+def parse_judge_response(text_response: str) -> Dict:
+    """解析裁判员AI响应，无法得到JSON对象时抛出异常"""
+    data = parse_json_payload(text_response)
+    if data is None:
+        logger.error(f"无法解析裁判员AI响应: {text_response[:200]}")
+        raise Exception("裁判员AI未返回有效JSON格式")
+    return data
+
+
+def _load_structured(text_response: str) -> Optional[Dict]:
+    """解析结构化输出（响应本身即JSON对象）"""
+    try:
+        data = json.loads(text_response)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_structured_emotions(text_response: str) -> Dict[str, float]:
+    """解析结构化情绪分析响应，格式不符时退回通用解析"""
+    data = _load_structured(text_response)
+    if data is not None and isinstance(data.get("emotions"), dict):
+        return normalize_probabilities(data["emotions"])
+
+    logger.warning("结构化输出解析失败，退回通用解析")
+    return parse_emotion_response(text_response)
+
+
+def parse_structured_judge(text_response: str) -> Dict:
+    """解析结构化裁判员响应，格式不符时退回通用解析"""
+    data = _load_structured(text_response)
+    if data is not None:
+        return data
+
+    logger.warning("结构化裁判输出解析失败，退回通用解析")
+    return parse_judge_response(text_response)
+
+
+class StreamingObjectParser:
+    """流式响应的增量解析器：逐块输入文本，指定键的对象值语法完整时立即返回
+
+    从第一个"{"开始扫描，维护字符串/转义/嵌套深度状态，每个字符只处理一次
+    """
+
+    def __init__(self, key: str = "emotions"):
+        self.key = key
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = -1
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._value_start = -1
+        self._value_depth = 0
+        self.value: Optional[Dict] = None
+
+    @property
+    def text(self) -> str:
+        """目前收到的全部文本"""
+        return self._text
+
+    def feed(self, chunk: str) -> Optional[Dict]:
+        """输入一段文本，目标对象完整时返回解析结果，否则返回None"""
+        if self.value is not None:
+            return self.value
+
+        self._text += chunk
+        text = self._text
+        for index in range(self._pos, len(text)):
+            char = text[index]
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:index]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = index
+                self._pending_key = None
+            elif char == ":":
+                self._pending_key = self._last_string
+            elif char == "{":
+                self._depth += 1
+                if self._value_start == -1 and self._pending_key == self.key:
+                    self._value_start = index
+                    self._value_depth = self._depth
+                self._pending_key = None
+            elif char == "}":
+                if self._value_start != -1 and self._depth == self._value_depth:
+                    self._pos = index + 1
+                    return self._complete(text[self._value_start:index + 1])
+                self._depth -= 1
+            elif not char.isspace():
+                self._pending_key = None
+
+        self._pos = len(text)
+        return None
+
+    def _complete(self, candidate: str) -> Optional[Dict]:
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            # 不是合法JSON（如提示词方式中的示例片段），继续扫描
+            self._value_start = -1
+            self._depth -= 1
+            return None
+        if not isinstance(value, dict):
+            self._value_start = -1
+            self._depth -= 1
+            return None
+        self.value = value
+        return value
@@ -0,0 +1,88 @@
+"""
+情绪分析结果缓存
+以图像内容哈希 + 服务/模型标识为键，缓存各服务的EmotionResult（LRU淘汰 + TTL过期）
+配置结果存储时，新写入的结果同时交给存储持久化
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from ..models.emotion import EmotionResult, ANALYSIS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def image_digest(image_data: bytes) -> str:
+    """计算图像内容哈希"""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+class EmotionResultCache:
+    """内容寻址的情绪结果缓存"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None, store=None):
+        self.store = store
+        self.max_entries = max_entries if max_entries is not None else ANALYSIS_CONFIG["result_cache_max_entries"]
+        self.ttl = ttl if ttl is not None else ANALYSIS_CONFIG["result_cache_ttl"]
+        self._entries: "OrderedDict[str, Tuple[float, EmotionResult]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(digest: str, provider: str) -> str:
+        """构建缓存键：图像哈希 + 服务/模型标识"""
+        return f"{provider}:{digest}"
+
+    def get(self, key: str) -> Optional[EmotionResult]:
+        """读取缓存，过期条目视为未命中"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, result = entry
+        if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: EmotionResult, age: float = 0.0, persist: bool = True):
+        """写入缓存，超出容量时淘汰最久未使用的条目
+
+        age为结果已存在的秒数（从存储恢复时使用）；persist为False时不写入结果存储
+        """
+        if persist and self.store is not None:
+            self.store.record(key, result)
+        if self.max_entries <= 0:
+            return
+
+        self._entries[key] = (time.monotonic() - age, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        """运行时统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
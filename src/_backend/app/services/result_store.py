@@ -0,0 +1,240 @@
+"""
+情绪分析结果持久化
+以SQLite保存各服务的EmotionResult（图像哈希 + 服务 + 模型索引，含时间戳与裁剪后的原始数据），
+写入由后台线程批量完成，不影响请求延迟；启动时可从中恢复内存结果缓存，也可离线回放历史结果
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..models.emotion import EmotionResult, ANALYSIS_CONFIG
+from .result_cache import EmotionResultCache
+
+logger = logging.getLogger(__name__)
+
+# 相对路径以后端根目录为基准（与start_server.py同级）
+BACKEND_ROOT = Path(__file__).resolve().parent.parent.parent
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emotion_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cache_key TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    source TEXT NOT NULL,
+    dominant_emotion TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    emotions TEXT NOT NULL,
+    raw_data TEXT,
+    analyzed_at TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_emotion_results_lookup ON emotion_results (digest, provider, model);
+CREATE INDEX IF NOT EXISTS idx_emotion_results_stored_at ON emotion_results (stored_at);
+"""
+
+_COLUMNS = ("cache_key", "digest", "provider", "model", "source", "dominant_emotion",
+            "confidence", "emotions", "raw_data", "analyzed_at", "stored_at")
+
+# 写入队列结束标记
+_STOP = object()
+
+
+def split_source(source: str) -> Tuple[str, str]:
+    """数据来源拆分为 (服务, 模型)，如 gemini-gemini-2.0-flash-lite -> (gemini, gemini-2.0-flash-lite)"""
+    provider, _, model = source.partition("-")
+    return provider, model
+
+
+def trim_raw_data(raw_data: Any, max_chars: int, max_items: int = 20, max_string: int = 256) -> Optional[str]:
+    """裁剪原始API返回数据后序列化：截断长字符串与长列表，超出上限时只保留预览"""
+    if raw_data is None:
+        return None
+
+    def trim(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {str(key): trim(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            trimmed = [trim(item) for item in value[:max_items]]
+            if len(value) > max_items:
+                trimmed.append(f"...({len(value) - max_items} more)")
+            return trimmed
+        if isinstance(value, str) and len(value) > max_string:
+            return f"{value[:max_string]}...({len(value)} chars)"
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        return str(value)
+
+    text = json.dumps(trim(raw_data), ensure_ascii=False, separators=(",", ":"))
+    if len(text) > max_chars:
+        text = json.dumps({"truncated": True, "preview": text[:max_chars]}, ensure_ascii=False)
+    return text
+
+
+class ResultStore:
+    """SQLite结果存储（后台线程写入，读取使用独立连接）"""
+
+    def __init__(self, path: Optional[str] = None):
+        path = path or ANALYSIS_CONFIG["result_store_path"]
+        self.path = path if os.path.isabs(path) else str(BACKEND_ROOT / path)
+        self.raw_max_chars = ANALYSIS_CONFIG["result_store_raw_max_chars"]
+        self._queue: "queue.Queue" = queue.Queue(maxsize=ANALYSIS_CONFIG["result_store_queue_size"])
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        # WAL模式：后台写入时读取不被阻塞
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="result-store-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        connection = self._connect()
+        insert = f"INSERT INTO emotion_results ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        try:
+            stopping = False
+            while not stopping:
+                rows = [self._queue.get()]
+                # 合并队列中已有的记录为一次事务
+                while len(rows) < 256:
+                    try:
+                        rows.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if any(row is _STOP for row in rows):
+                    stopping = True
+                    rows = [row for row in rows if row is not _STOP]
+                if not rows:
+                    continue
+                try:
+                    with connection:
+                        connection.executemany(insert, rows)
+                    self.written += len(rows)
+                except sqlite3.Error as e:
+                    self.failed += len(rows)
+                    logger.error(f"结果存储写入失败: {e}")
+        finally:
+            connection.close()
+
+    def record(self, cache_key: str, result: EmotionResult):
+        """记录一个结果（只入队，不等待写入）"""
+        digest = cache_key.rpartition(":")[2]
+        provider, model = split_source(result.source)
+        row = (
+            cache_key, digest, provider, model, result.source, result.dominant_emotion,
+            float(result.confidence), json.dumps(result.emotions, separators=(",", ":")),
+            trim_raw_data(result.raw_data, self.raw_max_chars),
+            result.timestamp.isoformat(), time.time()
+        )
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """写完队列中的记录后停止后台线程（阻塞调用）"""
+        if self._writer is None:
+            return
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        self._writer = None
+
+    @staticmethod
+    def _to_result(row: sqlite3.Row) -> EmotionResult:
+        return EmotionResult(
+            emotions=json.loads(row["emotions"]),
+            dominant_emotion=row["dominant_emotion"],
+            confidence=row["confidence"],
+            source=row["source"],
+            timestamp=datetime.fromisoformat(row["analyzed_at"]),
+            raw_data=json.loads(row["raw_data"]) if row["raw_data"] else None
+        )
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        if not os.path.exists(self.path):
+            return []
+        connection = self._connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def load_recent(self, max_age: float, limit: int) -> List[Tuple[str, EmotionResult, float]]:
+        """读取最近的结果（每个缓存键取最新一条），返回 [(缓存键, 结果, 已存在秒数)]，新结果在前"""
+        since = time.time() - max_age if max_age > 0 else 0.0
+        rows = self._query(
+            "SELECT * FROM emotion_results WHERE id IN ("
+            "SELECT MAX(id) FROM emotion_results WHERE stored_at >= ? GROUP BY cache_key"
+            ") ORDER BY stored_at DESC LIMIT ?",
+            (since, limit)
+        )
+        now = time.time()
+        return [(row["cache_key"], self._to_result(row), max(0.0, now - row["stored_at"])) for row in rows]
+
+    def latest_results(self, digest: str, providers: List[str]) -> List[EmotionResult]:
+        """某张图像在给定服务标识下的最新结果（服务标识与缓存键一致，如 "facepp"、"gemini:模型列表"）
+
+        只取调用方当前配置会查询的服务标识，旧模型或旧路由的结果不参与回放
+        """
+        if not providers:
+            return []
+        keys = [EmotionResultCache.make_key(digest, provider) for provider in providers]
+        rows = self._query(
+            "SELECT * FROM emotion_results WHERE id IN ("
+            f"SELECT MAX(id) FROM emotion_results WHERE cache_key IN ({', '.join('?' * len(keys))}) "
+            "GROUP BY cache_key"
+            ")",
+            tuple(keys)
+        )
+        # 按调用方给出的服务顺序返回（与实时分析的结果顺序一致）
+        rows = sorted(rows, key=lambda row: keys.index(row["cache_key"]))
+        return [self._to_result(row) for row in rows]
+
+    def history(self, digest: Optional[str] = None, provider: Optional[str] = None,
+                model: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """按条件查询历史记录（新记录在前）"""
+        conditions, params = [], []
+        for column, value in (("digest", digest), ("provider", provider), ("model", model)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._query(
+            f"SELECT * FROM emotion_results {where} ORDER BY stored_at DESC LIMIT ?", (*params, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict:
+        """运行时统计信息"""
+        return {
+            "path": self.path,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
@@ -0,0 +1,84 @@
+"""
+进行中请求合并（single-flight）
+相同键（图像哈希 + 服务标识）的并发调用共享同一个进行中的任务，而不是各自调用外部API；
+单个等待者取消（如客户端断开）不影响其他等待者，所有等待者都离开后才取消共享任务
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..models.emotion import ANALYSIS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """一个进行中的共享调用"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = enabled if enabled is not None else ANALYSIS_CONFIG["single_flight_enabled"]
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    @staticmethod
+    def _consume(task: asyncio.Task):
+        # 没有等待者时异常由这里取走，避免"Task exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """执行func，或等待相同键的进行中调用的结果"""
+        if not self.enabled:
+            return await func()
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            flight.task.add_done_callback(self._consume)
+            flight.task.add_done_callback(lambda _task, flight=flight: self._forget(key, flight))
+            self._flights[key] = flight
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"合并进行中的调用: {key[:48]}")
+
+        flight.waiters += 1
+        try:
+            # shield：当前等待者被取消时共享任务继续运行
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 所有等待者都已离开：取消共享任务，之后的相同请求重新发起调用
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.abandoned += 1
+
+    def stats(self) -> Dict:
+        """运行时统计信息"""
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned
+        }
@@ -0,0 +1,158 @@
+"""
+流式分析接口基准
+在本地桩服务器上启动后端服务（Gemini比Face++慢），对比 /api/v1/analyze/image 与 /image/stream、
+/batch 与 /batch/stream 的首字节时间与总耗时；校验流式结果与非流式结果一致，
+并验证客户端中途断开后进行中的外部调用被取消
+
+用法:
+    python benchmarks/bench_analysis_stream.py --latency 0.2 --gemini-extra 2.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+def start_backend():
+    """在独立线程中启动后端服务，返回 (服务器, 基础URL)"""
+    import uvicorn
+    from app.main import app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def image_form(images):
+    form = aiohttp.FormData()
+    field = "file" if len(images) == 1 else "files"
+    for index, image in enumerate(images):
+        form.add_field(field, image, filename=f"{index}.jpg", content_type="image/jpeg")
+    return form
+
+
+async def post_json(session, url, images):
+    start = time.perf_counter()
+    async with session.post(url, data=image_form(images)) as response:
+        body = await response.json()
+    return time.perf_counter() - start, body
+
+
+async def post_stream(session, url, images, stop_after=None):
+    """读取SSE事件，返回 [(到达时间, 事件名, 数据)]；stop_after为事件名时收到后立即断开"""
+    start = time.perf_counter()
+    events = []
+    async with session.post(url, data=image_form(images)) as response:
+        assert response.headers["Content-Type"].startswith("text/event-stream")
+        event = None
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").rstrip("\n")
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((time.perf_counter() - start, event, json.loads(line[len("data: "):])))
+                if event == stop_after:
+                    break
+    return events
+
+
+def without_timestamp(text: str) -> str:
+    return "\n".join(line for line in text.splitlines() if "TIMESTAMP" not in line)
+
+
+def report_events(label: str, events):
+    print(f"{label}:")
+    for elapsed, event, data in events:
+        detail = data.get("source") or data.get("image_id") or ""
+        print(f"  {elapsed * 1000:8.1f} ms  {event:<12} {detail}")
+
+
+async def main_async(args, base_url: str):
+    async with aiohttp.ClientSession() as session:
+        # 单张图像
+        elapsed, plain = await post_json(session, f"{base_url}/api/v1/analyze/image", [make_test_image(1)])
+        print(f"/analyze/image: {elapsed * 1000:.1f} ms 后返回全部内容")
+        events = await post_stream(session, f"{base_url}/api/v1/analyze/image/stream", [make_test_image(2)])
+        report_events("/analyze/image/stream", events)
+        assert [event for _, event, _ in events][0] == "header"
+        assert [event for _, event, _ in events][-2:] == ["verdict", "emotion_data"]
+
+        # 同一图像（结果缓存命中）流式与非流式内容一致
+        _, plain = await post_json(session, f"{base_url}/api/v1/analyze/image", [make_test_image(2)])
+        text = "".join(data.get("text", "") for _, _, data in events)
+        assert without_timestamp(text) == without_timestamp(plain["analysis_text"]), "流式文本与analysis_text不一致"
+        assert events[-1][2]["emotion_data"] == plain["emotion_data"]
+
+        # 批量
+        images = [make_test_image(10 + index) for index in range(args.images)]
+        elapsed, plain = await post_json(session, f"{base_url}/api/v1/analyze/batch", images)
+        print(f"/analyze/batch ({args.images}张): {elapsed * 1000:.1f} ms 后返回全部内容")
+        images = [make_test_image(20 + index) for index in range(args.images)]
+        events = await post_stream(session, f"{base_url}/api/v1/analyze/batch/stream", images)
+        report_events(f"/analyze/batch/stream ({args.images}张)", events)
+        _, plain = await post_json(session, f"{base_url}/api/v1/analyze/batch", images)
+        final = events[-1][2]
+        assert final["success"] and final["emotion_data"] == plain["emotion_data"]
+        assert [item["image_id"] for item in final["detailed_results"]] == \
+            [item["image_id"] for item in plain["detailed_results"]]
+        assert sum(1 for _, event, _ in events if event == "section") == args.images
+
+        # 客户端收到第一个服务的段落后断开：仍在进行的Gemini调用被取消
+        async with session.get(f"{base_url}/api/v1/analyze/stats") as response:
+            before = (await response.json())["single_flight"]["abandoned"]
+        await post_stream(session, f"{base_url}/api/v1/analyze/image/stream", [make_test_image(99)],
+                          stop_after="section")
+        await asyncio.sleep(0.5)
+        async with session.get(f"{base_url}/api/v1/analyze/stats") as response:
+            abandoned = (await response.json())["single_flight"]["abandoned"] - before
+        print(f"断开后取消的进行中调用: {abandoned} 个")
+        assert abandoned == 1
+    print("stream checks passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式分析接口基准")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--gemini-extra", type=float, default=2.0)
+    parser.add_argument("--images", type=int, default=3)
+    args = parser.parse_args()
+
+    stub = StubProviderServer(latency=args.latency).start()
+    stub.gemini_extra_latency = args.gemini_extra
+    os.environ["FACEPP_BASE_URL"] = stub.facepp_url
+    os.environ["GEMINI_BASE_URL"] = stub.gemini_url
+    os.environ["OPENROUTER_BASE_URL"] = stub.openrouter_url
+    os.environ.update(STUB_ENV)
+    os.environ["FRAME_DEDUP_ENABLED"] = "False"
+    os.environ["GEMINI_BATCH_MODE"] = "False"
+    # 只测Gemini变慢的情况，不对冲到其他服务
+    os.environ["OPENROUTER_MODE"] = "off"
+    os.environ["GEMINI_HEDGE_DELAY"] = "60"
+
+    server, base_url = start_backend()
+    try:
+        asyncio.run(main_async(args, base_url))
+    finally:
+        server.should_exit = True
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+批量分析Gemini调用方式基准：逐帧调用 + 裁判员AI 与 多图单次调用（含综合判断）
+在本地桩服务器上统计 /api/v1/analyze/batch 的耗时与Gemini请求次数，并校验detailed_results结构一致；
+同时校验启用人脸裁剪时，多图单次调用不发送本地检测无人脸的图像
+
+桩服务器按输出长度模拟生成时间：单次调用需要串行生成所有图像的输出，
+结构化输出（紧凑JSON）时收益最明显
+
+用法:
+    python benchmarks/bench_batch_gemini.py --images 5 --latency 1.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+async def run_batch(server: StubProviderServer, batch_mode: bool, images: int, seed: int, model: str):
+    from app.models.emotion import ANALYSIS_CONFIG
+    from app.services.emotion_analyzer import EmotionAnalyzer
+
+    ANALYSIS_CONFIG["gemini_batch_mode"] = batch_mode
+    analyzer = EmotionAnalyzer()
+    analyzer.gemini_service.models = [model]
+    # 关闭本地一致性判定，使逐帧模式包含裁判员AI调用
+    analyzer.consensus.enabled = False
+    server.gemini_requests.clear()
+    start = time.perf_counter()
+    try:
+        response = await analyzer.analyze_batch_images([make_test_image(seed + index) for index in range(images)])
+    finally:
+        await analyzer.close()
+    elapsed = time.perf_counter() - start
+    assert response.success, response.error_message
+    return elapsed, len(server.gemini_requests), response
+
+
+def install_marker_face_detector():
+    """测试图像为纯色（Haar级联检测不到人脸），改为按颜色标记判定：绿色通道高于200的图像视为有人脸"""
+    from app.services import face_detector
+
+    class MarkerFaceDetector(face_detector.FaceDetector):
+        def __init__(self):
+            self._cascade = True
+
+        def detect(self, img):
+            return (0, 0, img.width, img.height) if img.getpixel((0, 0))[1] > 200 else None
+
+    face_detector._face_detector = MarkerFaceDetector()
+
+
+async def check_no_face_frames(server: StubProviderServer, model: str):
+    """多图单次调用只发送有人脸的图像；有图像被排除时综合判断不采用单次调用的结果"""
+    from app.models.emotion import ANALYSIS_CONFIG
+    from app.services.emotion_analyzer import EmotionAnalyzer
+
+    install_marker_face_detector()
+    ANALYSIS_CONFIG["face_crop_enabled"] = True
+    ANALYSIS_CONFIG["gemini_batch_mode"] = True
+    # make_test_image的绿色通道为 140 + seed % 100
+    face, no_face = 2070, 2000
+    try:
+        for seeds, expected_images in (([face, no_face], 1), ([face + 1, no_face + 1, face + 2], 2)):
+            analyzer = EmotionAnalyzer()
+            analyzer.gemini_service.models = [model]
+            server.gemini_images = 0
+            try:
+                response = await analyzer.analyze_batch_images([make_test_image(seed) for seed in seeds])
+            finally:
+                await analyzer.close()
+            assert response.success, response.error_message
+            assert server.gemini_images == expected_images, server.gemini_images
+            for seed, item in zip(seeds, response.detailed_results):
+                assert (item["gemini_result"] is None) == (seed % 100 < 61), item
+            assert response.judge_result.get("method") != "gemini_batch", response.judge_result
+            print(f"  {len(seeds)} frames ({len(seeds) - expected_images} without face): "
+                  f"{server.gemini_images} images sent to Gemini")
+    finally:
+        ANALYSIS_CONFIG["face_crop_enabled"] = False
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=args.latency).start()
+    os.environ["FACEPP_BASE_URL"] = server.facepp_url
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_MODE"] = "off"
+    os.environ["GEMINI_STREAMING"] = "False"
+    os.environ["FRAME_DEDUP_ENABLED"] = "False"
+
+    from app.services.http_client import close_http_client
+
+    try:
+        for model in args.models:
+            per_frame = await run_batch(server, False, args.images, 0, model)
+            single = await run_batch(server, True, args.images, 1000, model)
+
+            print(model)
+            for label, (elapsed, requests, response) in (("per-frame + judge", per_frame),
+                                                          ("single multi-image", single)):
+                print(f"  {label:>18}: {elapsed * 1000:6.0f} ms, {requests} Gemini requests, "
+                      f"verdict: {response.judge_result.get('method', 'judge_ai')}")
+
+        per_frame_details, single_details = per_frame[2].detailed_results, single[2].detailed_results
+        assert [sorted(item) for item in per_frame_details] == [sorted(item) for item in single_details]
+        assert all(item["gemini_result"] is not None for item in single_details)
+        assert single[1] == 1, single[1]
+        print("detailed_results structure matches")
+
+        print("face crop + batch mode")
+        await check_no_face_frames(server, args.models[0])
+        print("no-face frames skipped")
+    finally:
+        await close_http_client()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量分析Gemini调用方式基准")
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=1.5, help="每个请求的首字节延迟（秒）")
+    parser.add_argument("--models", nargs="+", default=["gemini-2.0-flash-lite", "gemma-3-27b-it"],
+                        help="结构化输出模型与提示词方式模型（桩服务器按输出长度计算生成时间）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
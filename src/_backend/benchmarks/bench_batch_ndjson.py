@@ -0,0 +1,104 @@
+"""
+批量分析NDJSON流式模式基准
+在本地桩服务器上启动后端服务（Gemini比Face++慢），对比 /api/v1/analyze/batch 与 ?stream=true 的
+首行时间与总耗时；校验每个 图像+服务 各一行、最终行与非流式结果一致，
+并验证客户端看到足够结果后断开时进行中的外部调用被取消
+
+用法:
+    python benchmarks/bench_batch_ndjson.py --images 5 --latency 0.2 --gemini-extra 2.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+from bench_analysis_stream import image_form, post_json, start_backend  # noqa: E402
+
+
+async def post_ndjson(session, url, images, stop_after_lines=None):
+    """逐行读取NDJSON，返回 [(到达时间, 数据)]；读到stop_after_lines行后立即断开"""
+    start = time.perf_counter()
+    lines = []
+    async with session.post(url, data=image_form(images)) as response:
+        assert response.headers["Content-Type"].startswith("application/x-ndjson")
+        async for raw_line in response.content:
+            lines.append((time.perf_counter() - start, json.loads(raw_line)))
+            if stop_after_lines is not None and len(lines) >= stop_after_lines:
+                break
+    return lines
+
+
+async def abandoned_calls(session, base_url) -> int:
+    async with session.get(f"{base_url}/api/v1/analyze/stats") as response:
+        return (await response.json())["single_flight"]["abandoned"]
+
+
+async def main_async(args, base_url: str):
+    url = f"{base_url}/api/v1/analyze/batch"
+    async with aiohttp.ClientSession() as session:
+        images = [make_test_image(10 + index) for index in range(args.images)]
+        elapsed, _ = await post_json(session, url, images)
+        print(f"/analyze/batch ({args.images}张): {elapsed * 1000:.1f} ms 后返回全部内容")
+
+        images = [make_test_image(20 + index) for index in range(args.images)]
+        lines = await post_ndjson(session, f"{url}?stream=true", images)
+        print(f"/analyze/batch?stream=true ({args.images}张):")
+        for elapsed, line in lines:
+            print(f"  {elapsed * 1000:8.1f} ms  {line['type']:<8} {line.get('image_id', '')} {line.get('source', '')}")
+
+        results = [line for _, line in lines if line["type"] == "result"]
+        assert lines[-1][1]["type"] == "verdict"
+        assert len({(line["image_id"], line["source"]) for line in results}) == len(results) == args.images * 2
+        assert all(line["success"] for line in results)
+        _, plain = await post_json(session, url, images)
+        assert lines[-1][1]["emotion_data"] == plain["emotion_data"]
+        assert lines[-1][1]["judge_result"] == plain["judge_result"]
+
+        # 看到所有Face++结果后断开：进行中的Gemini调用全部取消
+        before = await abandoned_calls(session, base_url)
+        images = [make_test_image(40 + index) for index in range(args.images)]
+        seen = await post_ndjson(session, f"{url}?stream=true", images, stop_after_lines=args.images)
+        await asyncio.sleep(0.5)
+        abandoned = await abandoned_calls(session, base_url) - before
+        print(f"收到{len(seen)}行后断开（{seen[-1][0] * 1000:.1f} ms），取消的进行中调用: {abandoned} 个")
+        assert abandoned == args.images
+    print("ndjson checks passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量分析NDJSON流式模式基准")
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--gemini-extra", type=float, default=2.0)
+    args = parser.parse_args()
+
+    stub = StubProviderServer(latency=args.latency).start()
+    stub.gemini_extra_latency = args.gemini_extra
+    os.environ["FACEPP_BASE_URL"] = stub.facepp_url
+    os.environ["GEMINI_BASE_URL"] = stub.gemini_url
+    os.environ["OPENROUTER_BASE_URL"] = stub.openrouter_url
+    os.environ.update(STUB_ENV)
+    os.environ["FRAME_DEDUP_ENABLED"] = "False"
+    os.environ["GEMINI_BATCH_MODE"] = "False"
+    os.environ["OPENROUTER_MODE"] = "off"
+    os.environ["GEMINI_HEDGE_DELAY"] = "60"
+
+    server, base_url = start_backend()
+    try:
+        asyncio.run(main_async(args, base_url))
+    finally:
+        server.should_exit = True
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
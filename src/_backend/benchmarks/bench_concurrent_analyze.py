@@ -0,0 +1,123 @@
+"""
+并发吞吐基准：N个并发客户端请求 /api/v1/analyze/image
+对比旧版阻塞requests实现（before）与共享异步连接池实现（after）
+
+用法:
+    python benchmarks/bench_concurrent_analyze.py --clients 20 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_jpeg_encoder import legacy_compress  # noqa: E402
+
+
+def make_test_image(seed: int = 0) -> bytes:
+    """生成一张测试用JPEG图像（不同seed生成不同内容，避免命中结果缓存）"""
+    from PIL import Image
+    buffer = BytesIO()
+    color = (180, 140 + seed % 100, 120 + seed // 100 % 100)
+    Image.new("RGB", (640, 480), color).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def install_legacy_services(analyzer):
+    """替换为旧版实现：async函数内调用阻塞的requests.post"""
+    import requests
+    from app.models.emotion import EmotionResult, get_dominant_emotion
+    from app.services.image_preprocess import PreparedImage
+
+    facepp = analyzer.facepp_service
+    gemini = analyzer.gemini_service
+
+    async def legacy_facepp(image) -> EmotionResult:
+        image_data = PreparedImage.ensure(image).data
+        compressed_image = legacy_compress(image_data)
+        files = {"image_file": ("image.jpg", compressed_image, "image/jpeg")}
+        data = {"api_key": facepp.api_key, "api_secret": facepp.api_secret,
+                "return_attributes": "emotion"}
+        response = requests.post(facepp.base_url, data=data, files=files, timeout=30)
+        response.raise_for_status()
+        emotions = facepp.parse_facepp_response(response.json())
+        dominant = get_dominant_emotion(emotions)
+        return EmotionResult(emotions, dominant, emotions[dominant], "facepp", datetime.now(), None)
+
+    async def legacy_gemini(image, model=None) -> EmotionResult:
+        image_data = PreparedImage.ensure(image).data
+        model = model or gemini.models[0]
+        data = {"contents": [{"parts": [{"text": "prompt"}, {"inlineData": {
+            "mimeType": "image/jpeg", "data": gemini.encode_image(image_data)}}]}]}
+        response = requests.post(f"{gemini.base_url}/{model}:generateContent",
+                                 params={"key": gemini.api_key}, json=data, timeout=30)
+        response.raise_for_status()
+        text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
+        emotions = gemini.parse_ai_response(text)
+        dominant = get_dominant_emotion(emotions)
+        return EmotionResult(emotions, dominant, emotions[dominant], f"gemini-{model}", datetime.now(), None)
+
+    facepp.analyze_emotion = legacy_facepp
+    gemini.analyze_emotion = legacy_gemini
+
+
+async def run_clients(app, clients: int, rounds: int) -> float:
+    """并发发起请求，返回总耗时"""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def one_client(client_id: int):
+            for round_id in range(rounds):
+                image_data = make_test_image(client_id * rounds + round_id)
+                response = await client.post(
+                    "/api/v1/analyze/image",
+                    files={"file": ("frame.jpg", image_data, "image/jpeg")}
+                )
+                assert response.status_code == 200 and response.json()["success"], response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one_client(i) for i in range(clients)])
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发分析吞吐基准")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.5, help="桩服务器模拟的API延迟（秒）")
+    args = parser.parse_args()
+
+    stub = StubProviderServer(latency=args.latency).start()
+    os.environ["FACEPP_BASE_URL"] = stub.facepp_url
+    os.environ["GEMINI_BASE_URL"] = stub.gemini_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_BASE_URL"] = stub.openrouter_url
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from app import main as app_main
+    from app.services.emotion_analyzer import EmotionAnalyzer
+
+    total = args.clients * args.rounds
+
+    try:
+        for label in ("before", "after"):
+            app_main.emotion_analyzer = EmotionAnalyzer()
+            if label == "before":
+                install_legacy_services(app_main.emotion_analyzer)
+            elapsed = asyncio.run(run_clients(app_main.app, args.clients, args.rounds))
+            print(f"{label:>6}: {total} requests in {elapsed:.2f}s -> {total / elapsed:.2f} req/s")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+近似重复帧合并基准
+批量中包含多组重复帧时，统计 /api/v1/analyze/batch 的耗时与上游请求数（合并开/关），
+并校验每组重复帧只以代表帧计入一致性判定与裁判员AI输入，detailed_results仍逐帧返回
+
+用法:
+    python benchmarks/bench_frame_dedup.py --copies 4 --latency 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+
+
+def make_gradient_image(angle: int) -> bytes:
+    """渐变测试图像：纯色图像的dHash全部相同，渐变方向不同的图像哈希差异最大"""
+    from PIL import Image
+
+    buffer = BytesIO()
+    image = Image.linear_gradient("L").rotate(angle).convert("RGB").resize((640, 480))
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def run_batch(server: StubProviderServer, dedup: bool, frames):
+    from app.models.emotion import ANALYSIS_CONFIG
+    from app.services.emotion_analyzer import EmotionAnalyzer
+
+    ANALYSIS_CONFIG["frame_dedup_enabled"] = dedup
+    analyzer = EmotionAnalyzer()
+    # 关闭本地一致性判定，使每个批次都调用裁判员AI，记录两者的输入规模
+    analyzer.consensus.enabled = False
+    consensus_inputs, judge_inputs = [], []
+    consensus_judge = analyzer.consensus.judge
+    judge_emotions = analyzer.gemini_service.judge_emotions
+
+    def record_consensus(results):
+        consensus_inputs.append(len(results))
+        return consensus_judge(results)
+
+    async def record_judge(rows):
+        judge_inputs.append(rows)
+        return await judge_emotions(rows)
+
+    analyzer.consensus.judge = record_consensus
+    analyzer.gemini_service.judge_emotions = record_judge
+
+    before = server.facepp_requests + len(server.gemini_requests)
+    start = time.perf_counter()
+    try:
+        response = await analyzer.analyze_batch_images(frames)
+    finally:
+        await analyzer.close()
+    elapsed = time.perf_counter() - start
+    assert response.success, response.error_message
+    upstream = server.facepp_requests + len(server.gemini_requests) - before
+    return elapsed, upstream, response, consensus_inputs, judge_inputs
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=args.latency).start()
+    os.environ["FACEPP_BASE_URL"] = server.facepp_url
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_MODE"] = "off"
+    os.environ["GEMINI_STREAMING"] = "False"
+    os.environ["GEMINI_BATCH_MODE"] = "False"
+    os.environ["FACE_CROP_ENABLED"] = "False"
+    os.environ["LOCAL_MODEL_MODE"] = "off"
+
+    # 两组画面：第一组args.copies帧完全相同，第二组1帧
+    frames = [make_gradient_image(90)] * args.copies + [make_gradient_image(-90)]
+    try:
+        elapsed, upstream, response, consensus_inputs, judge_inputs = await run_batch(server, False, frames)
+        print(f"dedup off: {len(frames)} frames in {elapsed * 1000:6.0f} ms, {upstream} upstream requests, "
+              f"{len(judge_inputs[0])} judge rows")
+
+        elapsed, upstream, response, consensus_inputs, judge_inputs = await run_batch(server, True, frames)
+        print(f"dedup on : {len(frames)} frames in {elapsed * 1000:6.0f} ms, {upstream} upstream requests, "
+              f"{len(judge_inputs[0])} judge rows")
+
+        # 每帧仍有详细结果，重复帧指向代表帧
+        assert [item["image_id"] for item in response.detailed_results] == list(range(1, len(frames) + 1))
+        assert [item["duplicate_of"] for item in response.detailed_results] == \
+            [None] + [1] * (args.copies - 1) + [None], response.detailed_results
+        # 两组各一次Face++与Gemini调用，外加一次裁判员AI调用；判断输入只含代表帧的结果
+        assert upstream == 5, upstream
+        assert consensus_inputs == [4], consensus_inputs
+        assert sorted({row["image_id"] for row in judge_inputs[0]}) == [1, len(frames)], judge_inputs[0]
+        assert len(judge_inputs[0]) == 4, judge_inputs[0]
+    finally:
+        server.stop()
+    print("frame dedup checks passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重复帧合并基准")
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.3)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+融合引擎基准
+对比旧版字典实现（每个请求融合两次：响应一次、分析文本一次）与EmotionVector向量化实现
+（构建结果不创建数组，融合时一次构建N×7矩阵，融合一次并复用）在单图（2-3个结果）与批量（N个结果）下的耗时，并校验输出一致
+
+用法:
+    python benchmarks/bench_fusion.py --results 3 15 60 200 --repeat 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_emotions(count: int, seed: int = 0):
+    from app.models.emotion import EMOTION_KEYS, normalize_probabilities
+
+    rng = random.Random(seed)
+    sources = ("facepp", "gemini-gemini-2.0-flash-lite", "local")
+    return [(normalize_probabilities({key: rng.random() ** 3 for key in EMOTION_KEYS}), sources[index % 3])
+            for index in range(count)]
+
+
+def legacy_results(emotions_list):
+    """旧版服务构建结果：字典上求主导情绪"""
+    from app.models.emotion import EmotionResult, get_dominant_emotion
+
+    results = []
+    for emotions, source in emotions_list:
+        dominant = get_dominant_emotion(emotions)
+        results.append(EmotionResult(emotions, dominant, emotions[dominant], source, datetime.now(), None))
+    return results
+
+
+def vector_results(emotions_list):
+    from app.models.emotion import EmotionResult
+
+    return [EmotionResult.create(emotions, source, None) for emotions, source in emotions_list]
+
+
+def legacy_merge(results):
+    """旧版 _merge_results：逐个字典累加后再标准化"""
+    from app.models.emotion import ANALYSIS_CONFIG, normalize_probabilities
+
+    if len(results) == 1:
+        return results[0].emotions
+    merged_emotions = {}
+    total_weight = 0
+    for result in results:
+        if result.source == "facepp":
+            weight = 0.6
+        elif result.source == "local":
+            weight = ANALYSIS_CONFIG["local_model_weight"]
+        else:
+            weight = 0.4
+        total_weight += weight
+        for emotion, value in result.emotions.items():
+            merged_emotions[emotion] = merged_emotions.get(emotion, 0) + value * weight
+    if total_weight > 0:
+        for emotion in merged_emotions:
+            merged_emotions[emotion] = merged_emotions[emotion] / total_weight
+    return normalize_probabilities(merged_emotions)
+
+
+def legacy_request(emotions_list):
+    """旧版单个请求：构建各服务结果，响应融合一次，分析文本中再融合一次"""
+    return legacy_fusion(legacy_results(emotions_list))
+
+
+def legacy_fusion(results):
+    from app.models.emotion import EMOTION_CONFIG, EmotionData, get_dominant_emotion
+
+    merged = legacy_merge(results)
+    emotion_data = [EmotionData(config["name"], round(merged.get(key, 0.0) * 100, 1), config["color"])
+                    for key, config in EMOTION_CONFIG.items()]
+    merged_again = legacy_merge(results)
+    dominant = get_dominant_emotion(merged_again)
+    return emotion_data, dominant, merged_again[dominant]
+
+
+def vector_request(analyzer, emotions_list):
+    """构建各服务结果，融合一次并复用"""
+    merged = analyzer._merge_results(vector_results(emotions_list))
+    return merged.to_emotion_data(), merged.dominant, merged.confidence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="融合引擎基准")
+    parser.add_argument("--results", type=int, nargs="+", default=[3, 15, 60, 200])
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ["RESULT_STORE_ENABLED"] = "False"
+    from app.services.emotion_analyzer import EmotionAnalyzer
+
+    analyzer = EmotionAnalyzer()
+    for count in args.results:
+        emotions_list = make_emotions(count)
+        legacy_data, legacy_dominant, legacy_confidence = legacy_request(emotions_list)
+        data, dominant, confidence = vector_request(analyzer, emotions_list)
+        assert data == legacy_data and dominant == legacy_dominant
+        assert abs(confidence - legacy_confidence) < 1e-9
+
+        repeat = max(1, args.repeat * 3 // count)
+
+        def per_call(func):
+            return timeit.timeit(func, number=repeat) / repeat * 1e6
+
+        legacy = legacy_results(emotions_list)
+        vectors = vector_results(emotions_list)
+        build = (per_call(lambda: legacy_results(emotions_list)), per_call(lambda: vector_results(emotions_list)))
+        fusion = (per_call(lambda: legacy_fusion(legacy)),
+                  per_call(lambda: analyzer._merge_results(vectors).to_emotion_data()))
+        # 构建结果不能明显慢于旧版（服务每次调用都要构建结果）
+        assert build[1] < build[0] * 1.5, build
+        print(f"{count:3d} results: build results {build[0]:6.1f} -> {build[1]:6.1f} us | "
+              f"fusion + EmotionData {fusion[0]:6.1f} (x2 dict) -> {fusion[1]:5.1f} us (x1 vector)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Face++上传压缩微基准：1080p与4K摄像头帧
+对比旧版质量递减循环（完整解码 + LANCZOS + 最多7次编码）与按大小预测质量的编码器
+
+用法:
+    python benchmarks/bench_jpeg_encoder.py --repeat 10
+"""
+
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter  # noqa: E402
+
+
+def make_camera_frame(width: int, height: int, noise: float) -> bytes:
+    """生成带渐变与传感器噪声的摄像头帧（JPEG质量95）"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    channels = [
+        Image.blend(gradient, Image.effect_noise((width, height), noise).filter(ImageFilter.GaussianBlur(1)), 0.5)
+        for _ in range(3)
+    ]
+    buffer = BytesIO()
+    Image.merge("RGB", channels).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def legacy_compress(image_data: bytes, max_size_kb: int = 700, max_width: int = 1024) -> bytes:
+    """旧版compress_image实现"""
+    img = Image.open(BytesIO(image_data))
+    if img.width > max_width:
+        ratio = max_width / img.width
+        img = img.resize((max_width, int(img.height * ratio)), Image.Resampling.LANCZOS)
+    if img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+    quality = 90
+    while True:
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=quality)
+        if buffer.tell() / 1024 <= max_size_kb or quality < 30:
+            return buffer.getvalue()
+        quality -= 10
+
+
+def encoder_compress(image_data: bytes, max_size_kb: int = 700, max_width: int = 1024) -> bytes:
+    """新版编码路径：按DCT缩放解码 + 按大小预测质量编码（与PreparedImage生成Face++上传图像的步骤相同）"""
+    from PIL import ImageOps
+    from app.services.image_preprocess import encode_jpeg
+
+    img = Image.open(BytesIO(image_data))
+    img.draft(img.mode, (max_width, max_width))
+    img = ImageOps.exif_transpose(img)
+    return encode_jpeg(img, max_size_kb=max_size_kb, max_width=max_width)
+
+
+def bench(func, image_data: bytes, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        output = func(image_data)
+    return (time.perf_counter() - start) / repeat, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JPEG压缩微基准")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[700, 60],
+                        help="大小预算（KB），较小的预算会触发多次质量调整")
+    args = parser.parse_args()
+
+    frames = {
+        "1080p": make_camera_frame(1920, 1080, 40),
+        "4K": make_camera_frame(3840, 2160, 40),
+        "4K-noisy": make_camera_frame(3840, 2160, 120),
+    }
+
+    for budget in args.budgets:
+        print(f"budget {budget} KB")
+        for name, image_data in frames.items():
+            legacy_time, legacy_out = bench(lambda d: legacy_compress(d, budget), image_data, args.repeat)
+            new_time, new_out = bench(lambda d: encoder_compress(d, budget), image_data, args.repeat)
+            legacy_size = Image.open(BytesIO(legacy_out)).size
+            new_size = Image.open(BytesIO(new_out)).size
+            print(f"  {name:>9} ({len(image_data) // 1024} KB): "
+                  f"legacy {legacy_time * 1000:7.1f} ms -> {len(legacy_out) // 1024} KB {legacy_size} | "
+                  f"new {new_time * 1000:7.1f} ms -> {len(new_out) // 1024} KB {new_size} | "
+                  f"speedup x{legacy_time / new_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
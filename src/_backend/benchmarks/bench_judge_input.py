@@ -0,0 +1,90 @@
+"""
+裁判员输入大小与延迟基准
+对比旧版 json.dumps(indent=2) + 时间戳 + 全精度概率 与紧凑列式编码的提示词大小，
+并在本地桩服务器上测量裁判员调用延迟（/api/v1/analyze/stats中的judge指标）
+
+用法:
+    python benchmarks/bench_judge_input.py --images 5 20 60
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+
+
+def make_results(images: int, seed: int = 0):
+    """生成每张图片Face++与Gemini两个数据源的结果"""
+    from app.models.emotion import normalize_probabilities, get_dominant_emotion
+
+    rng = random.Random(seed)
+    results = []
+    for image_id in range(1, images + 1):
+        for source in ("facepp", "gemini-gemini-2.0-flash-lite"):
+            emotions = normalize_probabilities({key: rng.random() ** 3 for key in
+                                                ("angry", "disgusted", "fearful", "happy",
+                                                 "neutral", "sad", "surprised")})
+            dominant = get_dominant_emotion(emotions)
+            results.append({"image_id": image_id, "source": source, "emotions": emotions,
+                            "dominant_emotion": dominant, "confidence": emotions[dominant],
+                            "timestamp": datetime.now().isoformat()})
+    return results
+
+
+def legacy_input_text(results) -> str:
+    legacy = [{key: item[key] for key in ("source", "emotions", "dominant_emotion", "confidence", "timestamp")}
+              for item in results]
+    return f"\n\n输入数据：\n{json.dumps({'analysis_results': legacy}, ensure_ascii=False, indent=2)}"
+
+
+async def measure_judge(images: int, repeat: int):
+    from app.services.ai_service import GeminiService
+
+    gemini = GeminiService()
+    gemini.streaming = False
+    for index in range(repeat):
+        await gemini.judge_emotions(make_results(images, index))
+    return gemini.judge_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="裁判员输入大小基准")
+    parser.add_argument("--images", type=int, nargs="+", default=[5, 20, 60])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = StubProviderServer(latency=args.latency).start()
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+
+    from app.services.judge_encoder import encode_judge_input, estimate_tokens
+    from app.services.http_client import close_http_client
+
+    async def run():
+        try:
+            for images in args.images:
+                results = make_results(images)
+                legacy = legacy_input_text(results)
+                compact = encode_judge_input(results)
+                rows = len(json.loads(compact)["rows"])
+                stats = await measure_judge(images, args.repeat)
+                print(f"{images:3d} images: legacy {len(legacy):6d} chars (~{estimate_tokens(legacy):5d} tokens) | "
+                      f"compact {len(compact):5d} chars (~{estimate_tokens(compact):4d} tokens, {rows} rows) | "
+                      f"judge prompt {stats['avg_prompt_chars']:.0f} chars, latency {stats['avg_latency'] * 1000:.0f} ms")
+        finally:
+            await close_http_client()
+            server.stop()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
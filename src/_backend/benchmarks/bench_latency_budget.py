@@ -0,0 +1,93 @@
+"""
+延迟预算基准
+在本地桩服务器上启动后端服务（Gemini远慢于Face++），对比 /api/v1/analyze/image 不设预算与设置预算时的延迟；
+校验部分结果的标记、按请求ID查询到的后台补全结果，以及同一图像再次请求时直接命中完整的缓存结果
+
+用法:
+    python benchmarks/bench_latency_budget.py --latency 0.2 --gemini-extra 3.0 --budget 1.0
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+from bench_analysis_stream import post_json, start_backend  # noqa: E402
+
+
+async def get_result(session, base_url, request_id):
+    async with session.get(f"{base_url}/api/v1/analyze/result/{request_id}") as response:
+        return response.status, await response.json()
+
+
+async def main_async(args, base_url: str):
+    url = f"{base_url}/api/v1/analyze/image"
+    async with aiohttp.ClientSession() as session:
+        elapsed, full = await post_json(session, url, [make_test_image(1)])
+        print(f"不设预算:        {elapsed * 1000:8.1f} ms  partial={full['partial']}")
+        assert not full["partial"] and full["request_id"] is None
+
+        image = [make_test_image(2)]
+        elapsed, partial = await post_json(session, f"{url}?budget={args.budget}", image)
+        print(f"预算{args.budget}s:        {elapsed * 1000:8.1f} ms  partial={partial['partial']} "
+              f"request_id={partial['request_id']}")
+        assert partial["success"] and partial["partial"] and partial["request_id"]
+        assert elapsed < args.budget + 0.5
+
+        status, pending = await get_result(session, base_url, partial["request_id"])
+        assert status == 200 and pending["partial"]
+
+        # 等待后台的Gemini调用完成
+        await asyncio.sleep(args.latency + args.gemini_extra - args.budget + 0.5)
+        status, backfilled = await get_result(session, base_url, partial["request_id"])
+        print(f"后台补全后查询:  partial={backfilled['partial']}")
+        assert status == 200 and not backfilled["partial"]
+        assert "GEMINI" in backfilled["analysis_text"]
+
+        # 同一图像再次请求：各服务结果已在缓存中，立即返回完整结果
+        elapsed, again = await post_json(session, f"{url}?budget={args.budget}", image)
+        print(f"同一图像再次请求: {elapsed * 1000:8.1f} ms  partial={again['partial']}")
+        assert not again["partial"] and again["emotion_data"] == backfilled["emotion_data"]
+
+        # 预算内没有任何结果时等到第一个结果
+        elapsed, early = await post_json(session, f"{url}?budget=0.01", [make_test_image(3)])
+        print(f"预算0.01s:       {elapsed * 1000:8.1f} ms  partial={early['partial']}")
+        assert early["success"] and early["partial"]
+
+        status, _ = await get_result(session, base_url, "unknown")
+        assert status == 404
+    print("latency budget checks passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="延迟预算基准")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--gemini-extra", type=float, default=3.0)
+    parser.add_argument("--budget", type=float, default=1.0)
+    args = parser.parse_args()
+
+    stub = StubProviderServer(latency=args.latency).start()
+    stub.gemini_extra_latency = args.gemini_extra
+    os.environ["FACEPP_BASE_URL"] = stub.facepp_url
+    os.environ["GEMINI_BASE_URL"] = stub.gemini_url
+    os.environ["OPENROUTER_BASE_URL"] = stub.openrouter_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_MODE"] = "off"
+    os.environ["GEMINI_HEDGE_DELAY"] = "60"
+
+    server, base_url = start_backend()
+    try:
+        asyncio.run(main_async(args, base_url))
+    finally:
+        server.should_exit = True
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
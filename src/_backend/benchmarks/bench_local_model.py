@@ -0,0 +1,149 @@
+"""
+本地表情模型微批处理基准
+构建一个极小的ONNX分类模型（按图像平均灰度输出8类分数），对比逐个推理与并发请求合并为微批的耗时；
+校验并发请求确实被合并、每个调用方拿到自己图像的结果，
+以及输出logits与输出概率（导出时带softmax）的模型得到相同的情绪概率
+
+用法:
+    python benchmarks/bench_local_model.py --requests 32 --batch-wait-ms 10
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 类别间距（灰度）与分数缩放：灰度为 k * CLASS_SPACING 的图像第k类分数最高，相邻类别分数差为0.5
+CLASS_SPACING = 32.0
+SCORE_SCALE = 1.0 / 32.0
+CLASSES = 8
+
+
+def build_model(path: str, probabilities: bool):
+    """输入 [N,1,64,64]，输出 [N,8]：分数_k = (k * 平均灰度 - k² * 间距 / 2) * 缩放，probabilities时附加softmax"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    k = np.arange(CLASSES, dtype=np.float32)
+    slope = (k * SCORE_SCALE).reshape(1, CLASSES)
+    bias = (-k * k * CLASS_SPACING / 2 * SCORE_SCALE).reshape(1, CLASSES)
+    nodes = [
+        helper.make_node("ReduceMean", ["input"], ["mean"], axes=[1, 2, 3], keepdims=1),
+        helper.make_node("Flatten", ["mean"], ["flat"], axis=1),
+        helper.make_node("MatMul", ["flat", "slope"], ["scaled"]),
+        helper.make_node("Add", ["scaled", "bias"], ["logits" if probabilities else "output"]),
+    ]
+    if probabilities:
+        nodes.append(helper.make_node("Softmax", ["logits"], ["output"], axis=1))
+    graph = helper.make_graph(
+        nodes, "emotion",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 1, 64, 64])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["N", CLASSES])],
+        [numpy_helper.from_array(slope, "slope"), numpy_helper.from_array(bias, "bias")]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def gray_image(level: int) -> bytes:
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (96, 96), (level, level, level)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def expected_emotions(level: int):
+    """按模型定义直接计算的情绪概率（contempt等7类以外的类别不计入）"""
+    from app.models.emotion import AI_EMOTION_MAPPING, normalize_probabilities
+    from app.services.local_model_service import LocalEmotionService
+
+    k = np.arange(CLASSES)
+    logits = (k * level - k * k * CLASS_SPACING / 2) * SCORE_SCALE
+    exp = np.exp(logits - logits.max())
+    emotions = {}
+    for label, value in zip(LocalEmotionService().labels, (exp / exp.sum()).tolist()):
+        emotion = AI_EMOTION_MAPPING.get(label.lower())
+        if emotion:
+            emotions[emotion] = emotions.get(emotion, 0.0) + value
+    return normalize_probabilities(emotions)
+
+
+async def run(model_path: str, levels, concurrent: bool):
+    from app.services.image_preprocess import PreparedImage
+    from app.services.local_model_service import LocalEmotionService
+
+    service = LocalEmotionService(model_path)
+    images = [PreparedImage(gray_image(level)) for level in levels]
+    # 预热：加载模型与线程池
+    await service.analyze_emotion(images[0])
+    service.batches = service.items = 0
+
+    start = time.perf_counter()
+    if concurrent:
+        results = await asyncio.gather(*[service.analyze_emotion(image) for image in images])
+    else:
+        results = [await service.analyze_emotion(image) for image in images]
+    elapsed = time.perf_counter() - start
+    stats = service.stats()
+    await service.close()
+    return elapsed, results, stats
+
+
+def check_results(label: str, levels, results):
+    for level, result in zip(levels, results):
+        expected = expected_emotions(level)
+        assert all(abs(result.emotions[key] - value) < 1e-4 for key, value in expected.items()), \
+            f"{label}: 灰度{level}的结果与期望不符: {result.emotions} != {expected}"
+
+
+async def main_async(args):
+    from app.models.emotion import ANALYSIS_CONFIG
+
+    ANALYSIS_CONFIG["local_model_batch_wait_ms"] = args.batch_wait_ms
+    ANALYSIS_CONFIG["local_model_max_batch"] = args.max_batch
+    # 各请求的灰度不同，对应不同的主导类别
+    levels = [int(CLASS_SPACING * (index % 7)) + index % 5 for index in range(args.requests)]
+
+    with tempfile.TemporaryDirectory() as path:
+        logits_model = os.path.join(path, "logits.onnx")
+        probabilities_model = os.path.join(path, "probabilities.onnx")
+        build_model(logits_model, probabilities=False)
+        build_model(probabilities_model, probabilities=True)
+
+        sequential, results, stats = await run(logits_model, levels, concurrent=False)
+        check_results("sequential", levels, results)
+        print(f"sequential: {sequential * 1000:7.1f} ms, {stats['batches']} inferences")
+
+        concurrent, results, stats = await run(logits_model, levels, concurrent=True)
+        check_results("micro-batched", levels, results)
+        print(f"concurrent: {concurrent * 1000:7.1f} ms, {stats['batches']} inferences, "
+              f"avg batch {stats['avg_batch_size']}")
+        assert stats["items"] == args.requests
+        # 并发请求合并为少数几次推理（预处理在线程池中完成，到达时间略有先后）
+        assert stats["batches"] <= max(1, args.requests // 4), stats
+
+        _, results, _ = await run(probabilities_model, levels, concurrent=True)
+        check_results("probability output", levels, results)
+        print("probability-output model: scores used as-is (no second softmax)")
+    print("local model checks passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地表情模型微批处理基准")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--batch-wait-ms", type=float, default=10)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
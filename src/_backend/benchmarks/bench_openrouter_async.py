@@ -0,0 +1,134 @@
+"""
+OpenRouter异步调用检查：在本地桩服务器上验证OpenRouterService不阻塞事件循环
+并发N个调用的同时运行一个10ms心跳协程，统计心跳的最大延迟；
+与旧版（async函数内调用同步OpenAI客户端）对比，并验证Gemini变慢时对冲到OpenRouter
+
+用法:
+    python benchmarks/bench_openrouter_async.py --calls 10 --latency 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """返回事件循环心跳的最大延迟（秒）"""
+    loop = asyncio.get_running_loop()
+    max_lag = 0.0
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, loop.time() - expected)
+    return max_lag
+
+
+async def run_concurrent(analyze, calls: int):
+    """并发调用，返回 (总耗时, 心跳最大延迟)"""
+    stop = asyncio.Event()
+    probe = asyncio.ensure_future(heartbeat(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*[analyze(make_test_image(index)) for index in range(calls)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    assert all(result.dominant_emotion == "happy" for result in results)
+    return elapsed, await probe
+
+
+def legacy_analyze(base_url: str):
+    """旧版实现：async函数内调用同步OpenAI客户端"""
+    from openai import OpenAI
+    from app.services.ai_service import EMOTION_ANALYSIS_PROMPT, OpenRouterService
+    from app.models.emotion import EmotionResult, get_dominant_emotion
+    from app.services.image_preprocess import PreparedImage
+    from datetime import datetime
+
+    client = OpenAI(base_url=base_url, api_key="stub")
+    service = OpenRouterService()
+
+    async def analyze(image_data: bytes) -> EmotionResult:
+        completion = client.chat.completions.create(
+            model=service.models[0],
+            messages=[{"role": "user", "content": [
+                {"type": "text", "text": EMOTION_ANALYSIS_PROMPT},
+                {"type": "image_url", "image_url": {
+                    "url": f"data:image/jpeg;base64,{service.encode_image(PreparedImage(image_data).data)}"}}
+            ]}],
+            timeout=30
+        )
+        emotions = service.parse_ai_response(completion.choices[0].message.content)
+        dominant = get_dominant_emotion(emotions)
+        return EmotionResult(emotions, dominant, emotions[dominant], "openrouter", datetime.now(), None)
+
+    return analyze
+
+
+async def check_hedge(server: StubProviderServer):
+    """Gemini超过对冲延迟时，OpenRouter作为对冲目标胜出"""
+    from app.models.emotion import ANALYSIS_CONFIG
+    from app.services.emotion_analyzer import EmotionAnalyzer
+    from app.services.image_preprocess import PreparedImage
+
+    ANALYSIS_CONFIG["gemini_hedge_delay"] = 0.2
+    server.gemini_extra_latency = 2.0
+    analyzer = EmotionAnalyzer()
+    try:
+        start = time.perf_counter()
+        result = await analyzer._call_ai_models(PreparedImage(make_test_image(999)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.gemini_extra_latency = 0.0
+        await analyzer.close()
+    assert result is not None and result.source.startswith("openrouter-"), result
+    print(f"hedge: Gemini +2s slower -> {result.source} won in {elapsed * 1000:.0f} ms")
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=args.latency).start()
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_BASE_URL"] = server.openrouter_url
+    os.environ["OPENROUTER_MODE"] = "hedge"
+
+    from app.services.ai_service import OpenRouterService
+    from app.services.http_client import close_http_client
+
+    try:
+        try:
+            legacy = legacy_analyze(server.openrouter_url)
+        except ImportError:
+            print("legacy: openai未安装，跳过旧版对比")
+        else:
+            elapsed, lag = await run_concurrent(legacy, args.calls)
+            print(f"legacy (sync OpenAI client): {args.calls} calls in {elapsed:.2f}s, "
+                  f"max event loop lag {lag * 1000:.0f} ms")
+
+        service = OpenRouterService()
+        elapsed, lag = await run_concurrent(service.analyze_emotion, args.calls)
+        print(f" async (shared aiohttp pool): {args.calls} calls in {elapsed:.2f}s, "
+              f"max event loop lag {lag * 1000:.0f} ms")
+        assert lag < args.latency / 2, "OpenRouter调用阻塞了事件循环"
+        assert elapsed < args.latency * 3, "OpenRouter调用未并发执行"
+
+        await check_hedge(server)
+    finally:
+        await close_http_client()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenRouter异步调用检查")
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
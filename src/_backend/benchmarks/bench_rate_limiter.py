@@ -0,0 +1,117 @@
+"""
+外部API限流基准
+桩服务器限制Gemini每秒请求数（超出返回429），并发发起一批分析请求，对比：
+不限流（429直接失败）、限流速率与配额一致、限流速率高于配额（依靠429自适应降速）；
+并校验同一令牌桶可在多个事件循环中使用，排队超时或取消后不会残留占用的锁
+
+用法:
+    python benchmarks/bench_rate_limiter.py --calls 12 --quota 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+async def run_scenario(server: StubProviderServer, calls: int, rate: float, burst: float):
+    from app.models.emotion import ANALYSIS_CONFIG
+    from app.services.ai_service import GeminiService
+    from app.services.image_preprocess import PreparedImage
+    from app.services.rate_limiter import RateLimiter
+
+    ANALYSIS_CONFIG["gemini_rate_limit"] = rate
+    ANALYSIS_CONFIG["gemini_rate_burst"] = burst
+    service = GeminiService()
+    service.streaming = False
+    service.rate_limiter = RateLimiter()
+    server.gemini_throttled = 0
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[service.analyze_emotion(PreparedImage(make_test_image(index))) for index in range(calls)],
+        return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failed = sum(isinstance(result, Exception) for result in results)
+    return elapsed, failed, server.gemini_throttled, service.rate_limiter.stats()
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=args.latency).start()
+    server.gemini_qps = args.quota
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+
+    from app.services.http_client import close_http_client
+
+    scenarios = (
+        ("no limiter", 0, 1),
+        (f"limiter {args.quota}/s", args.quota, 1),
+        (f"limiter {args.quota * 3}/s (adaptive)", args.quota * 3, args.quota * 3),
+    )
+    try:
+        for label, rate, burst in scenarios:
+            elapsed, failed, throttled, stats = await run_scenario(server, args.calls, rate, burst)
+            bucket = next(iter(stats.values()), {})
+            print(f"{label:>26}: {elapsed:5.2f}s, {args.calls - failed}/{args.calls} ok, "
+                  f"{throttled} upstream 429s, queued {bucket.get('queued', 0)}, "
+                  f"final rate {bucket.get('rate', '-')}")
+            if rate > 0:
+                assert failed == 0, f"{label}: {failed} calls failed"
+    finally:
+        await close_http_client()
+        server.stop()
+
+
+async def contend(bucket, calls: int):
+    """同一令牌桶上的并发获取：截止时间各不相同，部分调用方中途取消"""
+    from app.services.rate_limiter import RateLimitExceeded
+
+    loop = asyncio.get_running_loop()
+
+    async def one(index: int):
+        try:
+            await bucket.acquire(loop.time() + (0.0, 0.001, 0.02, 0.2)[index % 4])
+            return True
+        except RateLimitExceeded:
+            return False
+
+    tasks = [asyncio.ensure_future(one(index)) for index in range(calls)]
+    await asyncio.sleep(0.01)
+    for task in tasks[::7]:
+        task.cancel()
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    # 被取消的获取在下一轮事件循环中释放
+    await asyncio.sleep(0.05)
+    errors = [outcome for outcome in outcomes
+              if isinstance(outcome, BaseException) and not isinstance(outcome, asyncio.CancelledError)]
+    assert not errors, errors
+    assert not bucket._lock.locked(), "排队锁未释放"
+    return sum(outcome is True for outcome in outcomes)
+
+
+def check_bucket_across_loops(rounds: int = 3, calls: int = 60):
+    from app.services.rate_limiter import TokenBucket
+
+    bucket = TokenBucket("check", 50.0, 1.0)
+    for _ in range(rounds):
+        asyncio.run(contend(bucket, calls))
+    print(f"bucket reused across {rounds} event loops: {bucket.stats()['rejected']} rejected, lock released")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="外部API限流基准")
+    parser.add_argument("--calls", type=int, default=12)
+    parser.add_argument("--quota", type=int, default=3, help="桩服务器Gemini每秒请求配额")
+    parser.add_argument("--latency", type=float, default=0.1)
+    asyncio.run(main_async(parser.parse_args()))
+    check_bucket_across_loops()
+
+
+if __name__ == "__main__":
+    main()
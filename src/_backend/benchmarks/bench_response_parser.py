@@ -0,0 +1,187 @@
+"""
+AI响应解析基准
+在一组真实形态的模型输出（代码块、前后缀解释、中英文关键词、截断JSON等）上
+对比旧版逐次import re + 多次正则 + 逐关键词子串扫描的实现与共享解析引擎
+
+用法:
+    python benchmarks/bench_response_parser.py --repeat 2000
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.emotion import AI_EMOTION_MAPPING, normalize_probabilities  # noqa: E402
+from app.services.response_parser import parse_emotion_response, parse_judge_response  # noqa: E402
+
+EMOTIONS_JSON = json.dumps({
+    "emotions": {"angry": 0.02, "disgusted": 0.01, "fearful": 0.03, "happy": 0.78,
+                 "neutral": 0.1, "sad": 0.04, "surprised": 0.02},
+    "dominant_emotion": "happy", "confidence": 0.78
+}, indent=2)
+
+JUDGE_JSON = json.dumps({
+    "final_emotion": "happy", "confidence": 0.85,
+    "reasoning": "5张图片中4张显示快乐情绪，{Face++}和Gemini结果高度一致",
+    "consistency_analysis": "各API结果差异较小",
+    "emotions": {"angry": 0.05, "disgusted": 0.02, "fearful": 0.03, "happy": 0.75,
+                 "neutral": 0.1, "sad": 0.03, "surprised": 0.02}
+}, ensure_ascii=False, indent=2)
+
+# 情绪分析响应语料
+EMOTION_CORPUS = [
+    EMOTIONS_JSON,
+    f"```json\n{EMOTIONS_JSON}\n```",
+    f"```\n{EMOTIONS_JSON}\n```",
+    f"Here is the analysis of the image:\n\n```json\n{EMOTIONS_JSON}\n```\n\n"
+    "The person appears happy, with a slight smile and relaxed eyes. There is no sign of fear or anger.",
+    f"好的，以下是分析结果：\n```json\n{EMOTIONS_JSON}\n```\n人物看起来很开心，嘴角上扬。",
+    f"{EMOTIONS_JSON}\n\nNote: the lighting makes it hard to rule out surprise.",
+    "The subject looks mostly neutral, perhaps slightly sad. No clear happiness or surprise detected. " * 4,
+    "图片中的人物表情平静，略带悲伤，没有明显的愤怒或恐惧。" * 3,
+    "I'm sorry, I cannot determine the emotion from this image.",
+    '{"emotions": {"happy": 0.7, "neutral": 0.3}, "dominant_emotion": "happy", "confidence": 0.7',
+]
+
+# 裁判员响应语料
+JUDGE_CORPUS = [
+    JUDGE_JSON,
+    f"```json\n{JUDGE_JSON}\n```",
+    f"根据输入数据，我的判断如下：\n\n{JUDGE_JSON}\n\n以上为最终结论。",
+    f"Analysis summary below.\n```\n{JUDGE_JSON}\n```\nThanks.",
+    # 以下按模型常见的冗长输出形态构造：长篇推理在前、JSON在后
+    "## 分析过程\n" + "逐帧比较各模型结果，Face++ 与 Gemini 在多数帧上一致，本地模型置信度偏低。\n" * 12
+    + f"\n最终JSON：\n{JUDGE_JSON}",
+    "Let me reason step by step. " * 40 + f"Final answer:\n\n{JUDGE_JSON}\n\nNote: confidence reflects agreement.",
+    f"```JSON\n{JUDGE_JSON}\n```\n\n说明：以上权重已归一化。",
+]
+
+# 旧版逐字符扫描会被字符串中的括号误导的输出；新解析器应正确提取
+JUDGE_TRICKY = (
+    '裁判结论如下（格式 {"key": value}）：\n'
+    '{"final_emotion": "happy", "confidence": 0.8, "reasoning": "多数帧 {笑容} 明显", '
+    '"weights": {"facepp": 0.5, "gemini": 0.5}}'
+)
+
+
+def legacy_parse_ai_response(text_response: str):
+    """旧版GeminiService.parse_ai_response（保留INFO/WARNING日志调用）"""
+    logger = logging.getLogger("legacy")
+    try:
+        logger.info(f"解析AI响应: {text_response[:200]}...")
+        if text_response.strip().startswith("{"):
+            data = json.loads(text_response.strip())
+            return normalize_probabilities(data.get("emotions", {}))
+        import re
+        json_match = re.search(r'```json\s*\n(.*?)\n```', text_response, re.DOTALL)
+        if json_match:
+            json_str = json_match.group(1).strip()
+            logger.info(f"从代码块提取JSON: {json_str}")
+            return normalize_probabilities(json.loads(json_str).get("emotions", {}))
+        code_match = re.search(r'```\s*\n(.*?)\n```', text_response, re.DOTALL)
+        if code_match:
+            json_str = code_match.group(1).strip()
+            if json_str.startswith("{"):
+                logger.info(f"从通用代码块提取JSON: {json_str}")
+                return normalize_probabilities(json.loads(json_str).get("emotions", {}))
+        logger.warning(f"无法解析为JSON，尝试关键词提取: {text_response}")
+        text_lower = text_response.lower()
+        detected = {}
+        for keyword, emotion in AI_EMOTION_MAPPING.items():
+            if keyword in text_lower:
+                detected[emotion] = detected.get(emotion, 0) + 1
+        if detected:
+            total = sum(detected.values())
+            return normalize_probabilities({k: v / total for k, v in detected.items()})
+        return {"neutral": 1.0}
+    except Exception as e:
+        logger.error(f"解析AI响应失败: {e}, 原始响应: {text_response}")
+        return {"neutral": 1.0}
+
+
+def legacy_parse_judge_response(text_response: str):
+    """旧版AIService._parse_judge_response（逐字符括号扫描，保留原有日志调用）"""
+    logger = logging.getLogger("legacy")
+    try:
+        if text_response.strip().startswith("{"):
+            return json.loads(text_response.strip())
+        import re
+        json_match = re.search(r'```json\s*\n(.*?)\n```', text_response, re.DOTALL)
+        if json_match:
+            json_str = json_match.group(1).strip()
+            logger.info(f"从代码块提取JSON: {json_str[:200]}...")
+            return json.loads(json_str)
+        code_match = re.search(r'```\s*\n(.*?)\n```', text_response, re.DOTALL)
+        if code_match:
+            json_str = code_match.group(1).strip()
+            if json_str.startswith("{"):
+                logger.info(f"从通用代码块提取JSON: {json_str[:200]}...")
+                return json.loads(json_str)
+        brace_count = 0
+        start_idx = -1
+        for i, char in enumerate(text_response):
+            if char == '{':
+                if start_idx == -1:
+                    start_idx = i
+                brace_count += 1
+            elif char == '}':
+                brace_count -= 1
+                if brace_count == 0 and start_idx != -1:
+                    json_str = text_response[start_idx:i + 1]
+                    logger.info(f"提取JSON对象: {json_str[:200]}...")
+                    return json.loads(json_str)
+        logger.error(f"无法解析裁判员AI响应，原始内容: {text_response}")
+        raise Exception("裁判员AI未返回有效JSON格式")
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON解析错误: {e}, 内容: {text_response[:500]}")
+        raise Exception(f"JSON格式错误: {str(e)}")
+
+
+def bench(func, corpus, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            try:
+                func(text)
+            except Exception:
+                pass
+    return (time.perf_counter() - start) / (repeat * len(corpus)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI响应解析基准")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    # 与服务运行时一致：INFO级别日志输出到处理器
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"))
+
+    # 结果一致性：新旧裁判解析器在整个语料上得到相同的结果
+    for text in JUDGE_CORPUS:
+        assert parse_judge_response(text) == legacy_parse_judge_response(text), text[:80]
+    # 前文中的非JSON括号片段不影响提取；旧版在此直接报错
+    assert parse_judge_response(JUDGE_TRICKY)["final_emotion"] == "happy"
+    try:
+        legacy_parse_judge_response(JUDGE_TRICKY)
+        raise AssertionError("旧版解析器应无法处理该响应")
+    except Exception as e:
+        assert "JSON" in str(e), e
+
+    for name, legacy, current, corpus in (
+        ("emotion", legacy_parse_ai_response, parse_emotion_response, EMOTION_CORPUS),
+        ("judge", legacy_parse_judge_response, parse_judge_response, JUDGE_CORPUS),
+    ):
+        legacy_us = bench(legacy, corpus, args.repeat)
+        current_us = bench(current, corpus, args.repeat)
+        print(f"{name:>8}: legacy {legacy_us:7.2f} us/response | shared parser {current_us:7.2f} us/response "
+              f"| speedup x{legacy_us / current_us:.1f}")
+    print("response parser checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+响应序列化基准
+以最大尺寸的批量分析响应（5张图像、所有数据源、裁判员AI判断与完整分析文本）为例，对比：
+FastAPI默认路径（asdict -> response_model校验/序列化 -> JSONResponse.render）、
+无response_model时的jsonable_encoder路径，与FastJSONResponse（orjson及标准库回退），并校验输出逐字节一致
+
+用法:
+    python benchmarks/bench_response_serialization.py --repeat 2000
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+async def build_batch_response(images: int):
+    """在桩服务器上生成一个最大尺寸的批量分析响应"""
+    from app.services.emotion_analyzer import EmotionAnalyzer
+    from app.services.http_client import close_http_client
+
+    analyzer = EmotionAnalyzer()
+    # 存在分歧时才调用裁判员AI（响应中包含完整的裁判结果）
+    analyzer.consensus.enabled = False
+    try:
+        return await analyzer.analyze_batch_images([make_test_image(index) for index in range(images)])
+    finally:
+        await analyzer.close()
+        await close_http_client()
+
+
+def with_tiny_probabilities(response):
+    """含极小概率的响应（orjson数字格式与标准库不同，走回退路径）"""
+    detailed = [dict(item, facepp_result=dict(item["facepp_result"],
+                                              emotions=dict(item["facepp_result"]["emotions"], disgusted=3.2e-05)))
+                for item in response.detailed_results]
+    return dataclasses.replace(response, detailed_results=detailed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应序列化基准")
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    server = StubProviderServer(latency=0.05).start()
+    os.environ["FACEPP_BASE_URL"] = server.facepp_url
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ["OPENROUTER_BASE_URL"] = server.openrouter_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_MODE"] = "parallel"
+    os.environ["FRAME_DEDUP_ENABLED"] = "False"
+    os.environ["GEMINI_STREAMING"] = "False"
+    try:
+        response = asyncio.run(build_batch_response(args.images))
+    finally:
+        server.stop()
+    assert response.success and response.judge_result is not None
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from app.api import responses
+    from app.api.responses import FastJSONResponse
+    from app.models.emotion import BatchAnalysisResponse
+
+    adapter = TypeAdapter(BatchAnalysisResponse)
+
+    def fastapi_default(content):
+        # 与fastapi==0.104的serialize_response相同：asdict -> 校验 -> 序列化为JSON兼容对象 -> json.dumps
+        value = adapter.validate_python(dataclasses.asdict(content))
+        return JSONResponse(adapter.dump_python(value, mode="json")).body
+
+    def jsonable(content):
+        return JSONResponse(jsonable_encoder(content)).body
+
+    def stdlib_fallback(content):
+        orjson, responses.orjson = responses.orjson, None
+        try:
+            return FastJSONResponse(content).body
+        finally:
+            responses.orjson = orjson
+
+    paths = [("fastapi response_model", fastapi_default), ("jsonable_encoder", jsonable),
+             ("FastJSONResponse stdlib", stdlib_fallback)]
+    if responses.orjson is not None:
+        paths.append(("FastJSONResponse orjson", lambda content: FastJSONResponse(content).body))
+    else:
+        print("orjson未安装，只测试标准库路径")
+
+    for label, content in (("batch response", response), ("with tiny floats", with_tiny_probabilities(response))):
+        expected = fastapi_default(content)
+        print(f"{label}: {len(expected)} bytes")
+        for name, serialize in paths:
+            assert serialize(content) == expected, f"{name}: 输出不一致"
+            elapsed = timeit.timeit(lambda: serialize(content), number=args.repeat) / args.repeat
+            print(f"  {name:>24}: {elapsed * 1e6:7.1f} us")
+    print("all outputs byte-identical")
+
+
+if __name__ == "__main__":
+    main()
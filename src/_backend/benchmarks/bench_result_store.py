@@ -0,0 +1,163 @@
+"""
+结果存储检查
+1. 写入开销：后台线程入队 与 请求内同步写入SQLite（每条提交一次）的单条耗时对比
+2. 重启恢复：分析一批图像后关闭分析器，新分析器从存储恢复缓存，再次分析不产生外部请求
+3. 离线回放：用存储结果重新生成分析响应（旧模型的结果不参与），以及回放脚本的命令行
+
+用法:
+    python benchmarks/bench_result_store.py --records 2000 --images 5
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_EMOTIONS, STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_result(index: int):
+    from app.models.emotion import EmotionResult
+
+    return EmotionResult(STUB_EMOTIONS, "happy", 0.8, "gemini-gemini-2.0-flash-lite", datetime.now(),
+                         {"candidates": [{"content": {"parts": [{"text": "x" * 2000}]}}], "index": index})
+
+
+def measure_write_overhead(path: str, records: int):
+    from app.services.result_store import ResultStore
+
+    results = [make_result(index) for index in range(records)]
+    keys = [f"gemini:gemini-2.0-flash-lite:{index:064x}" for index in range(records)]
+
+    store = ResultStore(os.path.join(path, "async.db"))
+    start = time.perf_counter()
+    for key, result in zip(keys, results):
+        store.record(key, result)
+    queued = (time.perf_counter() - start) / records
+    store.close()
+
+    # 对照：请求路径内同步写入并提交
+    sync_store = ResultStore(os.path.join(path, "sync.db"))
+    connection = sync_store._connect()
+    start = time.perf_counter()
+    for key, result in zip(keys, results):
+        with connection:
+            connection.execute(
+                "INSERT INTO emotion_results (cache_key, digest, provider, model, source, dominant_emotion, "
+                "confidence, emotions, raw_data, analyzed_at, stored_at) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                (key, key[-64:], "gemini", "gemini-2.0-flash-lite", result.source, result.dominant_emotion,
+                 result.confidence, "{}", str(result.raw_data), result.timestamp.isoformat(), time.time()))
+    synchronous = (time.perf_counter() - start) / records
+    connection.close()
+
+    with sqlite3.connect(store.path) as check:
+        stored = check.execute("SELECT COUNT(*), MAX(LENGTH(raw_data)) FROM emotion_results").fetchone()
+    assert stored[0] == records, stored
+    print(f"write overhead per result: background queue {queued * 1e6:.1f} us | "
+          f"synchronous commit {synchronous * 1e6:.1f} us ({store.written} written, "
+          f"max raw_data {stored[1]} chars)")
+
+
+async def check_warm_restart(server: StubProviderServer, path: str, images: int):
+    from app.models.emotion import ANALYSIS_CONFIG
+    from app.services.emotion_analyzer import EmotionAnalyzer
+    from app.services.result_cache import image_digest
+
+    ANALYSIS_CONFIG["result_store_enabled"] = True
+    ANALYSIS_CONFIG["result_store_path"] = os.path.join(path, "restart.db")
+    images_data = [make_test_image(index) for index in range(images)]
+
+    analyzer = EmotionAnalyzer()
+    for image_data in images_data:
+        await analyzer.analyze_image(image_data)
+    await analyzer.close()
+    cold_requests = server.facepp_requests + len(server.gemini_requests)
+
+    restarted = EmotionAnalyzer()
+    restored = await restarted.rehydrate_cache()
+    start = time.perf_counter()
+    responses = [await restarted.analyze_image(image_data) for image_data in images_data]
+    elapsed = time.perf_counter() - start
+    warm_requests = server.facepp_requests + len(server.gemini_requests) - cold_requests
+    assert all(response.success for response in responses)
+    assert warm_requests == 0, warm_requests
+    print(f"warm restart: restored {restored} cache entries, {images} images re-analyzed in "
+          f"{elapsed * 1000:.1f} ms with {warm_requests} upstream requests (cold run: {cold_requests})")
+
+    replayed = restarted.replay_image(image_digest(images_data[0]))
+    assert replayed.success and replayed.emotion_data == responses[0].emotion_data
+    print(f"replay: {len(replayed.emotion_data)} emotions, dominant {replayed.emotion_data[0].emotion}, "
+          f"matches live response")
+
+    # 之后写入的旧模型结果（当前配置不会调用）不参与回放
+    from app.models.emotion import EmotionResult
+    digest = image_digest(images_data[0])
+    stale = EmotionResult.create({"sad": 1.0}, "gemini-gemini-1.0-pro-vision", None)
+    restarted.result_store.record(restarted.result_cache.make_key(digest, "gemini:gemini-1.0-pro-vision"), stale)
+    restarted.result_store.close()
+    replayed = restarted.replay_image(digest)
+    assert replayed.emotion_data == responses[0].emotion_data
+    print("replay ignores results stored for models the current config does not query")
+    await restarted.close()
+
+    check_replay_cli(ANALYSIS_CONFIG["result_store_path"], digest, image_digest(images_data[1]))
+
+
+def check_replay_cli(db_path: str, digest: str, other_digest: str):
+    """回放脚本：--list可按--digest筛选单张图像，--digest回放，缺少参数时报错"""
+    def run(*arguments):
+        return subprocess.run([sys.executable, "replay_results.py", "--db", db_path, *arguments],
+                              cwd=BACKEND_ROOT, capture_output=True, text=True)
+
+    listed = run("--list", "--digest", digest)
+    lines = listed.stdout.splitlines()
+    assert listed.returncode == 0 and lines, listed.stderr
+    assert all(digest[:12] in line for line in lines), lines
+
+    everything = run("--list").stdout
+    assert digest[:12] in everything and other_digest[:12] in everything
+
+    replayed = run("--digest", digest)
+    assert replayed.returncode == 0 and "happy" in replayed.stdout.lower(), replayed.stderr
+    assert run().returncode == 2
+    print(f"replay CLI: --list --digest shows {len(lines)} records of one image, --digest replays it")
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=args.latency).start()
+    os.environ["FACEPP_BASE_URL"] = server.facepp_url
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_MODE"] = "off"
+
+    from app.services.http_client import close_http_client
+
+    try:
+        with tempfile.TemporaryDirectory() as path:
+            measure_write_overhead(path, args.records)
+            await check_warm_restart(server, path, args.images)
+    finally:
+        await close_http_client()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结果存储检查")
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+进行中请求合并检查
+在本地桩服务器上并发提交同一张图像（模拟重复点击、单张分析与批量分析重叠），
+统计外部API请求次数，并验证单个等待者断开不影响其他等待者、全部断开后取消共享调用
+
+用法:
+    python benchmarks/bench_single_flight.py --clients 8 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+def make_analyzer(enabled: bool):
+    from app.services.emotion_analyzer import EmotionAnalyzer
+
+    analyzer = EmotionAnalyzer()
+    analyzer.in_flight.enabled = enabled
+    return analyzer
+
+
+def upstream_requests(server: StubProviderServer) -> int:
+    return server.facepp_requests + len(server.gemini_requests)
+
+
+async def run_duplicates(server: StubProviderServer, enabled: bool, clients: int, seed: int):
+    analyzer = make_analyzer(enabled)
+    before = upstream_requests(server)
+    image_data = make_test_image(seed)
+    start = time.perf_counter()
+    try:
+        responses = await asyncio.gather(*[analyzer.analyze_image(image_data) for _ in range(clients)])
+    finally:
+        await analyzer.close()
+    elapsed = time.perf_counter() - start
+    assert all(response.success for response in responses)
+    return elapsed, upstream_requests(server) - before, analyzer.in_flight.stats()
+
+
+async def check_cancellation(server: StubProviderServer, latency: float):
+    from app.services.image_preprocess import PreparedImage
+
+    # 一个等待者断开：另一个等待者仍拿到结果，外部API只调用一次
+    analyzer = make_analyzer(True)
+    before = upstream_requests(server)
+    image_data = make_test_image(500)
+    leaving = asyncio.ensure_future(analyzer.analyze_image(image_data))
+    staying = asyncio.ensure_future(analyzer.analyze_image(image_data))
+    await asyncio.sleep(latency / 3)
+    leaving.cancel()
+    response = await staying
+    assert leaving.cancelled() and response.success
+    assert upstream_requests(server) - before == 2, upstream_requests(server) - before
+    print("one waiter cancelled: other waiter succeeded, 1 Face++ + 1 Gemini request")
+
+    # 全部断开：共享调用被取消，之后的相同请求重新发起
+    task = asyncio.ensure_future(analyzer._call_facepp(PreparedImage(make_test_image(501))))
+    await asyncio.sleep(latency / 3)
+    task.cancel()
+    await asyncio.sleep(0)
+    stats = analyzer.in_flight.stats()
+    assert stats["abandoned"] == 1 and stats["in_flight"] == 0, stats
+    routing = analyzer.model_router.snapshot()["facepp"]
+    assert routing["consecutive_failures"] == 0, routing
+    print(f"all waiters cancelled: shared call cancelled, not counted as failure ({stats})")
+    await analyzer.close()
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=args.latency).start()
+    os.environ["FACEPP_BASE_URL"] = server.facepp_url
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+    os.environ["OPENROUTER_MODE"] = "off"
+    os.environ["GEMINI_STREAMING"] = "False"
+
+    from app.services.http_client import close_http_client
+
+    try:
+        for label, enabled, seed in (("without coalescing", False, 0), ("   with coalescing", True, 1)):
+            elapsed, requests, stats = await run_duplicates(server, enabled, args.clients, seed)
+            print(f"{label}: {args.clients} identical requests in {elapsed * 1000:.0f} ms, "
+                  f"{requests} upstream requests, coalesced {stats['coalesced']}")
+        await check_cancellation(server, args.latency)
+    finally:
+        await close_http_client()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="进行中请求合并检查")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
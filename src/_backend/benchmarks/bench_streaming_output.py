@@ -0,0 +1,73 @@
+"""
+Gemini流式响应基准：在本地桩服务器上对比generateContent与streamGenerateContent
+流式模式在emotions对象完整后立即关闭流，不等待模型输出剩余的解释文字
+
+用法:
+    python benchmarks/bench_streaming_output.py --repeat 10 --latency 0.3 --chunk-delay 0.03
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_EMOTIONS, STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+async def time_calls(gemini, model: str, repeat: int):
+    """返回 (平均单次耗时, 最后一次结果)"""
+    start = time.perf_counter()
+    result = None
+    for index in range(repeat):
+        result = await gemini.analyze_emotion(make_test_image(index), model)
+    return (time.perf_counter() - start) / repeat, result
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=args.latency, chunk_delay=args.chunk_delay).start()
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+
+    from app.services.ai_service import GeminiService
+    from app.services.http_client import close_http_client
+
+    try:
+        gemini = GeminiService()
+        for label, model in (("prompt mode (gemma)", "gemma-3-27b-it"),
+                             ("structured mode", "gemini-2.0-flash-lite")):
+            gemini.streaming = False
+            full_time, full_result = await time_calls(gemini, model, args.repeat)
+            gemini.streaming = True
+            stream_time, stream_result = await time_calls(gemini, model, args.repeat)
+
+            for emotion, value in STUB_EMOTIONS.items():
+                assert abs(full_result.emotions[emotion] - value) < 1e-6
+                assert abs(stream_result.emotions[emotion] - value) < 1e-6
+            assert stream_result.raw_data["streamed"]
+
+            print(f"{label:>20}: generateContent {full_time * 1000:6.0f} ms | "
+                  f"stream {stream_time * 1000:6.0f} ms "
+                  f"(closed early: {stream_result.raw_data['closed_early']}) | "
+                  f"speedup x{full_time / stream_time:.2f}")
+
+        await asyncio.sleep(0.1)
+        print(f"streams closed early by client: {server.streams_closed_early}")
+    finally:
+        await close_http_client()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini流式响应基准")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="首个输出块前的延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.03, help="输出块之间的间隔（秒）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
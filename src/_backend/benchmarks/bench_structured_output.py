@@ -0,0 +1,92 @@
+"""
+Gemini结构化输出基准：在本地桩服务器上对比提示词方式与responseSchema方式
+统计响应文本大小与解析耗时，并校验两种方式解析出的情绪概率一致、
+不支持JSON模式的模型（gemma）走提示词回退
+
+用法:
+    python benchmarks/bench_structured_output.py --repeat 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_providers import STUB_EMOTIONS, STUB_ENV, StubProviderServer  # noqa: E402
+from bench_concurrent_analyze import make_test_image  # noqa: E402
+
+
+async def run_mode(gemini, model: str, repeat: int):
+    """返回 (平均响应文本字节数, 平均解析耗时us, 最后一次结果)"""
+    from app.services.response_parser import parse_emotion_response, parse_structured_emotions
+
+    text_bytes = 0
+    parse_time = 0.0
+    result = None
+    for index in range(repeat):
+        result = await gemini.analyze_emotion(make_test_image(index), model)
+        text = gemini._response_text(result.raw_data)
+        parse = parse_structured_emotions if gemini.supports_structured_output(model) else parse_emotion_response
+        start = time.perf_counter()
+        parse(text)
+        parse_time += time.perf_counter() - start
+        text_bytes += len(text.encode("utf-8"))
+    return text_bytes / repeat, parse_time / repeat * 1e6, result
+
+
+async def main_async(args):
+    server = StubProviderServer(latency=0).start()
+    os.environ["GEMINI_BASE_URL"] = server.gemini_url
+    os.environ.update(STUB_ENV)
+
+    from app.services.ai_service import GeminiService
+    from app.services.http_client import close_http_client
+
+    try:
+        gemini = GeminiService()
+        gemini.streaming = False  # 比较完整响应文本
+        model = "gemini-2.0-flash-lite"
+
+        gemini.structured_output = False
+        prompt_bytes, prompt_us, prompt_result = await run_mode(gemini, model, args.repeat)
+        gemini.structured_output = True
+        schema_bytes, schema_us, schema_result = await run_mode(gemini, model, args.repeat)
+
+        print(f"prompt mode:     {prompt_bytes:6.0f} B/response, parse {prompt_us:6.1f} us")
+        print(f"structured mode: {schema_bytes:6.0f} B/response, parse {schema_us:6.1f} us")
+        for emotion, value in STUB_EMOTIONS.items():
+            assert abs(prompt_result.emotions[emotion] - value) < 1e-6
+            assert abs(schema_result.emotions[emotion] - value) < 1e-6
+
+        # gemma按前缀配置直接使用提示词方式
+        server.gemini_requests.clear()
+        await gemini.analyze_emotion(make_test_image(), "gemma-3-27b-it")
+        assert server.gemini_requests == [("gemma-3-27b-it", False)], server.gemini_requests
+
+        # 未配置前缀时，gemma以400拒绝JSON模式，服务记录后改用提示词方式重试
+        gemini.schema_unsupported_prefixes = ()
+        server.gemini_requests.clear()
+        await gemini.analyze_emotion(make_test_image(), "gemma-3-27b-it")
+        await gemini.analyze_emotion(make_test_image(), "gemma-3-27b-it")
+        assert server.gemini_requests == [("gemma-3-27b-it", True), ("gemma-3-27b-it", False),
+                                          ("gemma-3-27b-it", False)], server.gemini_requests
+
+        judge = await gemini.judge_emotions([{"image_id": 1, "source": "facepp", "emotions": STUB_EMOTIONS}])
+        assert judge["final_emotion"] == "happy", judge
+        print("fallback and judge checks passed")
+    finally:
+        await close_http_client()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini结构化输出基准")
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+本地桩服务器
+模拟Face++、Gemini与OpenRouter接口（固定延迟），供基准脚本在无网络、无API密钥的情况下使用
+Gemini桩按真实接口行为区分结构化输出（responseSchema）与提示词方式，gemma模型拒绝JSON模式；
+可设置每秒请求配额，超出时按真实接口返回429与retryDelay
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from aiohttp import web
+
+STUB_EMOTIONS = {
+    "angry": 0.02, "disgusted": 0.01, "fearful": 0.02, "happy": 0.80,
+    "neutral": 0.10, "sad": 0.03, "surprised": 0.02
+}
+
+# 流式接口每块输出的字符数（约为若干token）
+STUB_CHUNK_CHARS = 16
+
+STUB_JUDGE = {
+    "final_emotion": "happy",
+    "confidence": 0.8,
+    "reasoning": "多数图片显示快乐情绪，Face++和Gemini结果一致",
+    "consistency_analysis": "各API结果差异较小",
+    "emotions": STUB_EMOTIONS
+}
+
+
+# 基准运行环境：桩服务器不设配额（限流基准除外），关闭客户端限流；
+# 桩结果不写入结果存储，避免服务启动时恢复到缓存中
+STUB_ENV = {"FACEPP_RATE_LIMIT": "0", "GEMINI_RATE_LIMIT": "0", "OPENROUTER_RATE_LIMIT": "0",
+            "RESULT_STORE_ENABLED": "False"}
+
+
+class StubProviderServer:
+    """在独立线程的事件循环中运行的桩服务器"""
+
+    def __init__(self, latency: float = 0.5, chunk_delay: float = 0.02):
+        self.latency = latency
+        # 流式接口每个输出块之间的间隔（模拟逐token生成）
+        self.chunk_delay = chunk_delay
+        self.port: Optional[int] = None
+        self._loop = asyncio.new_event_loop()
+        self._runner: Optional[web.AppRunner] = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        # Gemini请求记录 (model, 是否结构化输出)
+        self.gemini_requests: List[Tuple[str, bool]] = []
+        # Gemini请求中收到的图像总数
+        self.gemini_images = 0
+        # 流式请求中被客户端提前关闭的次数
+        self.streams_closed_early = 0
+        # Gemini额外延迟（模拟Gemini变慢，用于验证对冲）
+        self.gemini_extra_latency = 0.0
+        self.openrouter_requests = 0
+        self.facepp_requests = 0
+        # Gemini每秒请求配额（None表示不限），超出配额返回429的次数
+        self.gemini_qps: Optional[int] = None
+        self.gemini_throttled = 0
+        self._gemini_window: List[float] = []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def facepp_url(self) -> str:
+        return f"{self.base_url}/facepp/v3/detect"
+
+    @property
+    def gemini_url(self) -> str:
+        return f"{self.base_url}/v1beta/models"
+
+    @property
+    def openrouter_url(self) -> str:
+        return f"{self.base_url}/openrouter/api/v1"
+
+    async def _facepp_detect(self, request: web.Request) -> web.Response:
+        await request.post()
+        self.facepp_requests += 1
+        await asyncio.sleep(self.latency)
+        emotion = {
+            "anger": 2.0, "disgust": 1.0, "fear": 2.0, "happiness": 80.0,
+            "neutral": 10.0, "sadness": 3.0, "surprise": 2.0
+        }
+        return web.json_response({"faces": [{"attributes": {"emotion": emotion}}]})
+
+    def _gemini_quota(self) -> Optional[web.Response]:
+        """滑动1秒窗口内超出配额时返回429响应（错误详情中带retryDelay）"""
+        if self.gemini_qps is None:
+            return None
+        now = time.monotonic()
+        self._gemini_window = [at for at in self._gemini_window if now - at < 1.0]
+        if len(self._gemini_window) < self.gemini_qps:
+            self._gemini_window.append(now)
+            return None
+        self.gemini_throttled += 1
+        return web.json_response({"error": {
+            "code": 429, "status": "RESOURCE_EXHAUSTED",
+            "message": "Resource has been exhausted (e.g. check quota).",
+            "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}]
+        }}, status=429)
+
+    def _gemini_reply(self, model: str, body: dict) -> Tuple[Optional[web.Response], str]:
+        """按请求内容生成Gemini输出文本；模型拒绝JSON模式时返回400响应"""
+        throttled = self._gemini_quota()
+        if throttled is not None:
+            return throttled, ""
+        generation_config = body.get("generationConfig", {})
+        structured = "responseSchema" in generation_config
+        self.gemini_requests.append((model, structured))
+
+        if structured and model.startswith("gemma"):
+            return web.json_response({"error": {
+                "code": 400, "status": "INVALID_ARGUMENT",
+                "message": f"JSON mode is not enabled for models/{model}"
+            }}, status=400), ""
+
+        parts = body["contents"][0]["parts"]
+        image_count = sum("inlineData" in part for part in parts)
+        self.gemini_images += image_count
+
+        if image_count > 1:
+            # 多图单次调用：每张图片一项 + 综合判断
+            payload = {
+                "images": [{"image_id": index, "emotions": STUB_EMOTIONS} for index in range(1, image_count + 1)],
+                "verdict": STUB_JUDGE
+            }
+        elif image_count == 0:
+            payload = STUB_JUDGE
+        elif structured:
+            payload = {"emotions": STUB_EMOTIONS}
+        else:
+            payload = {"emotions": STUB_EMOTIONS, "dominant_emotion": "happy", "confidence": 0.8}
+
+        if structured:
+            # 结构化输出：紧凑JSON，只包含schema中的字段
+            return None, json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+        # 提示词方式：模型常见的代码块 + 解释文字
+        return None, (f"好的，以下是分析结果：\n```json\n{json.dumps(payload, ensure_ascii=False, indent=2)}\n```\n"
+                      "图片中的人物嘴角上扬、眼睛微眯，表现出明显的快乐情绪，没有悲伤或愤怒的迹象。"
+                      "面部肌肉放松，整体姿态自然，因此判断主导情绪为快乐，置信度较高。")
+
+    async def _gemini_generate(self, request: web.Request) -> web.Response:
+        error, text = self._gemini_reply(request.match_info["model"], await request.json())
+        if error is not None:
+            return error
+        # 非流式接口在全部输出生成完毕后才返回
+        await asyncio.sleep(self.latency + self.gemini_extra_latency + self.chunk_delay * len(text) / STUB_CHUNK_CHARS)
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    async def _gemini_stream(self, request: web.Request) -> web.StreamResponse:
+        error, text = self._gemini_reply(request.match_info["model"], await request.json())
+        if error is not None:
+            return error
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.latency + self.gemini_extra_latency)
+        try:
+            for start in range(0, len(text), STUB_CHUNK_CHARS):
+                chunk = {"candidates": [{"content": {"parts": [{"text": text[start:start + STUB_CHUNK_CHARS]}],
+                                                     "role": "model"}}]}
+                await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+                await asyncio.sleep(self.chunk_delay)
+            await response.write_eof()
+        except ConnectionResetError:
+            # 客户端已拿到所需数据并关闭了流
+            self.streams_closed_early += 1
+        return response
+
+    async def _openrouter_chat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.openrouter_requests += 1
+        await asyncio.sleep(self.latency)
+        payload = {"emotions": STUB_EMOTIONS, "dominant_emotion": "happy", "confidence": 0.8}
+        text = f"```json\n{json.dumps(payload, indent=2)}\n```"
+        return web.json_response({
+            "id": "gen-stub", "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 300, "completion_tokens": 80, "total_tokens": 380}
+        })
+
+    async def _start(self):
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post("/facepp/v3/detect", self._facepp_detect)
+        app.router.add_post("/v1beta/models/{model}:generateContent", self._gemini_generate)
+        app.router.add_post("/v1beta/models/{model}:streamGenerateContent", self._gemini_stream)
+        app.router.add_post("/openrouter/api/v1/chat/completions", self._openrouter_chat)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> "StubProviderServer":
+        """启动桩服务器（阻塞直到端口就绪）"""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def stop(self):
+        """停止桩服务器"""
+        if self._runner is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,93 @@
+"""
+EmoScan结果回放脚本
+从SQLite结果存储中读取历史分析结果，离线重新生成分析响应（不调用任何外部API）
+
+用法:
+    python replay_results.py --image photo.jpg          # 按图像文件回放融合结果
+    python replay_results.py --digest <sha256>          # 按图像哈希回放
+    python replay_results.py --list --provider gemini   # 列出最近的存储记录
+    python replay_results.py --list --image photo.jpg   # 列出某张图像的历史记录
+"""
+
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.emotion import ANALYSIS_CONFIG  # noqa: E402
+from app.services.result_cache import image_digest  # noqa: E402
+from app.services.result_store import ResultStore  # noqa: E402
+
+
+def list_records(store: ResultStore, digest: Optional[str], args):
+    records = store.history(digest=digest, provider=args.provider, model=args.model, limit=args.limit)
+    if not records:
+        print("没有匹配的记录")
+        return
+    for record in records:
+        stored_at = datetime.fromtimestamp(record["stored_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{stored_at}  {record['digest'][:12]}  {record['source']:<40} "
+              f"{record['dominant_emotion']:<10} {record['confidence']:.2f}")
+
+
+def replay(store: ResultStore, digest: str, as_json: bool):
+    from app.services.emotion_analyzer import EmotionAnalyzer
+
+    analyzer = EmotionAnalyzer()
+    analyzer.result_store = store
+    response = analyzer.replay_image(digest)
+    if as_json:
+        print(json.dumps(asdict(response), ensure_ascii=False, indent=2))
+    elif response.success:
+        print(response.analysis_text)
+    else:
+        print(response.error_message)
+    return response.success
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回放存储的情绪分析结果")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--image", help="图像文件（按内容哈希查找）")
+    target.add_argument("--digest", help="图像内容哈希（sha256）")
+    parser.add_argument("--list", action="store_true", help="列出最近的存储记录（可用--image/--digest筛选单张图像）")
+    parser.add_argument("--provider", help="--list时按服务筛选（facepp/gemini/openrouter/local）")
+    parser.add_argument("--model", help="--list时按模型筛选")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--db", default=ANALYSIS_CONFIG["result_store_path"], help="SQLite文件路径")
+    parser.add_argument("--json", action="store_true", help="以JSON输出完整响应")
+    args = parser.parse_args()
+    if not args.list and not (args.image or args.digest):
+        parser.error("需要指定 --image、--digest 或 --list")
+
+    store = ResultStore(args.db)
+    if not os.path.exists(store.path):
+        print(f"结果存储不存在: {store.path}")
+        sys.exit(1)
+
+    digest = args.digest
+    if args.image:
+        with open(args.image, "rb") as f:
+            digest = image_digest(f.read())
+
+    if args.list:
+        list_records(store, digest, args)
+        return
+
+    if not replay(store, digest, args.json):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()